@@ -18,6 +18,7 @@ from crystal_materials import Crystal_Materials
 from crystal_geometries import Crystal_Geometry, CrystalSlab_Geometry, Crystal2D_Geometry
 import numpy as np
 from ui_elements import *
+from crystal_surrogates import SweepSurrogate
 
 
 
@@ -39,6 +40,8 @@ crystal_active = None
 configuration_active = None
 active_mode_groups = None
 mode_data_to_plot = None
+sweep_surrogate_active = None
+sweep_surrogate_errors_active = None
 
 
 # Create the layout
@@ -245,6 +248,16 @@ app.layout = dbc.Container([
             width=12
         )
     ], className="mt-4"),
+
+    # Slider to query the surrogate of the sweep result, without running any simulation
+    dbc.Row([
+        dbc.Col(html.Label("Interpolated Parameter Value"), width=2),
+        dbc.Col(dcc.Slider(id='sweep-surrogate-slider', min=0, max=1, value=0, marks=None,
+                           tooltip={"placement": "bottom", "always_visible": True}), width=10),
+    ], className="mt-4"),
+    dbc.Row([
+        dbc.Col(html.Pre(id='sweep-surrogate-output'), width=12),
+    ], className="mt-2"),
     
 ])
 
@@ -615,9 +628,7 @@ def plot_epsilon(epsilon_fig):
     if crystal_active is None:
         return go.Figure(), "No active crystal to plot epsilon for."
 
-    crystal_active.run_dumb_simulation()  # Run a dummy simulation to get the epsilon array
-    crystal_active.extract_data()
-    msg  = "> A dumb simulation has been run to quickly collect epsilon data in gamma point (1st band)."
+    msg  = "> Epsilon data collected without running any eigensolve."
 
     if configuration_active["crystal_type"] == '2d':
         epsilon_fig = crystal_active.plot_epsilon()
@@ -640,10 +651,11 @@ def run_simulation(crystal):
         return go.Figure(), go.Figure(), "Please update the active crystal before running the simulation."
     
     if crystal.has_been_run is False:
-        crystal.set_solver()
-        crystal.run_simulation(runner = configuration_active["runner_1"])   #tm
-        crystal.run_simulation(runner = configuration_active["runner_2"])   #te
-        crystal.extract_data()
+        # the two runners are solved concurrently, each in its own process.
+        # Only the eigenvectors are stored and cached: full fields would make each cache entry very large, 
+        # the fields of a clicked mode are rebuilt by get_mode_fields()
+        crystal.run_simulations([configuration_active["runner_1"], configuration_active["runner_2"]], 
+                                mode_storage="eigenvectors", cache=True)   #tm, te
         crystal.has_been_run = True
     
     
@@ -742,7 +754,7 @@ def update_field_plots_by_click(clickData, e_field_fig, h_field_fig, frequency_t
     
     
     # Extract the selected k-point data from the clicked bands plot
-    kx, ky, kz, freq, polarization = clickData['points'][0]['customdata']
+    kx, ky, kz, freq, polarization = clickData['points'][0]['customdata'][:5]
     k_point = mp.Vector3(kx, ky, kz)
 
     mode_data_to_plot = {
@@ -837,7 +849,11 @@ def toggle_advanced_configuration(is_advanced):
 # Callback to sweep the geometry parameters
 @app.callback(
     [Output('sweep-result-graph', 'figure', allow_duplicate=True),
-    Output('message-box', 'value', allow_duplicate=True)],
+    Output('message-box', 'value', allow_duplicate=True),
+    Output('sweep-surrogate-slider', 'min'),
+    Output('sweep-surrogate-slider', 'max'),
+    Output('sweep-surrogate-slider', 'value'),
+    Output('sweep-surrogate-slider', 'step')],
     Input('run-sweep-button', 'n_clicks'),
     State('sweep-parameter-dropdown', 'value'),
     State('sweep-range-start-input', 'value'),
@@ -848,17 +864,50 @@ def toggle_advanced_configuration(is_advanced):
 )
 def run_sweep(n_clicks, sweep_parameter, start, end, steps, previous_message):
     print("running sweep")
-    global crystal_active, configuration_active
+    global crystal_active, configuration_active, sweep_surrogate_active, sweep_surrogate_errors_active
     if n_clicks is None:
         return dash.no_update
 
     print("...")
     sweep_values = np.linspace(start, end, steps)
-    sweep_results = crystal_active.sweep_geometry_parameter(sweep_parameter, sweep_values, crystal_active.num_bands)
+    sweep_results = crystal_active.run_geometry_sweep(sweep_parameter, sweep_values, crystal_active.num_bands, cache=True, warm_start=True,
+                                                            checkpoint=True)
     fig = crystal_active.plot_sweep_result(sweep_results)
     msg = f"Sweep results plotted for parameter {sweep_parameter}.\n"
 
-    return fig, previous_message + msg
+    # Smooth curves from the surrogate, which also answers the slider without running MPB
+    sweep_surrogate_active = SweepSurrogate(sweep_results)
+    # The leave-one-out error estimate refits the surrogate once per point: compute it once per sweep, not per slider move
+    sweep_surrogate_errors_active = sweep_surrogate_active.error_estimate()
+    fine_values = np.linspace(start, end, 200)
+    for polarization in sweep_surrogate_active.polarizations:
+        _, color = crystal_active.SWEEP_POLARIZATION_STYLES.get(polarization, (polarization, None))
+        fine_freqs = sweep_surrogate_active.predict(polarization, **{sweep_parameter: fine_values})
+        for band in range(fine_freqs.shape[-1]):
+            fig.add_trace(go.Scatter(x=fine_values, y=fine_freqs[:, band], mode='lines', line=dict(color=color, dash='dot', width=1),
+                                     legendgroup=f'{polarization}-{band}', showlegend=False, hoverinfo='skip'))
+
+    return fig, previous_message + msg, start, end, start, (end - start) / 200
+
+
+# Callback to query the surrogate of the sweep result with the slider
+@app.callback(
+    Output('sweep-surrogate-output', 'children'),
+    Input('sweep-surrogate-slider', 'value'),
+    prevent_initial_call=True
+)
+def query_sweep_surrogate(value):
+    if sweep_surrogate_active is None or value is None:
+        return dash.no_update
+    parameter = sweep_surrogate_active.parameter_names[0]
+    errors = sweep_surrogate_errors_active
+    lines = [f"{parameter} = {value:.5f}"]
+    for polarization in sweep_surrogate_active.polarizations:
+        freqs = sweep_surrogate_active.predict(polarization, **{parameter: value})
+        lines.append(f"{polarization}: " + ", ".join(
+            f"band {band}: {freq:.5f} ± {error:.1e}" for band, (freq, error) in enumerate(zip(freqs, errors[polarization]))
+        ))
+    return "\n".join(lines)
 
     #%%
 app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import meep as mp
+import numpy as np
+
+
+def canonical_form(obj):
+    """
+    Convert an object to a canonical, JSON-serializable form.
+    Two objects describing the same configuration (geometry objects, materials, lattices, resolutions, k-points, ...)
+    have the same canonical form, also across different processes and sessions.
+
+    Floats are rounded to 12 significant digits, so that values differing only by floating point noise are equal.
+
+    Args:
+        obj (object): The object to convert.
+
+    Returns:
+        object: The canonical form, made only of None, bool, int, float, str, lists and dictionaries.
+    """
+    if obj is None or isinstance(obj, (bool, str)):
+        return obj
+    if isinstance(obj, (int, np.integer)):
+        return int(obj)
+    if isinstance(obj, (float, np.floating)):
+        return float(f"{float(obj):.12g}")
+    if isinstance(obj, (complex, np.complexfloating)):
+        return ["complex", canonical_form(obj.real), canonical_form(obj.imag)]
+    if isinstance(obj, mp.Vector3):
+        return ["Vector3", canonical_form(obj.x), canonical_form(obj.y), canonical_form(obj.z)]
+    if isinstance(obj, np.ndarray):
+        return ["ndarray", list(obj.shape), [canonical_form(v) for v in obj.ravel().tolist()]]
+    if isinstance(obj, dict):
+        return {str(key): canonical_form(value) for key, value in sorted(obj.items(), key=lambda item: str(item[0]))}
+    if isinstance(obj, (list, tuple)):
+        return [canonical_form(value) for value in obj]
+    if hasattr(obj, "__dict__"):
+        attributes = {
+            key: canonical_form(value) for key, value in sorted(vars(obj).items())
+            if not key.startswith("_") and not callable(value)
+        }
+        return {"__class__": type(obj).__name__, **attributes}
+    return repr(obj)
+
+
+def configuration_hash(*objects) -> str:
+    """
+    Compute a hash of the canonical form of the given objects.
+
+    Args:
+        *objects: The objects describing the configuration.
+
+    Returns:
+        str: The SHA-256 hex digest of the canonical form.
+    """
+    canonical = json.dumps(canonical_form(list(objects)), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    A persistent, content-addressed cache of simulation results.
+    Each result is pickled in its own file, named after the configuration hash of the simulation
+    (see configuration_hash()). The total size of the cache is bounded: when it is exceeded, the least
+    recently used results are evicted. The modification time of a file is used as its last access time.
+
+    Attributes:
+        directory (str): The directory where the results are stored.
+        max_size (int): The maximum size of the cache in bytes.
+
+    Methods:
+        key(*objects): Compute the key of a configuration.
+        get(key): Get a result from the cache.
+        put(key, result): Store a result in the cache.
+        evict(): Evict the least recently used results until the cache fits in max_size.
+        info(): Get information about the cache.
+        clear(): Remove all the results from the cache.
+    """
+
+    # The default directory can be overridden with this environment variable
+    DIRECTORY_ENV_VAR = "NZI_PHC_CACHE_DIR"
+    DEFAULT_DIRECTORY = os.path.join("~", ".cache", "nzi-phc-finder")
+    DEFAULT_MAX_SIZE = 2 * 1024**3
+    SUFFIX = ".pkl"
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        """
+        Initializes the cache. The directory is created if it does not exist.
+
+        Args:
+            directory (str, optional): The directory where the results are stored. Default is None, which uses
+                the NZI_PHC_CACHE_DIR environment variable if set, otherwise ~/.cache/nzi-phc-finder.
+            max_size (int, optional): The maximum size of the cache in bytes. Default is 2 GiB.
+        """
+        if directory is None:
+            directory = os.environ.get(self.DIRECTORY_ENV_VAR, self.DEFAULT_DIRECTORY)
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def __repr__(self):
+        return f"ResultCache(directory={self.directory!r}, max_size={self.max_size})"
+
+    @staticmethod
+    def key(*objects) -> str:
+        """
+        Compute the key of a configuration, see configuration_hash().
+
+        Args:
+            *objects: The objects describing the configuration.
+
+        Returns:
+            str: The key.
+        """
+        return configuration_hash(*objects)
+
+    def _path(self, key) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _entries(self) -> list:
+        """
+        List the entries of the cache, from the least to the most recently used.
+
+        Returns:
+            list: A list of tuples (path, size in bytes, last access time).
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Removed by another process in the meantime
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def get(self, key):
+        """
+        Get a result from the cache, marking it as recently used.
+
+        Args:
+            key (str): The key of the result.
+
+        Returns:
+            object: The result, or None if it is not in the cache.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            print(f"Discarding unreadable cache entry {path}: {e}")
+            os.remove(path)
+            return None
+        os.utime(path)
+        return result
+
+    def put(self, key, result):
+        """
+        Store a result in the cache, then evict the least recently used results if the cache is too large.
+        The file is written atomically, so that concurrent processes never read a partial result.
+
+        Args:
+            key (str): The key of the result.
+            result (object): The result. It must be picklable.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(result, f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Evict the least recently used results until the size of the cache is at most max_size.
+        """
+        entries = self._entries()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for path, entry_size, _ in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def info(self) -> dict:
+        """
+        Get information about the cache.
+
+        Returns:
+            dict: A dictionary with the directory, the number of entries, the total size and the maximum size in bytes.
+        """
+        entries = self._entries()
+        return {
+            "directory": self.directory,
+            "num_entries": len(entries),
+            "size": sum(entry_size for _, entry_size, _ in entries),
+            "max_size": self.max_size,
+        }
+
+    def clear(self):
+        """
+        Remove all the results from the cache.
+        """
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -54,17 +54,25 @@ class Crystal_Materials():
             _bulk (mp.Medium): Bulk material properties.
             _atom (mp.Medium): Atom material properties.
             _substrate (mp.Medium): Substrate material properties.
+            COMPONENTS (list): The components of the crystal that have a material.
+            _configurations (dict): The configuration dictionary of each component that has been set.
             background: Gets/sets the background material properties.
             bulk: Gets/sets the bulk material properties.
             atom: Gets/sets the atom material properties.
             substrate: Gets/sets the substrate material properties.
 
+        Methods:
+            configuration(component): Get the configuration dictionary of a component.
+            parse_parameter(name): Split a material parameter name, such as 'epsilon_bulk', in key and component.
+            with_parameters(**parameters): Create a copy of the materials with some configuration values changed.
+
         
 
         Raises:
             ValueError: If invalid configuration keys are provided when setting material properties.
         """
         VALID_KEYS = ['epsilon', 'epsilon_diag', 'epsilon_offdiag', 'E_chi2_diag', 'E_chi3_diag']
+        COMPONENTS = ['background', 'bulk', 'atom', 'substrate']
     
         def __init__(self):
             """
@@ -75,6 +83,7 @@ class Crystal_Materials():
             self._bulk = None
             self._atom = None
             self._substrate = None
+            self._configurations = {}
         
    
         
@@ -99,12 +108,14 @@ class Crystal_Materials():
             if not all(key in self.VALID_KEYS for key in configuration.keys()):
                 raise ValueError("Invalid configuration keys")
             self._background = mp.Medium(**configuration)
+            self._configurations['background'] = dict(configuration)
         
         @bulk.setter
         def bulk(self, configuration: dict): 
             if not all(key in self.VALID_KEYS for key in configuration.keys()):
                 raise ValueError("Invalid configuration keys")
             self._bulk = mp.Medium(**configuration)
+            self._configurations['bulk'] = dict(configuration)
             
         
         @atom.setter
@@ -112,12 +123,88 @@ class Crystal_Materials():
             if not all(key in self.VALID_KEYS for key in configuration.keys()):
                 raise ValueError("Invalid configuration keys")
             self._atom = mp.Medium(**configuration)
+            self._configurations['atom'] = dict(configuration)
 
         @substrate.setter  
         def substrate(self, configuration: dict):
             if not all(key in self.VALID_KEYS for key in configuration.keys()):
                 raise ValueError("Invalid configuration keys")
             self._substrate = mp.Medium(**configuration)
-        
-            
+            self._configurations['substrate'] = dict(configuration)
+
+        def configuration(self, component: str) -> dict:
+            """
+            Get the configuration dictionary a component was set with.
+
+            Args:
+                component (str): The component, one of COMPONENTS.
+
+            Returns:
+                dict: A copy of the configuration dictionary.
+
+            Raises:
+                ValueError: If the component has not been set.
+            """
+            configurations = getattr(self, '_configurations', {})
+            if component not in configurations:
+                raise ValueError(f"The configuration of the {component} material is not known")
+            return dict(configurations[component])
+
+        @classmethod
+        def parse_parameter(cls, name: str):
+            """
+            Split a material parameter name in configuration key and component.
+            Material parameters are named '<key>_<component>', for example 'epsilon_bulk', 'epsilon_atom' 
+            or 'epsilon_diag_bulk'.
 
+            Args:
+                name (str): The parameter name.
+
+            Returns:
+                tuple | None: The tuple (key, component), or None if the name is not a material parameter.
+            """
+            for component in cls.COMPONENTS:
+                suffix = '_' + component
+                if name.endswith(suffix) and name[:-len(suffix)] in cls.VALID_KEYS:
+                    return name[:-len(suffix)], component
+            return None
+
+        def with_parameters(self, **parameters) -> 'Crystal_Materials':
+            """
+            Create a copy of the materials with some configuration values changed.
+            The components that are not changed keep their configuration.
+
+            Example:
+                ```python
+                materials.with_parameters(epsilon_bulk=4.5, epsilon_atom=1)
+                ```
+
+            Args:
+                **parameters: The new values, named '<key>_<component>', see parse_parameter().
+                    Setting 'epsilon' replaces any 'epsilon_diag'/'epsilon_offdiag' of the component and vice versa.
+
+            Returns:
+                Crystal_Materials: The new materials.
+
+            Raises:
+                ValueError: If a parameter name is not a material parameter.
+            """
+            configurations = {component: self.configuration(component)
+                              for component in getattr(self, '_configurations', {})}
+            for name, value in parameters.items():
+                parsed = self.parse_parameter(name)
+                if parsed is None:
+                    raise ValueError(f"Invalid material parameter: {name}")
+                key, component = parsed
+                configuration = configurations.setdefault(component, {})
+                if key == 'epsilon':
+                    configuration.pop('epsilon_diag', None)
+                    configuration.pop('epsilon_offdiag', None)
+                elif key in ('epsilon_diag', 'epsilon_offdiag'):
+                    configuration.pop('epsilon', None)
+                configuration[key] = value
+
+            materials = Crystal_Materials()
+            for component, configuration in configurations.items():
+                setattr(materials, component, configuration)
+            return materials
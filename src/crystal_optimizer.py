@@ -0,0 +1,368 @@
+import json
+import time
+import meep as mp
+import numpy as np
+from scipy.interpolate import RBFInterpolator
+from crystal_cache import canonical_form
+from crystal_parallel import default_num_workers
+
+
+class DiracTarget:
+    """
+    A design target for a Dirac degeneracy at Gamma: adjacent bands that meet at a target normalized frequency,
+    the lowest and the highest of them forming a cone with matched, nonzero slopes.
+    The degeneracy is between two bands, or between three bands for the Dirac-like cone of C4v crystals at Gamma,
+    where a flat band crosses the cone (num_degenerate=3).
+
+    The bands are solved at Gamma and at a small step dk along x. The objective is the weighted sum of the squares
+    of four mismatches:
+
+    - 'freq_error': the mean frequency of the degenerate bands at Gamma minus the target frequency;
+    - 'splitting': the frequency difference of the highest and the lowest degenerate bands at Gamma;
+    - 'slope_mismatch': the sum of the frequency changes of the highest and the lowest bands from Gamma to dk, 
+        which is zero when the upper band goes up as fast as the lower band goes down;
+    - 'slope_deficit': how much the slope of the cone, half the opening rate of the highest and the lowest bands, 
+        is below min_slope, zero above it. Without it, a degeneracy of flat bands would be as good as a cone.
+
+    Attributes:
+        target_freq (float): The target frequency, in c/a.
+        band (int): The lowest degenerate band, starting from 1.
+        runner (str): The name of the MPB runner.
+        dk (float): The step from Gamma used for the slopes, in the basis of the reciprocal lattice.
+        weights (tuple): The weights of the four mismatches in the objective.
+        num_degenerate (int): The number of degenerate bands, band to band + num_degenerate - 1.
+        min_slope (float): The minimum slope of the cone, in c/a per unit of dk.
+        upper_band (int): The highest degenerate band.
+
+    Methods:
+        k_points(): Get the k-points to solve.
+        evaluate(freqs): Compute the mismatches and the objective from the frequencies.
+    """
+
+    def __init__(self, target_freq, band, runner="run_zeven", dk=0.05, weights=(1.0, 1.0, 1.0, 1.0),
+                 num_degenerate=2, min_slope=0.1):
+        """
+        Initializes the target.
+
+        Args:
+            target_freq (float): The target frequency, in c/a.
+            band (int): The lowest degenerate band, starting from 1.
+            runner (str, optional): The name of the MPB runner. Default is 'run_zeven'.
+            dk (float, optional): The step from Gamma used for the slopes. Default is 0.05.
+            weights (tuple, optional): The weights of the frequency error, the splitting, the slope mismatch 
+                and the slope deficit. Default is (1, 1, 1, 1).
+            num_degenerate (int, optional): The number of degenerate bands. Default is 2; 3 for the Dirac-like cone 
+                of C4v crystals at Gamma.
+            min_slope (float, optional): The minimum slope of the cone, in c/a per unit of dk. Default is 0.1.
+
+        Raises:
+            ValueError: If there are not four weights or fewer than two degenerate bands.
+        """
+        if len(weights) != 4:
+            raise ValueError(f"Four weights are needed (frequency error, splitting, slope mismatch, slope deficit), "
+                             f"not {len(weights)}.")
+        if num_degenerate < 2:
+            raise ValueError(f"A degeneracy needs at least two bands, not {num_degenerate}.")
+        self.target_freq = target_freq
+        self.band = band
+        self.runner = runner
+        self.dk = dk
+        self.weights = tuple(weights)
+        self.num_degenerate = num_degenerate
+        self.min_slope = min_slope
+        self.upper_band = band + num_degenerate - 1
+
+    def __repr__(self):
+        return (f"DiracTarget(target_freq={self.target_freq}, band={self.band}, runner={self.runner!r}, dk={self.dk}, "
+                f"num_degenerate={self.num_degenerate})")
+
+    def k_points(self) -> list:
+        """
+        Get the k-points to solve: Gamma and the step dk along x.
+
+        Returns:
+            list: The k-points.
+        """
+        return [mp.Vector3(), mp.Vector3(self.dk, 0, 0)]
+
+    def evaluate(self, freqs) -> dict:
+        """
+        Compute the mismatches and the objective from the frequencies of the k-points of the target.
+
+        Args:
+            freqs (np.ndarray): The frequencies, with shape (2, number of bands).
+
+        Returns:
+            dict: The 'freq_error', 'splitting', 'slope_mismatch', 'slope_deficit', 'slope' (of the cone, 
+                not in the objective) and 'objective'.
+        """
+        degenerate = freqs[:, self.band - 1:self.upper_band]
+        lower, upper = degenerate[:, 0], degenerate[:, -1]
+        slope = ((upper[1] - upper[0]) - (lower[1] - lower[0])) / (2 * self.dk)
+        metrics = {
+            "freq_error": np.mean(degenerate[0]) - self.target_freq,
+            "splitting": np.max(degenerate[0]) - np.min(degenerate[0]),
+            "slope_mismatch": (upper[1] - upper[0]) + (lower[1] - lower[0]),
+            "slope_deficit": max(0.0, self.min_slope - slope),
+        }
+        metrics["objective"] = sum(weight * value**2 for weight, value in zip(self.weights, metrics.values()))
+        metrics["slope"] = slope
+        return {name: float(value) for name, value in metrics.items()}
+
+
+class TrustRegionOptimizer:
+    """
+    A budgeted optimizer of the parameters of a photonic crystal, for design targets such as DiracTarget.
+    It minimizes the objective with a trust-region method on a radial basis function surrogate:
+
+    1. An initial Latin hypercube design is evaluated.
+    2. A thin-plate-spline RBF (scipy.interpolate.RBFInterpolator) is fitted to all the evaluations,
+        with the parameters scaled to [0, 1].
+    3. Random candidates are drawn in a box (the trust region) around the best point, and the batch of candidates
+        with the lowest surrogate value, not too close to each other or to evaluated points, is evaluated in parallel.
+    4. The trust region is doubled after consecutive improving batches and halved after consecutive failures.
+
+    It stops when the budget of evaluations is spent or the trust region shrinks below min_radius.
+    The points of a batch are solved in worker processes with PhotonicCrystal.run_sweep(), each point being
+    applied with PhotonicCrystal.with_parameters(). Every evaluated point is logged in `history` and, if log_path
+    is given, appended to a JSON Lines file as soon as its batch completes.
+
+    Example:
+        ```python
+        target = DiracTarget(target_freq=0.5, band=2)
+        optimizer = TrustRegionOptimizer(crystal, {"r": (0.15, 0.35), "epsilon_bulk": (4, 6)}, target, budget=60,
+                                         log_path="dirac_optimization.jsonl")
+        best = optimizer.run()
+        ```
+
+    Attributes:
+        crystal (PhotonicCrystal): The crystal to optimize. It is not modified.
+        bounds (dict): The (minimum, maximum) of each parameter, by parameter name.
+        target (DiracTarget): The design target.
+        budget (int): The maximum number of evaluations.
+        batch_size (int): The number of points evaluated in parallel in each batch.
+        num_workers (int): The number of worker processes.
+        radius (float): The current half-width of the trust region, as a fraction of the range of each parameter.
+        min_radius (float): The radius below which the optimization stops.
+        log_path (str): The path of the JSON Lines log, or None.
+        history (list): The record of each evaluated point.
+
+    Methods:
+        run(): Run the optimization.
+        best(): Get the record of the best evaluated point.
+    """
+
+    INITIAL_RADIUS = 0.2
+    MAX_RADIUS = 0.5
+    # Number of consecutive improving (failing) batches after which the trust region is expanded (shrunk)
+    SUCCESS_TOLERANCE = 2
+    FAILURE_TOLERANCE = 3
+    # A batch improves if it decreases the best objective by this fraction
+    IMPROVEMENT = 1e-3
+    CANDIDATES_PER_DIMENSION = 200
+    # Smoothing of the RBF surrogate, which keeps its system solvable when evaluated points nearly coincide
+    SURROGATE_SMOOTHING = 1e-10
+    # Evaluated points that agree to this many decimals in the unit cube are merged before fitting the surrogate
+    SURROGATE_DECIMALS = 9
+
+    def __init__(self, crystal, bounds, target, budget=50, batch_size=None, num_workers=None,
+                 initial_points=None, min_radius=1e-3, log_path=None, seed=None):
+        """
+        Initializes the optimizer.
+
+        Args:
+            crystal (PhotonicCrystal): The crystal to optimize. Its num_bands must include the upper band of the target.
+            bounds (dict): The (minimum, maximum) of each parameter, by parameter name,
+                see PhotonicCrystal.with_parameters().
+            target (DiracTarget): The design target.
+            budget (int, optional): The maximum number of evaluations. Default is 50.
+            batch_size (int, optional): The number of points evaluated in parallel. Default is None,
+                which uses the number of workers.
+            num_workers (int, optional): The number of worker processes. Default is None, which uses all available CPUs.
+            initial_points (int, optional): The size of the initial design. Default is None,
+                which uses max(2 * number of parameters + 1, batch_size), within the budget.
+            min_radius (float, optional): The radius below which the optimization stops. Default is 1e-3.
+            log_path (str, optional): The path of the JSON Lines log. Default is None, which keeps the log in memory only.
+            seed (int, optional): The seed of the random candidates. Default is None.
+
+        Raises:
+            ValueError: If the crystal does not compute enough bands, or the bounds are empty.
+        """
+        if crystal.num_bands < target.upper_band:
+            raise ValueError(f"The crystal computes {crystal.num_bands} bands, the target needs {target.upper_band}.")
+        if not bounds:
+            raise ValueError("At least one parameter must be optimized.")
+        self.crystal = crystal
+        self.bounds = {name: (float(low), float(high)) for name, (low, high) in bounds.items()}
+        self.target = target
+        self.budget = budget
+        self.num_workers = num_workers if num_workers is not None else default_num_workers()
+        self.batch_size = batch_size if batch_size is not None else self.num_workers
+        dimension = len(self.bounds)
+        if initial_points is None:
+            initial_points = max(2 * dimension + 1, self.batch_size)
+        self.initial_points = min(initial_points, budget)
+        self.radius = self.INITIAL_RADIUS
+        self.min_radius = min_radius
+        self.log_path = log_path
+        self.history = []
+        self._rng = np.random.default_rng(seed)
+        self._lower = np.array([low for low, _ in self.bounds.values()])
+        self._span = np.array([high - low for low, high in self.bounds.values()])
+
+    def __repr__(self):
+        return (f"TrustRegionOptimizer(parameters={list(self.bounds)}, target={self.target!r}, "
+                f"evaluations={len(self.history)}/{self.budget})")
+
+    def _to_parameters(self, unit_point) -> dict:
+        """
+        Convert a point of the unit cube to parameter values.
+
+        Args:
+            unit_point (np.ndarray): The point, with a coordinate in [0, 1] per parameter.
+
+        Returns:
+            dict: The parameter values, by name.
+        """
+        values = self._lower + np.asarray(unit_point) * self._span
+        return {name: float(value) for name, value in zip(self.bounds, values)}
+
+    def _latin_hypercube(self, n) -> np.ndarray:
+        """
+        Draw a Latin hypercube design in the unit cube.
+
+        Args:
+            n (int): The number of points.
+
+        Returns:
+            np.ndarray: The points, with shape (n, number of parameters).
+        """
+        dimension = len(self.bounds)
+        strata = np.stack([self._rng.permutation(n) for _ in range(dimension)], axis=1)
+        return (strata + self._rng.random((n, dimension))) / n
+
+    def _evaluate(self, unit_points):
+        """
+        Evaluate a batch of points in parallel, adding them to the history and to the log.
+
+        Args:
+            unit_points (np.ndarray): The points in the unit cube, with shape (N, number of parameters).
+        """
+        points = [self._to_parameters(unit_point) for unit_point in unit_points]
+        parameters = {name: [point[name] for point in points] for name in self.bounds}
+        start = time.time()
+        result = self.crystal.run_sweep(parameters, grid=False, runners=(self.target.runner,), polarizations=["target"],
+                                        k_points=self.target.k_points(), num_workers=self.num_workers)
+        elapsed = time.time() - start
+        batch = 1 + max((record["batch"] for record in self.history), default=-1)
+        records = []
+        for i, (unit_point, point) in enumerate(zip(unit_points, points)):
+            metrics = self.target.evaluate(result.freqs["target"][i])
+            records.append({
+                "evaluation": len(self.history) + i,
+                "batch": batch,
+                "parameters": point,
+                "unit_point": [float(x) for x in unit_point],
+                "radius": self.radius,
+                "batch_seconds": elapsed,
+                **metrics,
+            })
+        self.history.extend(records)
+        if self.log_path is not None:
+            with open(self.log_path, "a") as f:
+                for record in records:
+                    f.write(json.dumps(canonical_form(record)) + "\n")
+        best = self.best()
+        print(f"Optimizer batch {batch}: {len(records)} points in {elapsed:.1f} s, "
+              f"best objective {best['objective']:.3e} at {best['parameters']}.")
+
+    def _propose(self, n) -> np.ndarray:
+        """
+        Propose a batch of points in the trust region around the best point, with the lowest surrogate values.
+        Evaluated points that coincide are merged, keeping their lowest objective. If fewer than dimension + 1 
+        distinct points are evaluated, or the surrogate cannot be fitted (e.g. all the points on a line), 
+        the candidates are taken in random order instead.
+
+        Args:
+            n (int): The number of points.
+
+        Returns:
+            np.ndarray: The points in the unit cube, with shape (n, number of parameters).
+        """
+        evaluated = np.array([record["unit_point"] for record in self.history])
+        objectives = np.array([record["objective"] for record in self.history])
+        dimension = evaluated.shape[1]
+        # Repeated points make the RBF system singular: keep the lowest objective of each distinct point
+        unique_points, inverse = np.unique(np.round(evaluated, self.SURROGATE_DECIMALS), axis=0, return_inverse=True)
+        unique_objectives = np.full(len(unique_points), np.inf)
+        np.minimum.at(unique_objectives, inverse.ravel(), objectives)
+
+        center = np.array(self.best()["unit_point"])
+        num_candidates = self.CANDIDATES_PER_DIMENSION * dimension
+        candidates = center + self.radius * (2 * self._rng.random((num_candidates, dimension)) - 1)
+        candidates = np.clip(candidates, 0, 1)
+        order = self._rng.permutation(num_candidates)
+        # The thin-plate spline has a linear polynomial term, which needs dimension + 1 points
+        if len(unique_points) > dimension:
+            try:
+                # The objective spans orders of magnitude close to a degeneracy: the surrogate is fitted to its logarithm
+                surrogate = RBFInterpolator(unique_points, np.log10(unique_objectives + 1e-16), 
+                                            kernel="thin_plate_spline", smoothing=self.SURROGATE_SMOOTHING)
+                order = np.argsort(surrogate(candidates))
+            except np.linalg.LinAlgError:
+                print("Optimizer: the surrogate cannot be fitted to the evaluated points, the candidates are drawn at random.")
+
+        min_distance = 0.1 * self.radius
+        selected = []
+        for candidate in candidates[order]:
+            others = np.vstack([evaluated] + selected) if selected else evaluated
+            if np.min(np.linalg.norm(others - candidate, axis=1)) >= min_distance:
+                selected.append(candidate[np.newaxis])
+                if len(selected) == n:
+                    break
+        if not selected:
+            return np.empty((0, dimension))
+        return np.vstack(selected)
+
+    def best(self) -> dict:
+        """
+        Get the record of the best evaluated point.
+
+        Returns:
+            dict: The record, with the 'parameters', the 'objective' and the mismatches of the target.
+        """
+        return min(self.history, key=lambda record: record["objective"])
+
+    def run(self) -> dict:
+        """
+        Run the optimization until the budget is spent or the trust region shrinks below min_radius.
+        It can be called again with a larger budget to continue from the evaluated points.
+
+        Returns:
+            dict: The record of the best evaluated point, see best().
+        """
+        if not self.history:
+            self._evaluate(self._latin_hypercube(self.initial_points))
+        successes = failures = 0
+        while len(self.history) < self.budget and self.radius >= self.min_radius:
+            previous_best = self.best()["objective"]
+            batch = self._propose(min(self.batch_size, self.budget - len(self.history)))
+            if len(batch) == 0:
+                # The trust region is filled with evaluated points
+                self.radius /= 2
+                continue
+            self._evaluate(batch)
+            if self.best()["objective"] < previous_best - self.IMPROVEMENT * abs(previous_best):
+                successes, failures = successes + 1, 0
+            else:
+                successes, failures = 0, failures + 1
+            if successes >= self.SUCCESS_TOLERANCE:
+                self.radius = min(2 * self.radius, self.MAX_RADIUS)
+                successes = 0
+            elif failures >= self.FAILURE_TOLERANCE:
+                self.radius /= 2
+                failures = 0
+
+        best = self.best()
+        print(f"Optimizer: {len(self.history)} evaluations, best objective {best['objective']:.3e} at {best['parameters']}.")
+        return best
@@ -0,0 +1,211 @@
+import math
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def split_k_points(k_points, num_chunks):
+    """
+    Split a list of k-points into contiguous chunks, preserving the k-path order.
+
+    Args:
+        k_points (list): The k-points to split.
+        num_chunks (int): The number of chunks. It is reduced if there are fewer k-points than chunks.
+
+    Returns:
+        list: A list of lists of k-points. Concatenating the chunks gives back the original list.
+    """
+    num_chunks = max(1, min(num_chunks, len(k_points)))
+    bounds = np.linspace(0, len(k_points), num_chunks + 1).astype(int)
+    return [list(k_points[start:stop]) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def default_num_workers():
+    """
+    Get the default number of worker processes, i.e. the number of CPUs available to this process.
+
+    Returns:
+        int: The number of worker processes.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _call_method(obj, method_name, kwargs):
+    """
+    Call a method of a (pickled) object. This is the function executed by the worker processes.
+
+    Args:
+        obj (object): The object whose method is called.
+        method_name (str): The name of the method.
+        kwargs (dict): The keyword arguments of the method.
+
+    Returns:
+        The value returned by the method.
+    """
+    return getattr(obj, method_name)(**kwargs)
+
+
+def _components(value, default) -> tuple:
+    """
+    Get the x, y, z components of a resolution or a lattice size.
+
+    Args:
+        value (int | float | tuple | mp.Vector3): A scalar (the same for all the directions), a tuple or a vector.
+        default (float): The value of the components missing from a tuple.
+
+    Returns:
+        tuple: The three components.
+    """
+    if hasattr(value, "x"):
+        return (value.x, value.y, value.z)
+    if isinstance(value, (tuple, list)):
+        return tuple(value[:3]) + (default,) * (3 - len(value[:3]))
+    return (value, value, value)
+
+
+def estimate_solve_cost(resolution, lattice_size, num_bands, num_k_points=1) -> float:
+    """
+    Estimate the relative cost of an MPB solve, to schedule jobs of different sizes and estimate their duration.
+    Each iteration of the eigensolver applies the Maxwell operator to every band with FFTs, O(N log N) per band, 
+    and orthogonalizes the bands, O(N num_bands²), where N is the number of points of the grid. 
+    The number of iterations per k-point is assumed to be the same for all the solves.
+
+    Args:
+        resolution (int | tuple | mp.Vector3): The resolution, in grid points per unit of length.
+        lattice_size (tuple | mp.Vector3): The size of the lattice. Directions with no size (e.g. z in 2D) 
+            have a single grid point.
+        num_bands (int): The number of bands.
+        num_k_points (int, optional): The number of k-points. Default is 1.
+
+    Returns:
+        float: The estimated cost, in arbitrary units. Only ratios of costs are meaningful.
+    """
+    num_points = 1
+    for res, size in zip(_components(resolution, 1), _components(lattice_size, 0)):
+        num_points *= max(1, int(round(res * size)))
+    return num_k_points * num_points * (num_bands * math.log2(num_points + 1) + num_bands**2)
+
+
+class ProgressTracker:
+    """
+    Print the progress of a batch of jobs, with an estimated time of arrival from the estimated cost of the jobs
+    (see estimate_solve_cost()): the elapsed time is extrapolated to the cost left.
+
+    Attributes:
+        label (str): The label of the printed lines.
+        num_jobs (int): The number of jobs.
+        total_cost (float): The estimated cost of all the jobs.
+        done_cost (float): The estimated cost of the completed jobs.
+        num_done (int): The number of completed jobs.
+
+    Methods:
+        update(cost): Record a completed job and print the progress.
+    """
+
+    def __init__(self, costs, label="Progress"):
+        """
+        Initializes the tracker and starts the clock.
+
+        Args:
+            costs (list): The estimated cost of each job.
+            label (str, optional): The label of the printed lines. Default is 'Progress'.
+        """
+        self.label = label
+        self.num_jobs = len(costs)
+        self.total_cost = float(sum(costs))
+        self.done_cost = 0.0
+        self.num_done = 0
+        self._start = time.time()
+
+    def update(self, cost):
+        """
+        Record a completed job and print the progress and the estimated time left.
+
+        Args:
+            cost (float): The estimated cost of the completed job.
+        """
+        self.done_cost += cost
+        self.num_done += 1
+        elapsed = time.time() - self._start
+        if self.total_cost > 0:
+            fraction = self.done_cost / self.total_cost
+        else:
+            fraction = self.num_done / self.num_jobs
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else float("nan")
+        print(f"{self.label}: {self.num_done}/{self.num_jobs} done ({100 * fraction:.0f}% of the estimated cost), "
+              f"{elapsed:.0f} s elapsed, ETA {eta:.0f} s.")
+
+
+def run_in_pool(calls, num_workers=None, callback=None, costs=None, progress=False):
+    """
+    Run a list of method calls on a pool of worker processes.
+    Each call is a tuple (obj, method_name, kwargs): the object is pickled and sent to a worker,
+    where `obj.method_name(**kwargs)` is executed.
+
+    If the costs of the calls are given, the calls are submitted largest first (longest processing time first), 
+    so that no worker is left alone with a large call at the end of the batch.
+
+    Args:
+        calls (list): The list of (obj, method_name, kwargs) tuples.
+        num_workers (int, optional): The number of worker processes. Default is None, which uses all available CPUs.
+        callback (callable, optional): Called in this process as `callback(i, result)` as soon as the i-th call 
+            completes, in completion order. Default is None.
+        costs (list, optional): The estimated cost of each call, see estimate_solve_cost(). Default is None, 
+            which submits the calls in order.
+        progress (bool, optional): Print the progress with an estimated time left, see ProgressTracker. 
+            Default is False.
+
+    Returns:
+        list: The results of the calls, in the same order as `calls`.
+    """
+    if num_workers is None:
+        num_workers = default_num_workers()
+    num_workers = max(1, min(num_workers, len(calls)))
+    order = list(range(len(calls)))
+    if costs is not None:
+        order.sort(key=lambda i: costs[i], reverse=True)
+    tracker = ProgressTracker(costs if costs is not None else [1] * len(calls)) if progress else None
+
+    results = [None] * len(calls)
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        # The pool starts the calls in the order they are submitted
+        futures = {}
+        for i in order:
+            obj, method_name, kwargs = calls[i]
+            futures[executor.submit(_call_method, obj, method_name, kwargs)] = i
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            if tracker is not None:
+                tracker.update(costs[i] if costs is not None else 1)
+            if callback is not None:
+                callback(i, results[i])
+    return results
+
+
+def compute_gap_list(freqs):
+    """
+    Compute the list of band gaps from the frequencies of all the k-points.
+    It follows the same convention as `mpb.ModeSolver.gap_list`, so that results merged from
+    several solvers can be compared with a single serial run.
+
+    Args:
+        freqs (np.ndarray): The frequencies, with shape (number of k-points, number of bands).
+
+    Returns:
+        list: A list of tuples (gap size in percent, lower frequency, upper frequency).
+    """
+    freqs = np.asarray(freqs)
+    gap_list = []
+    if freqs.size == 0:
+        return gap_list
+    band_min = np.min(freqs, axis=0)
+    band_max = np.max(freqs, axis=0)
+    for lower_max, upper_min in zip(band_max[:-1], band_min[1:]):
+        if upper_min > lower_max:
+            gap_size = 200 * (upper_min - lower_max) / (upper_min + lower_max)
+            gap_list.append((gap_size, lower_max, upper_min))
+    return gap_list
@@ -0,0 +1,203 @@
+import numpy as np
+from scipy.interpolate import UnivariateSpline, RBFInterpolator
+from crystal_sweeps import SweepResult
+
+
+class SweepSurrogate:
+    """
+    A surrogate model of the frequencies of a sweep, to query them between the sample points without solving.
+    An interpolant is fitted to each band of each polarization, at one k-point of the sweep:
+
+    - for a sweep over one parameter, a cubic smoothing spline (scipy.interpolate.UnivariateSpline);
+    - for a sweep over several parameters, a thin-plate-spline RBF (scipy.interpolate.RBFInterpolator),
+        with each parameter scaled to [0, 1] so that no parameter dominates the distances.
+
+    The error of the surrogate is estimated by leave-one-out: each sample point is predicted by the surrogate
+    fitted without it. The estimate is computed on first use, since it refits the surrogate once per point.
+
+    Example:
+        ```python
+        result = crystal.run_sweep({"r": np.linspace(0.1, 0.4, 16)})
+        surrogate = SweepSurrogate(result)
+        surrogate.predict("zeven", r=np.linspace(0.1, 0.4, 500))   # Shape (500, number of bands)
+        surrogate.error_estimate()["zeven"]                        # Largest leave-one-out error of each band
+        ```
+
+    Attributes:
+        parameter_names (list): The names of the parameters, in the order of the sweep dimensions.
+        polarizations (list): The polarizations of the sweep.
+        num_bands (int): The number of bands of each polarization.
+        k_index (int): The index of the k-point of the sweep the surrogate is fitted to.
+        smoothing (float): The smoothing of the interpolants. 0 interpolates the samples exactly.
+        bounds (np.ndarray): The minimum and maximum of each parameter, with shape (number of parameters, 2).
+
+    Methods:
+        predict(polarization, band, **values): Predict the frequencies at some parameter values.
+        loo_errors(): Get the leave-one-out errors of every sample point.
+        error_estimate(): Get the largest leave-one-out error of each band.
+    """
+
+    def __init__(self, result: SweepResult, k_index=0, smoothing=0.0):
+        """
+        Fit the surrogate to a sweep result. Points where a band was not computed (NaN) are ignored for that band.
+
+        Args:
+            result (SweepResult): The sweep result, see crystal_sweeps.SweepResult.
+            k_index (int, optional): The index of the k-point of the sweep to fit. Default is 0.
+            smoothing (float, optional): The smoothing of the interpolants, see the `s` argument of UnivariateSpline
+                and the `smoothing` argument of RBFInterpolator. Default is 0, which interpolates the samples exactly.
+        """
+        points = [point for _, point in result.points()]
+        self.parameter_names = list(result.parameters)
+        self.polarizations = result.polarizations
+        self.k_index = k_index
+        self.smoothing = smoothing
+        self._x = np.array([[point[name] for name in self.parameter_names] for point in points], dtype=float)
+        self.bounds = np.stack([self._x.min(axis=0), self._x.max(axis=0)], axis=1)
+        # Samples of each polarization, with shape (number of points, number of bands)
+        self._y = {
+            polarization: np.reshape(freqs[..., k_index, :], (len(points), -1))
+            for polarization, freqs in result.freqs.items()
+        }
+        self.num_bands = max(y.shape[1] for y in self._y.values())
+        self._interpolants = {
+            polarization: [self._fit(self._x, y[:, band]) for band in range(y.shape[1])]
+            for polarization, y in self._y.items()
+        }
+        self._loo_errors = None
+
+    def __repr__(self):
+        return (f"SweepSurrogate(parameters={self.parameter_names}, polarizations={self.polarizations}, "
+                f"num_bands={self.num_bands})")
+
+    def _scale(self, x) -> np.ndarray:
+        """
+        Scale parameter values to [0, 1] with the bounds of the samples.
+
+        Args:
+            x (np.ndarray): The parameter values, with shape (N, number of parameters).
+
+        Returns:
+            np.ndarray: The scaled values.
+        """
+        span = self.bounds[:, 1] - self.bounds[:, 0]
+        return (x - self.bounds[:, 0]) / np.where(span > 0, span, 1)
+
+    def _fit(self, x, y):
+        """
+        Fit the interpolant of one band.
+
+        Args:
+            x (np.ndarray): The parameter values of the samples, with shape (N, number of parameters).
+            y (np.ndarray): The frequencies of the samples, with shape (N,). NaN samples are ignored.
+
+        Returns:
+            callable: The interpolant, taking values with shape (M, number of parameters) and returning shape (M,),
+                or None if there are not enough samples.
+        """
+        valid = ~np.isnan(y)
+        x, y = x[valid], y[valid]
+        if len(y) < 2:
+            return None
+        if x.shape[1] == 1:
+            order = np.argsort(x[:, 0])
+            x_sorted, y_sorted = x[order, 0], y[order]
+            # UnivariateSpline needs strictly increasing values: average repeated samples
+            x_unique, inverse = np.unique(x_sorted, return_inverse=True)
+            if len(x_unique) < 2:
+                return None
+            y_unique = np.bincount(inverse, weights=y_sorted) / np.bincount(inverse)
+            spline = UnivariateSpline(x_unique, y_unique, k=min(3, len(x_unique) - 1), s=self.smoothing)
+            return lambda values: spline(values[:, 0])
+        rbf = RBFInterpolator(self._scale(x), y, kernel="thin_plate_spline", smoothing=self.smoothing)
+        return lambda values: rbf(self._scale(values))
+
+    def _query_points(self, values) -> tuple:
+        """
+        Broadcast the queried parameter values to a list of points.
+
+        Args:
+            values (dict): The values of every parameter, by parameter name. They are broadcast together.
+
+        Returns:
+            tuple: A tuple containing the points, with shape (M, number of parameters), and the broadcast shape.
+
+        Raises:
+            ValueError: If a parameter is missing or unknown.
+        """
+        missing = set(self.parameter_names) - set(values)
+        unknown = set(values) - set(self.parameter_names)
+        if missing or unknown:
+            raise ValueError(f"Give a value for each of the parameters {self.parameter_names}.")
+        arrays = np.broadcast_arrays(*[np.asarray(values[name], dtype=float) for name in self.parameter_names])
+        shape = arrays[0].shape
+        return np.stack([a.ravel() for a in arrays], axis=1), shape
+
+    def predict(self, polarization, band=None, **values) -> np.ndarray:
+        """
+        Predict the frequencies at some parameter values. The query is vectorized: the values of the parameters
+        can be arrays, which are broadcast together. Values outside the bounds of the samples are extrapolated.
+
+        Args:
+            polarization (str): The polarization.
+            band (int, optional): The band. Default is None, which predicts all the bands.
+            **values: The values of every parameter.
+
+        Returns:
+            np.ndarray: The frequencies, with the broadcast shape of the values, plus a last dimension with
+                the bands if band is None. Bands without enough samples are NaN.
+        """
+        points, shape = self._query_points(values)
+        interpolants = self._interpolants[polarization]
+        bands = range(len(interpolants)) if band is None else [band]
+        freqs = np.full((len(points), len(bands)), np.nan)
+        for i, b in enumerate(bands):
+            if interpolants[b] is not None:
+                freqs[:, i] = interpolants[b](points)
+        if band is None:
+            return freqs.reshape(shape + (len(bands),))
+        return freqs[:, 0].reshape(shape)
+
+    __call__ = predict
+
+    def loo_errors(self) -> dict:
+        """
+        Get the leave-one-out errors: the difference between the frequency of each sample and the prediction
+        of the surrogate fitted to all the other samples. They are computed once and cached.
+
+        Returns:
+            dict: The errors of each polarization, with shape (number of points, number of bands).
+                NaN where the band was not computed or cannot be fitted without the point.
+        """
+        if self._loo_errors is None:
+            self._loo_errors = {}
+            for polarization, y in self._y.items():
+                errors = np.full(y.shape, np.nan)
+                for i in range(len(self._x)):
+                    keep = np.arange(len(self._x)) != i
+                    for band in range(y.shape[1]):
+                        if np.isnan(y[i, band]):
+                            continue
+                        interpolant = self._fit(self._x[keep], y[keep, band])
+                        if interpolant is not None:
+                            errors[i, band] = interpolant(self._x[i:i + 1])[0] - y[i, band]
+                self._loo_errors[polarization] = errors
+        return self._loo_errors
+
+    def error_estimate(self) -> dict:
+        """
+        Get an estimate of the error of the surrogate: the largest absolute leave-one-out error of each band.
+        It is pessimistic inside the sampled range, since each sample is predicted from sparser samples,
+        and it is less reliable at the boundary, where leaving a sample out means extrapolating.
+
+        Returns:
+            dict: The error estimate of each polarization, with shape (number of bands,).
+        """
+        estimate = {}
+        for polarization, errors in self.loo_errors().items():
+            with np.errstate(invalid="ignore"):
+                absolute = np.abs(errors)
+            estimate[polarization] = np.array([
+                np.nanmax(column) if np.any(~np.isnan(column)) else np.nan for column in absolute.T
+            ])
+        return estimate
@@ -0,0 +1,363 @@
+import csv
+import itertools
+import os
+import pickle
+import numpy as np
+
+
+def sweep_points(parameters, grid=True) -> tuple:
+    """
+    Build the points of a multi-dimensional parameter sweep.
+
+    Args:
+        parameters (dict): The values of each parameter, by parameter name.
+        grid (bool, optional): If True (default), the points are the Cartesian product of the values of all the
+            parameters. If False, the values of all the parameters have the same length and the i-th point takes
+            the i-th value of every parameter.
+
+    Returns:
+        tuple: A tuple containing the list of points (dictionaries of parameter values) and the shape of the sweep,
+            i.e. the number of values of each parameter for a grid or (number of points,) for a list.
+
+    Raises:
+        ValueError: If there are no parameters, or if the values of a list sweep do not have the same length.
+    """
+    if not parameters:
+        raise ValueError("At least one parameter must be swept.")
+    names = list(parameters)
+    values = [list(parameters[name]) for name in names]
+    if grid:
+        points = [dict(zip(names, point)) for point in itertools.product(*values)]
+        shape = tuple(len(v) for v in values)
+    else:
+        lengths = {len(v) for v in values}
+        if len(lengths) != 1:
+            raise ValueError("The values of all the parameters of a list sweep must have the same length.")
+        points = [dict(zip(names, point)) for point in zip(*values)]
+        shape = (len(points),)
+    return points, shape
+
+
+class SweepResult:
+    """
+    The result of a multi-dimensional parameter sweep, see PhotonicCrystal.run_sweep().
+    The frequencies of each polarization are a labelled N-dimensional array whose dimensions are given by `dims`:
+    the sweep dimensions, then 'k_point' and 'band'. For a grid sweep there is a sweep dimension per parameter,
+    named after it. For a list sweep there is a single 'point' dimension.
+    Bands that were not computed at a point (e.g. when 'num_bands' is swept) are NaN.
+    Mode dictionaries, with fields or eigenvectors, are optional and are kept out of the frequency arrays in `modes`.
+
+    Attributes:
+        parameters (dict): The values of each parameter, by parameter name. For a grid sweep, these are the
+            coordinates of the dimension of the parameter; for a list sweep, the value at each point.
+        grid (bool): Whether the sweep is a grid or a list of points.
+        k_points (list): The k-points solved at each point.
+        freqs (dict): The frequencies of each polarization, with shape (*shape, number of k-points, number of bands).
+        modes (dict | None): The mode dictionaries of each polarization, as a list with the modes of each point 
+            in the order of points(), or None if the modes were not stored.
+        iterations (dict | None): The eigensolver iterations of each runner, or None if they were not recorded.
+            For each runner, a dictionary of arrays with the shape of the sweep (NaN where the point was not solved, 
+            e.g. loaded from the cache), see PhotonicCrystal.run_geometry_sweep().
+        errors (dict | None): The estimated error of the frequencies of each polarization, with the shape of freqs, 
+            for frequencies that are predicted instead of solved (e.g. by PhotonicCrystal.run_perturbative_sweep()).
+            None if all the frequencies were solved.
+        dims (tuple): The names of the dimensions of the frequency arrays.
+        shape (tuple): The shape of the sweep dimensions.
+
+    Methods:
+        points(): Iterate over the points of the sweep.
+        sel(polarization, **values): Select the frequencies at some parameter values.
+        band_freqs(polarization, band, k_index): Get the frequencies of a band over the sweep.
+        to_npz(path): Save the frequency arrays and the parameter values to a .npz file.
+        to_csv(path): Save the frequencies to a CSV file, one row per point, polarization, k-point and band.
+        from_steps(steps): Convert the list of step dictionaries of the deprecated sweep_geometry_parameter().
+        to_steps(): Convert a single-parameter sweep with modes to the list of step dictionaries.
+    """
+
+    def __init__(self, parameters, grid, k_points, freqs, modes=None, iterations=None, errors=None):
+        """
+        Initializes the result.
+
+        Args:
+            parameters (dict): The values of each parameter, by parameter name.
+            grid (bool): Whether the sweep is a grid or a list of points.
+            k_points (list): The k-points solved at each point.
+            freqs (dict): The frequencies of each polarization.
+            modes (dict, optional): The mode dictionaries of each polarization. Default is None.
+            iterations (dict, optional): The eigensolver iterations of each runner. Default is None.
+            errors (dict, optional): The estimated error of the frequencies of each polarization. Default is None.
+        """
+        self.parameters = {name: np.asarray(values) for name, values in parameters.items()}
+        self.grid = grid
+        self.k_points = list(k_points)
+        self.freqs = freqs
+        self.modes = modes
+        self.iterations = iterations
+        self.errors = errors
+        sweep_dims = tuple(self.parameters) if grid else ("point",)
+        self.dims = sweep_dims + ("k_point", "band")
+        _, self.shape = sweep_points(self.parameters, grid)
+
+    def __repr__(self):
+        sizes = ", ".join(f"{dim}: {size}" for dim, size in zip(self.dims, next(iter(self.freqs.values())).shape))
+        return f"SweepResult({sizes}; polarizations: {', '.join(self.freqs)})"
+
+    @property
+    def polarizations(self) -> list:
+        return list(self.freqs)
+
+    def points(self):
+        """
+        Iterate over the points of the sweep.
+
+        Yields:
+            tuple: The index of the point in the sweep dimensions and the dictionary of its parameter values.
+        """
+        points, _ = sweep_points(self.parameters, self.grid)
+        for index, point in zip(np.ndindex(*self.shape), points):
+            yield index, point
+
+    def sel(self, polarization, **values) -> np.ndarray:
+        """
+        Select the frequencies at some parameter values. Values are matched with np.isclose.
+
+        Example:
+            ```python
+            result.sel("zeven", r=0.2)[..., 0, 1]   # Band 1 at the first k-point, over the other parameters
+            ```
+
+        Args:
+            polarization (str): The polarization.
+            **values: The parameter values to select. Parameters that are not given are kept.
+
+        Returns:
+            np.ndarray: The selected frequencies. For a grid sweep, the dimensions of the given parameters are
+                removed; for a list sweep, the 'point' dimension keeps only the matching points.
+
+        Raises:
+            ValueError: If a parameter is not swept or a value is not found.
+        """
+        freqs = self.freqs[polarization]
+        for name in values:
+            if name not in self.parameters:
+                raise ValueError(f"Parameter {name} is not swept. Swept parameters: {list(self.parameters)}")
+        if not self.grid:
+            mask = np.ones(self.shape[0], dtype=bool)
+            for name, value in values.items():
+                mask &= np.isclose(self.parameters[name], value)
+            if not np.any(mask):
+                raise ValueError(f"No point of the sweep has {values}.")
+            return freqs[mask]
+
+        index = []
+        for name, coordinates in self.parameters.items():
+            if name not in values:
+                index.append(slice(None))
+                continue
+            matches = np.flatnonzero(np.isclose(coordinates, values[name]))
+            if matches.size == 0:
+                raise ValueError(f"Value {values[name]} of {name} is not in the sweep.")
+            index.append(matches[0])
+        return freqs[tuple(index)]
+
+    def band_freqs(self, polarization, band, k_index=0) -> np.ndarray:
+        """
+        Get the frequencies of a band at a k-point over the whole sweep.
+
+        Args:
+            polarization (str): The polarization.
+            band (int): The band index.
+            k_index (int, optional): The index of the k-point in k_points. Default is 0.
+
+        Returns:
+            np.ndarray: The frequencies, with the shape of the sweep.
+        """
+        return self.freqs[polarization][..., k_index, band]
+
+
+    def to_npz(self, path):
+        """
+        Save the frequency arrays and the parameter values to a compressed .npz file. The modes are not saved.
+        The arrays are named 'freqs_<polarization>', 'errors_<polarization>' (if errors are estimated) and 
+        'parameter_<name>'; 'k_points' has shape (number of k-points, 3) and 'dims' holds the names of the dimensions.
+
+        Args:
+            path (str): The path of the file.
+        """
+        arrays = {f"parameter_{name}": values for name, values in self.parameters.items()}
+        arrays.update({f"freqs_{polarization}": freqs for polarization, freqs in self.freqs.items()})
+        if self.errors is not None:
+            arrays.update({f"errors_{polarization}": errors for polarization, errors in self.errors.items()})
+        arrays["k_points"] = np.array([[k.x, k.y, k.z] for k in self.k_points])
+        arrays["dims"] = np.array(self.dims)
+        arrays["grid"] = np.array(self.grid)
+        np.savez_compressed(path, **arrays)
+
+    def to_csv(self, path):
+        """
+        Save the frequencies to a CSV file, with one row per point, polarization, k-point and band.
+        The columns are the parameters, 'polarization', 'kx', 'ky', 'kz', 'band' and 'freq'. 
+        Bands that were not computed are skipped.
+
+        Args:
+            path (str): The path of the file.
+        """
+        names = list(self.parameters)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(names + ["polarization", "kx", "ky", "kz", "band", "freq"])
+            for index, point in self.points():
+                values = [point[name] for name in names]
+                for polarization, freqs in self.freqs.items():
+                    for k_point, k_freqs in zip(self.k_points, freqs[index]):
+                        for band, freq in enumerate(k_freqs):
+                            if not np.isnan(freq):
+                                writer.writerow(values + [polarization, k_point.x, k_point.y, k_point.z, band, freq])
+
+    @classmethod
+    def from_steps(cls, steps) -> 'SweepResult':
+        """
+        Convert the list of step dictionaries returned by the deprecated sweep_geometry_parameter(). 
+        Each step has the keys 'parameter_name', 'parameter_value', 'modes_zeven' and 'modes_zodd'.
+
+        Args:
+            steps (list): The list of step dictionaries.
+
+        Returns:
+            SweepResult: The equivalent result, keeping the modes.
+        """
+        name = steps[0]["parameter_name"]
+        polarizations = [key[len("modes_"):] for key in steps[0] if key.startswith("modes_")]
+        modes = {polarization: [step[f"modes_{polarization}"] for step in steps] for polarization in polarizations}
+        freqs = {
+            polarization: np.array([[[mode["freq"] for mode in step_modes]] for step_modes in modes[polarization]])
+            for polarization in polarizations
+        }
+        k_points = [steps[0][f"modes_{polarizations[0]}"][0]["k_point"]]
+        return cls({name: [step["parameter_value"] for step in steps]}, True, k_points, freqs, modes=modes)
+
+    def to_steps(self) -> list:
+        """
+        Convert a sweep over a single parameter to the list of step dictionaries returned by the deprecated 
+        sweep_geometry_parameter(), the inverse of from_steps().
+
+        Returns:
+            list: One dictionary per value, with the keys 'parameter_name', 'parameter_value' and 
+                'modes_<polarization>' for each polarization.
+
+        Raises:
+            ValueError: If more than one parameter is swept or the modes were not stored.
+        """
+        if len(self.parameters) != 1:
+            raise ValueError(f"Only a sweep over a single parameter can be converted to steps, not {list(self.parameters)}.")
+        if self.modes is None:
+            raise ValueError("The modes were not stored, sweep with mode_storage='fields' or 'eigenvectors'.")
+        (name, values), = self.parameters.items()
+        return [
+            {"parameter_name": name, "parameter_value": value.item(),
+             **{f"modes_{polarization}": modes[i] for polarization, modes in self.modes.items()}}
+            for i, value in enumerate(values)
+        ]
+
+
+class SweepCheckpoint:
+    """
+    An append-only file with the completed points of a sweep, so that an interrupted sweep can be resumed.
+    The file is named after a key that identifies the specification of the sweep (crystal, swept values, runners, 
+    k-points, ...): a sweep restarted with the same specification finds the same file and skips the points 
+    already in it. Each point is appended as a pickled record (index, result) and flushed to disk as soon 
+    as it completes. A record truncated by a crash is discarded when the file is loaded.
+
+    The file only exists while the sweep is incomplete: the sweep methods of PhotonicCrystal call remove() once 
+    all the points are solved, so that a later sweep with the same specification (for example after a change 
+    of the code or of the installed MPB) solves its points again instead of reusing stale results. 
+    A checkpoint left by an abandoned sweep can be discarded with remove() too.
+
+    Attributes:
+        path (str): The path of the checkpoint file.
+        results (dict): The results of the completed points, by index.
+
+    Methods:
+        append(index, result): Append the result of a completed point.
+        remove(): Remove the checkpoint file.
+    """
+
+    # The default directory can be overridden with this environment variable
+    DIRECTORY_ENV_VAR = "NZI_PHC_CHECKPOINT_DIR"
+    DEFAULT_DIRECTORY = os.path.join("~", ".cache", "nzi-phc-finder", "checkpoints")
+    SUFFIX = ".ckpt"
+
+    def __init__(self, key, directory=None):
+        """
+        Initializes the checkpoint, loading the points already completed. The directory is created if it does not exist.
+
+        Args:
+            key (str): The key of the sweep specification, e.g. computed with configuration_hash().
+            directory (str, optional): The directory of the checkpoint files. Default is None, which uses 
+                the NZI_PHC_CHECKPOINT_DIR environment variable if set, otherwise ~/.cache/nzi-phc-finder/checkpoints.
+        """
+        if directory is None:
+            directory = os.environ.get(self.DIRECTORY_ENV_VAR, self.DEFAULT_DIRECTORY)
+        directory = os.path.abspath(os.path.expanduser(directory))
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, key + self.SUFFIX)
+        self.results = self._load()
+
+    def __contains__(self, index):
+        return index in self.results
+
+    def __len__(self):
+        return len(self.results)
+
+    def __repr__(self):
+        return f"SweepCheckpoint(path={self.path!r}, completed={len(self.results)})"
+
+    def _load(self) -> dict:
+        """
+        Load the completed points. A truncated last record is cut from the file, so that new records can be appended.
+
+        Returns:
+            dict: The results of the completed points, by index.
+        """
+        results = {}
+        if not os.path.exists(self.path):
+            return results
+        with open(self.path, "rb") as f:
+            valid_size = 0
+            while True:
+                try:
+                    index, result = pickle.load(f)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, AttributeError, ImportError) as e:
+                    print(f"Discarding truncated record of checkpoint {self.path}: {e}")
+                    break
+                results[index] = result
+                valid_size = f.tell()
+        if valid_size < os.path.getsize(self.path):
+            os.truncate(self.path, valid_size)
+        return results
+
+    def append(self, index, result):
+        """
+        Append the result of a completed point and flush it to disk.
+
+        Args:
+            index (int): The index of the point in the sweep.
+            result (object): The result of the point. It must be picklable.
+        """
+        with open(self.path, "ab") as f:
+            pickle.dump((index, result), f)
+            f.flush()
+            os.fsync(f.fileno())
+        self.results[index] = result
+
+    def remove(self):
+        """
+        Remove the checkpoint file.
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.results = {}
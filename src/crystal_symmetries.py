@@ -44,6 +44,123 @@ C6v_operations = {
     "sigma_x''": reflection_matrix(150) # Reflection over 150 degrees
 }
 
+# Point group of each lattice type
+POINT_GROUPS = {
+    "square": C4v_operations,
+    "triangular": C6v_operations,
+}
+
+def canonical_k_point_key(k_point, operations, decimals=8):
+    """
+    Get a key identifying the orbit of a k-point under a point group: equivalent k-points have the same key.
+    The operations act on the in-plane (x, y) components, the z component is left unchanged.
+
+    Args:
+        k_point (np.ndarray): The k-point in Cartesian coordinates, with shape (3,).
+        operations (dict): The 2x2 matrices of the point group, e.g. C4v_operations.
+        decimals (int, optional): Components are rounded to this number of decimals to compare k-points. Default is 8.
+
+    Returns:
+        tuple: The smallest image of the k-point, rounded.
+    """
+    k_point = np.asarray(k_point, dtype=float)
+    # Adding 0.0 turns -0.0 into 0.0
+    return min(
+        tuple(np.round(op @ k_point[:2], decimals) + 0.0) + (round(k_point[2], decimals) + 0.0,)
+        for op in operations.values()
+    )
+
+def irreducible_k_points(k_points, operations, decimals=8):
+    """
+    Group k-points into orbits of a point group, to solve only one k-point per orbit.
+
+    Args:
+        k_points (np.ndarray): The k-points in Cartesian coordinates, with shape (N, 3).
+        operations (dict): The 2x2 matrices of the point group, e.g. C4v_operations.
+        decimals (int, optional): Components are rounded to this number of decimals to compare k-points. Default is 8.
+
+    Returns:
+        tuple: The indices of the representatives (the first k-point of each orbit, in order), 
+            and an array of shape (N,) with the orbit of each k-point, i.e. the position of its representative.
+    """
+    representatives = []
+    orbit_of_key = {}
+    orbits = np.empty(len(k_points), dtype=int)
+    for i, k_point in enumerate(k_points):
+        key = canonical_k_point_key(k_point, operations, decimals)
+        if key not in orbit_of_key:
+            orbit_of_key[key] = len(representatives)
+            representatives.append(i)
+        orbits[i] = orbit_of_key[key]
+    return representatives, orbits
+
+def grid_preserving_operations(operations, tolerance=1e-9):
+    """
+    Get the operations of a point group that map a Cartesian grid centered at the origin onto itself, 
+    i.e. whose matrices are signed permutations: all of C4v, and the subgroup {E, C2, sigma_x, sigma_y} (C2v) of C6v.
+
+    Args:
+        operations (dict): The 2x2 matrices of the point group, e.g. C6v_operations.
+        tolerance (float, optional): The tolerance on the matrix elements. Default is 1e-9.
+
+    Returns:
+        dict: The operations that preserve the grid.
+    """
+    return {
+        name: op for name, op in operations.items()
+        if np.allclose(np.abs(op), np.round(np.abs(op)), atol=tolerance)
+    }
+
+def _reciprocal_neighbors(reciprocal_vectors) -> np.ndarray:
+    """Return the reciprocal lattice vectors n1 b1 + n2 b2 with n1, n2 in {-1, 0, 1}, except 0."""
+    b1, b2 = np.asarray(reciprocal_vectors, dtype=float)[:, :2]
+    return np.array([n1 * b1 + n2 * b2 for n1 in (-1, 0, 1) for n2 in (-1, 0, 1) if (n1, n2) != (0, 0)])
+
+def first_brillouin_zone_mask(k_points, reciprocal_vectors, tolerance=1e-9):
+    """
+    Check which k-points are in the first Brillouin zone of a 2D lattice, i.e. closer to Gamma than to any other
+    reciprocal lattice point. Points on the boundary of the zone are inside.
+
+    Args:
+        k_points (np.ndarray): The k-points in Cartesian coordinates, with shape (N, 2) or (N, 3). 
+            Only the in-plane components are used.
+        reciprocal_vectors (np.ndarray): The Cartesian reciprocal lattice vectors b1 and b2, as rows.
+        tolerance (float, optional): The tolerance on the distances. Default is 1e-9.
+
+    Returns:
+        np.ndarray: A boolean array of shape (N,).
+    """
+    k_points = np.asarray(k_points, dtype=float)[:, :2]
+    neighbors = _reciprocal_neighbors(reciprocal_vectors)
+    # |k|² <= |k - G|²  <=>  k·G <= |G|² / 2
+    projections = k_points @ neighbors.T
+    return np.all(projections <= np.sum(neighbors**2, axis=1) / 2 + tolerance, axis=1)
+
+def brillouin_zone_vertices(reciprocal_vectors, decimals=10):
+    """
+    Get the vertices of the first Brillouin zone of a 2D lattice, sorted by angle.
+
+    Args:
+        reciprocal_vectors (np.ndarray): The Cartesian reciprocal lattice vectors b1 and b2, as rows.
+        decimals (int, optional): Vertices are rounded to this number of decimals to remove duplicates. Default is 10.
+
+    Returns:
+        np.ndarray: The vertices, with shape (number of vertices, 2): 4 for a square lattice, 6 for a triangular one.
+    """
+    neighbors = _reciprocal_neighbors(reciprocal_vectors)
+    vertices = []
+    # Each vertex is on the perpendicular bisectors of Gamma and two reciprocal lattice points
+    for i in range(len(neighbors)):
+        for j in range(i + 1, len(neighbors)):
+            matrix = np.stack([neighbors[i], neighbors[j]])
+            if abs(np.linalg.det(matrix)) < 1e-12:
+                continue
+            vertices.append(np.linalg.solve(matrix, np.sum(matrix**2, axis=1) / 2))
+    vertices = np.array(vertices)
+    vertices = vertices[first_brillouin_zone_mask(vertices, reciprocal_vectors)]
+    vertices = np.unique(np.round(vertices, decimals) + 0.0, axis=0)
+    return vertices[np.argsort(np.arctan2(vertices[:, 1], vertices[:, 0]))]
+
 def test_symmetry_operations():
     # Create a test point
     point = np.array([1.0, 0.5])
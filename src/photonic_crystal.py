@@ -1,18 +1,28 @@
 #%%
 import math
+import inspect
 import meep as mp
 from meep import mpb
 import pickle
+import warnings
 import contextlib
 import os
 import sys
 import plotly.graph_objects as go
 import numpy as np
 from plotly.subplots import make_subplots
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from functools import partial
+from scipy.spatial import cKDTree
+from scipy.optimize import brentq
 from crystal_geometries import Crystal_Geometry, Crystal2D_Geometry, CrystalSlab_Geometry
 from crystal_materials import Crystal_Materials
+from crystal_parallel import (split_k_points, run_in_pool, compute_gap_list, default_num_workers, estimate_solve_cost, 
+                              ProgressTracker)
+from crystal_cache import configuration_hash, ResultCache
+from crystal_symmetries import (POINT_GROUPS, irreducible_k_points, canonical_k_point_key, first_brillouin_zone_mask, 
+                                brillouin_zone_vertices, grid_preserving_operations)
+from crystal_sweeps import sweep_points, SweepResult, SweepCheckpoint
 
 
 
@@ -40,16 +50,27 @@ class PhotonicCrystal:
         epsilon (None): Placeholder for epsilon attribute.
         modes (list): List to store modes.
         use_XY (bool): Flag to use XY plane.
+        solver_iterations (dict): Eigensolver iterations of the last warm-started run of each runner.
+        band_k_points (dict): The k-points of freqs[polarization], when they are not k_points_interpolated.
+        target_freq (float | None): If set, the solvers find the num_bands bands closest to this frequency instead of the lowest ones.
     
     Methods:
         __getstate__(): Get the state for pickling.
         __setstate__(state): Set the state after unpickling.
         pickle_photonic_crystal(pickle_id): Pickle the photonic crystal object.
         load_photonic_crystal(pickle_id): Load a pickled photonic crystal object.
-        set_solver(k_point): Set the mode solver for the simulation.
-        run_simulation(runner, polarization): Run the simulation to calculate the frequencies and gaps.
-        run_simulation_with_output(runner, polarization): Run the simulation and get mode data.
+        set_solver(k_point, target_freq): Set the mode solver for the simulation.
+        run_simulation(runner, polarization, num_workers, mode_storage, cache, warm_start, target_freq, use_symmetry, cold_reference): Run the simulation to calculate the frequencies and gaps, optionally on a pool of worker processes.
+        run_simulations(runners, polarizations, num_workers, mode_storage, cache): Run several runners concurrently, each in its own process.
+        iter_simulation(runner, polarization, mode_storage, store): Run the simulation, yielding the result of each k-point as soon as it is solved.
+        run_adaptive_simulation(runner, polarization, interp, tolerance, degeneracy_tolerance, max_refinements, mode_storage): Run the simulation on an adaptively refined k-path.
+        converge_resolution(tolerance, resolutions, runner, k_points, order): Find the cheapest resolution that meets a tolerance on the frequencies.
+        run_k_grid(runner, num_k, k_max, use_symmetry, refinements, tolerance, degeneracy_tolerance, num_workers): Compute the bands on a 2D grid of k-points in the first Brillouin zone.
+        plot_isofrequency_contours(k_grid, band, fig, ncontours, colorscale): Plot the isofrequency contours of a band computed on a k-grid.
+        run_simulation_with_output(runner, polarization, cache, warm_start, mode_storage, cold_reference): Run the simulation and get mode data.
+        get_mode_fields(mode): Get the fields of a mode, recomputing them if the mode was stored without fields.
         run_dumb_simulation(): Run a dumb simulation to quickly extract some values.
+        get_epsilon_and_lattice(): Get the epsilon grid and the lattice, computed without any eigensolve and cached.
         convert_mode_fields(mode, periods): Convert the mode fields to arrays for visualization.
         extract_data(periods): Extract the data from the simulation.
         plot_epsilon(fig, title): Plot the epsilon of the photonic crystal interactively using Plotly.
@@ -58,8 +79,10 @@ class PhotonicCrystal:
         get_high_symmetry_points(): Get the high symmetry points for the photonic crystal lattice.
         plot_field(target_polarization, target_k_point, target_frequency, frequency_tolerance, k_point_max_distance, periods, component, quantity, colorscale): Plot the field visualization.
         plot_field_components(target_polarization, target_k_point, target_frequency, frequency_tolerance, k_point_max_distance, periods, quantity, colorscale): Plot the field components (Ex, Ey, Ez) and (Hx, Hy, Hz) for specific modes with consistent color scales.
+        build_mode_index(): Build the index of the stored modes used by look_for_mode().
         look_for_mode(polarization, k_point, freq, freq_tolerance, k_point_max_distance): Look for modes within the specified criteria.
         find_modes_symmetries(): Find the symmetries of the modes.
+        point_group_operations(): Get the point group operations of the crystal, if it is invariant under the point group of its lattice.
         plot_modes_vectorial_fields(modes, sizemode, names): Plot the vectorial fields of the modes.
         plot_mode_fields_normal_to_k(mode, k): Plot the fields perpendicular to the wavevector k for the mode.
         plot_vectorial_fields(fields, colorscales, names): Plot the vectorial fields of the modes.
@@ -68,9 +91,52 @@ class PhotonicCrystal:
         _calculate_field_norm_to_k(fields, k): Calculate the components of the field perpendicular to the wavevector k.
         _get_direction(k_vector): Determine the primary direction of the wavevector k.
         _calculate_effective_parameter(mode): Calculate the effective parameters of the mode.
+        with_parameters(**parameters): Create a copy of the crystal with some geometry, material, lattice or solver parameters changed.
+        estimate_cost(num_k_points): Estimate the relative cost of solving the crystal, used to schedule sweeps.
+        run_geometry_sweep(param_to_sweep, sweep_values, num_bands, cache, warm_start, target_freq, checkpoint, mode_storage, cold_reference): Sweep a geometry parameter at Gamma, returning a SweepResult.
+        sweep_geometry_parameter(param_to_sweep, sweep_values, ...): Deprecated, run_geometry_sweep() returning the list of step dictionaries.
+        run_sweep(parameters, grid, runners, polarizations, k_points, num_workers, checkpoint): Sweep any number of parameters on a grid or a list of points, in parallel.
+        run_perturbative_sweep(param, values, polarizations, tolerance): Sweep a material parameter predicting the frequencies of the stored modes with perturbation theory.
+        compute_sensitivities(params, modes, step): Compute the derivatives of the mode frequencies with respect to geometry parameters from the stored fields.
+        find_dirac_point(param, bracket, band, runner, k_point, tolerance, max_solves, degeneracy_tolerance): Find the geometry parameter where two bands cross.
         basic_geometry(): Define the basic geometry of the photonic crystal.
         basic_lattice(): Define the basic lattice of the photonic crystal.
     """
+
+    MODE_STORAGES = ("fields", "frequencies", "eigenvectors")
+    MODE_FIELDS_CACHE_SIZE = 32
+    # Two k-points closer than this are considered the same k-point by look_for_mode()
+    K_POINT_TOLERANCE = 1e-7
+
+    # Runners whose parity is preserved by the in-plane operations of the point groups
+    SYMMETRY_REDUCIBLE_RUNNERS = ("run", "run_te", "run_tm", "run_zeven", "run_zodd")
+
+    # Segments of the adaptive k-path are not bisected below this fraction of the path length
+    ADAPTIVE_MIN_SEGMENT = 1e-3
+
+    # Parameters of with_parameters() that rebuild the lattice with basic_lattice()
+    LATTICE_PARAMETERS = ("lattice_type",)
+    # Parameters of with_parameters() that are attributes of the crystal
+    SOLVER_PARAMETERS = ("num_bands", "resolution", "target_freq")
+
+    # Legend name and color of each polarization in plot_sweep_result()
+    SWEEP_POLARIZATION_STYLES = {"zeven": ("TE", "red"), "zodd": ("TM", "blue")}
+
+    # MPB parity of each runner, used when the runner is called through ModeSolver.run_parity
+    RUNNER_PARITIES = {
+        "run": mp.NO_PARITY,
+        "run_te": mp.TE,
+        "run_tm": mp.TM,
+        "run_zeven": mp.EVEN_Z,
+        "run_zodd": mp.ODD_Z,
+        "run_yeven": mp.EVEN_Y,
+        "run_yodd": mp.ODD_Y,
+        "run_te_yeven": mp.TE + mp.EVEN_Y,
+        "run_te_yodd": mp.TE + mp.ODD_Y,
+        "run_tm_yeven": mp.TM + mp.EVEN_Y,
+        "run_tm_yodd": mp.TM + mp.ODD_Y,
+    }
+
     def __init__(self,
                 lattice_type = None,
                 material: Crystal_Materials = None,
@@ -118,6 +184,10 @@ class PhotonicCrystal:
             epsilon (None): Placeholder for epsilon attribute.
             modes (list): List to store modes.
             use_XY (bool): Flag to use XY plane.
+            solver_iterations (dict): Eigensolver iterations of the last warm-started run of each runner.
+            band_k_points (dict): The k-points of freqs[polarization], when they are not k_points_interpolated.
+            target_freq (float | None): If set, the solvers find the num_bands bands closest to this frequency 
+                instead of the lowest ones. Set with set_solver() or run_simulation().
         """
         self.lattice_type = lattice_type
         self.num_bands = num_bands
@@ -148,6 +218,20 @@ class PhotonicCrystal:
         self.epsilon = None
         self.modes= []
         self.use_XY = use_XY
+        self.solver_iterations = {}
+        self.band_k_points = {}
+        self.target_freq = None
+
+        # fields recomputed on demand for modes stored without fields, see get_mode_fields()
+        self._mode_fields_cache = OrderedDict()
+        # index of the stored modes used by look_for_mode(), see build_mode_index()
+        self._mode_index = None
+        # epsilon grid and lattice, see get_epsilon_and_lattice()
+        self._epsilon_cache = None
+        # converged eigenvectors of the last warm-started run of each runner, see _run_warm_started()
+        self._warm_start = {}
+        # geometry, lattice and resolution the solver was built with, see set_solver()
+        self._solver_configuration = None
 
         
 
@@ -156,10 +240,29 @@ class PhotonicCrystal:
         # Exclude the non-picklable SWIG objects
         state['ms'] = None
         state['md'] = None
+        # The recomputed fields can be recomputed again, do not pickle them
+        state['_mode_fields_cache'] = OrderedDict()
+        # The mode index and the epsilon grid are recomputed when needed
+        state['_mode_index'] = None
+        state['_epsilon_cache'] = None
+        # The warm start eigenvectors can be very large, do not pickle them
+        state['_warm_start'] = {}
+        # The configuration belongs to the solver, which is not pickled
+        state['_solver_configuration'] = None
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
+        # Crystals pickled before the field cache was introduced do not have it
+        if '_mode_fields_cache' not in self.__dict__:
+            self._mode_fields_cache = OrderedDict()
+        self._mode_index = None
+        self._epsilon_cache = None
+        self._warm_start = {}
+        self._solver_configuration = None
+        self.__dict__.setdefault('solver_iterations', {})
+        self.__dict__.setdefault('band_k_points', {})
+        self.__dict__.setdefault('target_freq', None)
         # You may want to reinitialize 'ms' and 'md' if needed after loading.
         self.ms = None
         self.md = None
@@ -186,7 +289,7 @@ class PhotonicCrystal:
         with open(f"{pickle_id}.pkl", "rb") as f:
             return pickle.load(f)
 
-    def set_solver(self, k_point = None):
+    def set_solver(self, k_point = None, target_freq = None):
         """
         Set the mode solver for the simulation. 
         For how MPB works, it is better to call this method each time you want to run a simulation.
@@ -196,23 +299,34 @@ class PhotonicCrystal:
 
         Args:
             k_point (mp.Vector3, optional): The k-point for the simulation. Default is None.
+            target_freq (float, optional): The target frequency. Default is None, which keeps the target_freq attribute.
+                If set (and larger than 0), the solver finds the num_bands bands closest to this frequency 
+                instead of the lowest num_bands bands, for example the few bands around a Dirac frequency.
+                The bands of the modes are then numbered from 1 among the bands found, not from the lowest band.
         
         """
+        if target_freq is not None:
+            self.target_freq = target_freq
 
+        # Results of this solver are keyed by the configuration it was built with, see _simulation_key()
+        self._solver_configuration = (self.geometry.to_list(), self.geometry_lattice, self.resolution)
         if k_point is not None:
             self.ms = mpb.ModeSolver(geometry=self.geometry.to_list(),
                                   geometry_lattice=self.geometry_lattice,
                                   k_points=[k_point],
                                   resolution=self.resolution,
-                                  num_bands=self.num_bands)
+                                  num_bands=self.num_bands,
+                                  target_freq=self.target_freq or 0)
         else:
             self.ms = mpb.ModeSolver(geometry=self.geometry.to_list(),
                                     geometry_lattice=self.geometry_lattice,
                                     k_points=self.k_points_interpolated,
                                     resolution=self.resolution,
-                                    num_bands=self.num_bands)
+                                    num_bands=self.num_bands,
+                                    target_freq=self.target_freq or 0)
 
-    def run_simulation(self, runner="run_zeven", polarization=None):
+    def run_simulation(self, runner="run_zeven", polarization=None, num_workers=None, mode_storage="fields", cache=None, 
+                       warm_start=False, target_freq=None, use_symmetry=False, cold_reference=False):
         """
         Run the simulation to calculate the frequencies and gaps.
 
@@ -227,10 +341,65 @@ class PhotonicCrystal:
                 - 'run': Do not consider symmetry.
             polarization (str, optional): The polarization of the simulation. Default is None. If None, it uses the runner name.
                 This will be stored in the mode data.
+            num_workers (int, optional): Number of worker processes. Default is None, which runs the simulation
+                serially with the solver set by set_solver(). If larger than 1, the interpolated k-points are split
+                in contiguous chunks, each chunk is solved by its own ModeSolver in a separate process and
+                freqs, gaps and modes are merged back in k-path order. In this case set_solver() is not needed.
+            mode_storage (str, optional): What is stored for each mode. Default is 'fields'.
+
+                Every mode stores its frequency, k-point, band, polarization and group velocity 
+                (Cartesian components, in units of c, from the eigenvector with MPB's Hellmann-Feynman formula).
+
+                - 'fields': Store the Bloch and periodic E and H fields of every mode.
+                - 'frequencies': Store only frequency, k-point, band, polarization and group velocity. 
+                    The fields are recomputed on demand by get_mode_fields() when a field plot needs them.
+                - 'eigenvectors': Store the MPB eigenvector (the plane-wave coefficients of the transverse H field) 
+                    instead of the four real-space fields. It is several times smaller and get_mode_fields() 
+                    rebuilds E and H from it with a single k-point solve, seeded with the stored eigenvectors 
+                    so that it converges almost immediately.
+            cache (ResultCache | bool, optional): The on-disk result cache. Default is None, which does not use any cache.
+                If True, the default ResultCache is used. If the same configuration (geometry, materials, lattice, 
+                resolution, number of bands, k-points, runner, polarization and mode storage) has already been 
+                simulated, freqs, gaps and modes are loaded from the cache and MPB is not run at all.
+            warm_start (bool, optional): Seed the eigensolver with the converged eigenvectors of the previous 
+                warm-started run of the same runner. Default is False. Each k-point is seeded with the eigenvectors 
+                of the same k-point, so it works along a k-path too, for example when the same k-path is solved 
+                for slightly different geometries. The eigenvectors of every k-point are kept in memory.
+                The eigensolver iterations of each k-point, and the iterations saved with respect to a cold run, 
+                are stored in solver_iterations[runner], see _run_warm_started(). Not supported with num_workers larger than 1.
+            target_freq (float, optional): Find the bands closest to this frequency, see set_solver(). 
+                Default is None, which uses the target frequency of the solver. The modes store the target frequency.
+            use_symmetry (bool, optional): Solve only one k-point for each set of k-points equivalent under the 
+                point group of the lattice (C4v for square lattices, C6v for triangular ones) and copy the 
+                frequencies to the others. Default is False. It is used only if the crystal is invariant under 
+                the point group (see point_group_operations()) and the runner has no y parity, otherwise all the 
+                k-points are solved. The modes of the copied k-points store only the frequency, their fields are 
+                recomputed on demand by get_mode_fields(). Not supported with num_workers larger than 1 or warm_start.
+            cold_reference (bool, optional): With warm_start, also solve the k-points cold before a seeded run, 
+                to measure the iterations saved by the seeds. Default is False.
 
         """
-        if self.ms is None:
+        if mode_storage not in self.MODE_STORAGES:
+            raise ValueError(f"Invalid mode storage: {mode_storage}. Choose one of {self.MODE_STORAGES}.")
+
+        parallel = num_workers is not None and num_workers > 1
+        if parallel and warm_start:
+            print("Warm start is not supported with a pool of worker processes, it is ignored.")
+            warm_start = False
+        if not parallel and self.ms is None:
             raise ValueError("Solver is not set. Call set_solver() before running the simulation.")
+
+        if target_freq is not None:
+            self.target_freq = target_freq
+            if not parallel and self.ms.target_freq != target_freq:
+                # Same configuration, k-points and bands as the solver set by set_solver(), with the new target
+                geometry, geometry_lattice, resolution = self._solver_configuration
+                self.ms = mpb.ModeSolver(geometry=geometry,
+                                         geometry_lattice=geometry_lattice,
+                                         k_points=self.ms.k_points,
+                                         resolution=resolution,
+                                         num_bands=self.ms.num_bands,
+                                         target_freq=target_freq)
         
         if polarization is not None:
             polarization = polarization
@@ -239,27 +408,1120 @@ class PhotonicCrystal:
                 polarization = runner[4:]
             else:
                 polarization = runner
-        
+
+        operations = None
+        if use_symmetry:
+            if runner in self.SYMMETRY_REDUCIBLE_RUNNERS and not parallel and not warm_start:
+                operations = self.point_group_operations()
+            if operations is None:
+                print("The crystal or the run options do not allow a symmetry reduction, all the k-points are solved.")
+        # Only options that change the stored result are part of the cache key
+        options = {"use_symmetry": True} if operations is not None else {}
+
+        cache = self._get_result_cache(cache)
+        if cache is not None:
+            if parallel:
+                key = self._simulation_key(cache, self.k_points_interpolated, self.num_bands, self.target_freq,
+                                           runner=runner, polarization=polarization, mode_storage=mode_storage, **options)
+            else:
+                key = self._simulation_key(cache, self.ms.k_points, self.ms.num_bands, self.ms.target_freq,
+                                           configuration=self._solver_configuration,
+                                           runner=runner, polarization=polarization, mode_storage=mode_storage, **options)
+            result = cache.get(key)
+            if result is not None:
+                self._store_simulation_result(polarization, *result)
+                return
+            first_mode = len(self.modes)
+
+        if parallel:
+            self._run_simulation_parallel(runner, polarization, num_workers, mode_storage)
+        elif operations is not None:
+            self._run_simulation_symmetric(runner, polarization, mode_storage, operations)
+        else:
+            self._run_simulation_serial(runner, polarization, mode_storage, warm_start, cold_reference)
+
+        if cache is not None:
+            cache.put(key, (self.freqs[polarization], self.gaps[polarization], self.modes[first_mode:]))
+
+    def run_simulations(self, runners, polarizations=None, num_workers=None, mode_storage="fields", cache=None):
+        """
+        Run the simulation for several runners (for example 'run_te' and 'run_tm', or 'run_zeven' and 'run_zodd').
+        The runners share only the geometry, so each one is solved by its own ModeSolver in a separate process.
+        The results are merged into freqs, gaps and modes in the order of the runners, as if run_simulation() 
+        had been called for each runner. set_solver() is not needed.
+        The runners are started largest first by estimated cost (see estimate_cost()) and the progress is printed 
+        with an estimated time left.
+
+        Args:
+            runners (list): The names of the MPB runners, see run_simulation().
+            polarizations (list, optional): The polarization of each runner. Default is None, which uses the runner names.
+            num_workers (int, optional): The number of worker processes. Default is None, which uses one process
+                per runner, up to the number of available CPUs. If 1, the runners are solved one after the other
+                in this process.
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'fields'.
+            cache (ResultCache | bool, optional): The on-disk result cache, see run_simulation(). Default is None.
+                Runners already simulated are loaded from the cache and are not sent to the workers.
+        """
+        if mode_storage not in self.MODE_STORAGES:
+            raise ValueError(f"Invalid mode storage: {mode_storage}. Choose one of {self.MODE_STORAGES}.")
+        if polarizations is None:
+            polarizations = [runner[4:] if runner.startswith("run_") else runner for runner in runners]
+        if len(polarizations) != len(runners):
+            raise ValueError("The number of polarizations must match the number of runners.")
+
+        cache = self._get_result_cache(cache)
+        results = [None] * len(runners)
+        keys = [None] * len(runners)
+        if cache is not None:
+            for i, (runner, polarization) in enumerate(zip(runners, polarizations)):
+                keys[i] = self._simulation_key(cache, self.k_points_interpolated, self.num_bands, self.target_freq,
+                                               runner=runner, polarization=polarization, mode_storage=mode_storage)
+                results[i] = cache.get(keys[i])
+        to_solve = [i for i, result in enumerate(results) if result is None]
+
+        calls = []
+        for i in to_solve:
+            crystal = self._worker_copy()
+            calls.append((crystal, "_solve_k_points", {"runner": runners[i], "polarization": polarizations[i], "mode_storage": mode_storage}))
+        costs = [crystal.estimate_cost() for crystal, _, _ in calls]
+        if num_workers == 1 or len(calls) <= 1:
+            tracker = ProgressTracker(costs, label="Runners")
+            solved = []
+            for (crystal, method_name, kwargs), cost in zip(calls, costs):
+                solved.append(getattr(crystal, method_name)(**kwargs))
+                tracker.update(cost)
+        else:
+            solved = run_in_pool(calls, num_workers=num_workers, costs=costs, progress=True)
+
+        for i, (freqs, modes) in zip(to_solve, solved):
+            results[i] = (freqs, compute_gap_list(freqs), modes)
+            if cache is not None:
+                cache.put(keys[i], results[i])
+
+        for polarization, result in zip(polarizations, results):
+            self._store_simulation_result(polarization, *result)
+
+    def _store_simulation_result(self, polarization, freqs, gaps, modes):
+        """
+        Store the result of a simulation run elsewhere (in a worker process or loaded from the cache).
+
+        Args:
+            polarization (str): The polarization of the simulation.
+            freqs (np.ndarray): The frequencies, with shape (number of k-points, number of bands).
+            gaps (list): The list of gaps.
+            modes (list): The list of mode dictionaries.
+        """
+        self.freqs[polarization] = freqs
+        self.gaps[polarization] = gaps
+        self.band_k_points.pop(polarization, None)
+        self.modes.extend(modes)
+        self.build_mode_index()
+
+    def _run_simulation_serial(self, runner, polarization, mode_storage="fields", warm_start=False, cold_reference=False):
+        """
+        Run the simulation with the solver set by set_solver().
+
+        Args:
+            runner (str): The name of the MPB runner.
+            polarization (str): The polarization of the simulation.
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'fields'.
+            warm_start (bool, optional): Seed the eigensolver with the previous eigenvectors, see run_simulation().
+                Default is False.
+            cold_reference (bool, optional): Measure the iterations of a cold run too, see run_simulation(). 
+                Default is False.
+        """
         # This is a custom mpb output function that stores the fields and frequencies
         def get_mode_data(ms: mpb.ModeSolver, band):
-            mode = {
-                "h_field": ms.get_hfield(band, bloch_phase=True),
-                "e_field": ms.get_efield(band, bloch_phase=True),
-                "e_field_periodic": ms.get_efield(band, bloch_phase=False),
-                "h_field_periodic": ms.get_hfield(band, bloch_phase=False),
-                "freq": ms.freqs[band-1],
-                "k_point": ms.current_k,
-                "polarization": polarization,
-            }
-            self.modes.append(mode)
+            self.modes.append(self._get_mode_data(ms, band, runner, polarization, mode_storage))
 
         print(self.k_points_interpolated)
+        if warm_start:
+            with suppress_output():
+                freqs = self._run_warm_started(runner, get_mode_data, cold_reference=cold_reference)
+            self.freqs[polarization] = freqs
+            self.gaps[polarization] = compute_gap_list(freqs)
+        else:
+            with suppress_output():
+                getattr(self.ms, runner)(get_mode_data)
+                self.freqs[polarization] = self.ms.all_freqs
+                self.gaps[polarization] = self.ms.gap_list
+        self.band_k_points.pop(polarization, None)
+        self.build_mode_index()
+
+    def _run_simulation_symmetric(self, runner, polarization, mode_storage, operations):
+        """
+        Run the simulation solving only one k-point of the solver set by set_solver() for each set of 
+        k-points equivalent under the point group, then scatter the results back to all the k-points.
+
+        Args:
+            runner (str): The name of the MPB runner.
+            polarization (str): The polarization of the simulation.
+            mode_storage (str): What is stored for each mode of the solved k-points, see run_simulation().
+            operations (dict): The point group operations, see point_group_operations().
+        """
+        k_points = list(self.ms.k_points)
+        cartesian = self._k_points_to_cartesian(k_points)
+        representatives, orbits = irreducible_k_points(cartesian, operations)
+        print(f"Symmetry reduction: {len(representatives)} of {len(k_points)} k-points solved.")
+
+        geometry, geometry_lattice, resolution = self._solver_configuration
+        ms = mpb.ModeSolver(geometry=geometry,
+                            geometry_lattice=geometry_lattice,
+                            k_points=[k_points[i] for i in representatives],
+                            resolution=resolution,
+                            num_bands=self.ms.num_bands,
+                            target_freq=self.ms.target_freq)
+        solved_modes = []
+
+        def get_mode_data(ms, band):
+            solved_modes.append(self._get_mode_data(ms, band, runner, polarization, mode_storage))
+
         with suppress_output():
-            getattr(self.ms, runner)(get_mode_data)
-            self.freqs[polarization] = self.ms.all_freqs
-            self.gaps[polarization] = self.ms.gap_list
+            getattr(ms, runner)(get_mode_data)
+        solved_freqs = np.array(ms.all_freqs)
+        num_bands = ms.num_bands
+
+        for i, (k_point, orbit) in enumerate(zip(k_points, orbits)):
+            orbit_modes = solved_modes[orbit * num_bands:(orbit + 1) * num_bands]
+            if representatives[orbit] == i:
+                self.modes.extend(orbit_modes)
+                continue
+            # An equivalent k-point: same frequencies, the fields are recomputed on demand.
+            # The group velocity is mapped by the operation that maps the k-point of the representative to this one.
+            representative = cartesian[representatives[orbit], :2]
+            operation = next((op for op in operations.values() 
+                              if np.allclose(op @ representative, cartesian[i, :2], atol=1e-7)), None)
+            for mode in orbit_modes:
+                image = {key: mode[key] for key in ("freq", "polarization", "band", "runner", "target_freq", "num_bands") 
+                         if key in mode}
+                image["k_point"] = k_point
+                if operation is not None and "group_velocity" in mode:
+                    velocity = np.asarray(mode["group_velocity"])
+                    image["group_velocity"] = np.append(operation @ velocity[:2], velocity[2])
+                self.modes.append(image)
+
+        self.freqs[polarization] = solved_freqs[orbits]
+        self.gaps[polarization] = compute_gap_list(self.freqs[polarization])
+        self.band_k_points.pop(polarization, None)
+        self.build_mode_index()
+
+    def point_group_operations(self):
+        """
+        Get the operations of the point group of the lattice (C4v for 'square', C6v for 'triangular'), 
+        if the whole crystal is invariant under them. The check is conservative, it requires:
+
+        - materials isotropic in the xy plane (equal xx and yy components, no off-diagonal components), 
+            for example a z-cut uniaxial crystal.
+        - objects invariant under the in-plane operations: layers infinite in x and y, cylinders, spheres and 
+            circular ellipsoids centered on the z axis, and, for C4v, square blocks centered on the z axis and 
+            aligned with x and y.
+
+        Returns:
+            dict | None: The 2x2 matrices of the operations, see crystal_symmetries, or None if the crystal is not invariant.
+        """
+        operations = POINT_GROUPS.get(self.lattice_type)
+        if operations is None:
+            return None
+        for geometric_object in self.geometry.to_list():
+            if not self._is_in_plane_isotropic(geometric_object.material):
+                return None
+            if not self._is_point_group_invariant(geometric_object, self.lattice_type):
+                return None
+        return operations
+
+    @staticmethod
+    def _is_in_plane_isotropic(material, tolerance=1e-12) -> bool:
+        """
+        Check whether a material is isotropic in the xy plane.
+
+        Args:
+            material (mp.Medium): The material.
+            tolerance (float, optional): The tolerance on the components. Default is 1e-12.
+
+        Returns:
+            bool: True if the epsilon and mu tensors are invariant under rotations around z.
+        """
+        if not isinstance(material, mp.Medium):
+            return False
+        for diag, offdiag in ((material.epsilon_diag, material.epsilon_offdiag), (material.mu_diag, material.mu_offdiag)):
+            if abs(diag.x - diag.y) > tolerance:
+                return False
+            if max(abs(offdiag.x), abs(offdiag.y), abs(offdiag.z)) > tolerance:
+                return False
+        return True
+
+    @staticmethod
+    def _is_point_group_invariant(geometric_object, lattice_type, tolerance=1e-12) -> bool:
+        """
+        Check whether a geometric object is invariant under the in-plane operations of the point group of a lattice.
+
+        Args:
+            geometric_object (mp.GeometricObject): The object.
+            lattice_type (str): The type of lattice, 'square' or 'triangular'.
+            tolerance (float, optional): The tolerance on positions and sizes. Default is 1e-12.
+
+        Returns:
+            bool: True if the object is invariant.
+        """
+        center = geometric_object.center
+        centered = abs(center.x) < tolerance and abs(center.y) < tolerance
+
+        if isinstance(geometric_object, mp.Sphere):
+            return centered
+        if isinstance(geometric_object, mp.Cylinder):
+            axis = geometric_object.axis
+            return centered and abs(axis.x) < tolerance and abs(axis.y) < tolerance
+        if isinstance(geometric_object, mp.Block):
+            e1, e2 = geometric_object.e1, geometric_object.e2
+            size = geometric_object.size
+            aligned = (abs(e1.y) < tolerance and abs(e1.z) < tolerance 
+                       and abs(e2.x) < tolerance and abs(e2.z) < tolerance)
+            if not aligned:
+                return False
+            # Layers infinite in the plane
+            if size.x >= 1e10 and size.y >= 1e10:
+                return True
+            if not centered or abs(size.x - size.y) > tolerance:
+                return False
+            # A circular ellipsoid is invariant under any rotation around z, a square only under C4v
+            return isinstance(geometric_object, mp.Ellipsoid) or lattice_type == "square"
+        return False
+
+    @staticmethod
+    def _get_mode_data(ms, band, runner, polarization, mode_storage="fields") -> dict:
+        """
+        Get the mode dictionary of a band at the current k-point of the solver.
+
+        Args:
+            ms (mpb.ModeSolver): The mode solver, after solving the k-point.
+            band (int): The band, starting from 1.
+            runner (str): The name of the MPB runner.
+            polarization (str): The polarization of the simulation.
+            mode_storage (str, optional): What is stored for the mode, see run_simulation(). Default is 'fields'.
+
+        Returns:
+            dict: The mode dictionary.
+        """
+        mode = {
+            "freq": ms.freqs[band-1],
+            "k_point": ms.current_k,
+            "polarization": polarization,
+            "band": band,
+            "runner": runner,
+            # Hellmann-Feynman group velocity from the eigenvector, no extra solve is needed
+            "group_velocity": PhotonicCrystal._k_point_to_array(ms.compute_one_group_velocity(band)),
+        }
+        if mode_storage == "fields":
+            mode["h_field"] = ms.get_hfield(band, bloch_phase=True)
+            mode["e_field"] = ms.get_efield(band, bloch_phase=True)
+            mode["e_field_periodic"] = ms.get_efield(band, bloch_phase=False)
+            mode["h_field_periodic"] = ms.get_hfield(band, bloch_phase=False)
+        elif mode_storage == "eigenvectors":
+            mode["eigenvector"] = ms.get_eigenvectors(band, 1)
+        # The same bands are needed to solve the mode again: with fewer bands, a degenerate partner can be returned
+        mode["num_bands"] = ms.num_bands
+        if ms.target_freq:
+            # The band is numbered among the bands closest to the target
+            mode["target_freq"] = ms.target_freq
+        return mode
+
+    def iter_simulation(self, runner="run_zeven", polarization=None, mode_storage="fields", store=True):
+        """
+        Run the simulation with the solver set by set_solver(), yielding the result of each k-point 
+        as soon as MPB has solved it. The k-points are solved in order by the same solver, so each k-point 
+        starts from the eigenvectors of the previous one, as in run_simulation().
+        The caller can update a band plot progressively, stop early or write the results to disk.
+
+        Example:
+            ```python
+            crystal.set_solver()
+            for result in crystal.iter_simulation(runner="run_te"):
+                print(result["k_index"], result["freqs"])
+            ```
+
+        Args:
+            runner (str): The name of the MPB runner, see run_simulation(). It must be a key of RUNNER_PARITIES.
+                Default is 'run_zeven'.
+            polarization (str, optional): The polarization of the simulation. Default is None. If None, it uses the runner name.
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'fields'.
+            store (bool, optional): Store the modes in the crystal as they are solved and, when the iteration ends, 
+                the frequencies and the gaps of the solved k-points. Default is True. If False, nothing is kept 
+                in memory by the crystal.
+
+        Yields:
+            dict: A dictionary with the index of the k-point ('k_index'), the k-point ('k_point'), 
+                the frequencies of all the bands ('freqs') and the mode dictionaries ('modes').
+        """
+        if mode_storage not in self.MODE_STORAGES:
+            raise ValueError(f"Invalid mode storage: {mode_storage}. Choose one of {self.MODE_STORAGES}.")
+        if self.ms is None:
+            raise ValueError("Solver is not set. Call set_solver() before running the simulation.")
+        if runner not in self.RUNNER_PARITIES:
+            raise ValueError(f"Invalid runner: {runner}. Choose one of {list(self.RUNNER_PARITIES)}.")
+        if polarization is None:
+            polarization = runner[4:] if runner.startswith("run_") else runner
+
+        freqs = []
+        k_points = []
+        try:
+            with suppress_output():
+                self.ms.init_params(self.RUNNER_PARITIES[runner], True)
+            for i, k_point in enumerate(self.ms.k_points):
+                # The output is suppressed only while solving, not while the caller handles the result
+                with suppress_output():
+                    self.ms.current_k = k_point
+                    self.ms.solve_kpoint(k_point)
+                    modes = [self._get_mode_data(self.ms, band, runner, polarization, mode_storage) 
+                             for band in range(1, self.ms.num_bands + 1)]
+                k_point_freqs = np.array(self.ms.freqs)
+                if store:
+                    freqs.append(k_point_freqs)
+                    k_points.append(k_point)
+                    self.modes.extend(modes)
+                yield {"k_index": i, "k_point": k_point, "freqs": k_point_freqs, "modes": modes}
+        finally:
+            # If the iteration is stopped early, the k-points solved so far are stored
+            if store and freqs:
+                self.freqs[polarization] = np.array(freqs)
+                self.gaps[polarization] = compute_gap_list(freqs)
+                self.band_k_points[polarization] = k_points
+                self.build_mode_index()
+
+    def run_adaptive_simulation(self, runner="run_zeven", polarization=None, interp=1, tolerance=1e-3, 
+                                degeneracy_tolerance=1e-2, max_refinements=6, mode_storage="fields"):
+        """
+        Run the simulation on an adaptively refined k-path, instead of the uniform k_points_interpolated.
+        The simulation starts from a coarse path, interpolated with `interp` points between the corners k_points.
+        Then, at each refinement, only the segments of the path where the bands need more resolution are bisected:
+
+        - band curvature: the error of the linear interpolation of some band along the segment is larger than tolerance.
+        - near-degeneracies: two adjacent bands are closer than degeneracy_tolerance and their separation changes 
+            along the segment, for example near a Dirac cone or a band crossing.
+        - gap edges: the segment touches the maximum of the band below a gap or the minimum of the band above it, 
+            and the band changes more than tolerance along the segment.
+        
+        The non-uniform k-points are stored in band_k_points[polarization], plot_bands() uses them.
+
+        Args:
+            runner (str): The name of the MPB runner, see run_simulation(). Default is 'run_zeven'.
+            polarization (str, optional): The polarization of the simulation. Default is None. If None, it uses the runner name.
+            interp (int, optional): The number of points interpolated between the corners in the coarse path. Default is 1.
+            tolerance (float, optional): The target error on the frequencies (c/a). Default is 1e-3.
+            degeneracy_tolerance (float, optional): Two bands closer than this (c/a) are near-degenerate. Default is 1e-2.
+            max_refinements (int, optional): The maximum number of refinements. Default is 6.
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'fields'.
+        """
+        if mode_storage not in self.MODE_STORAGES:
+            raise ValueError(f"Invalid mode storage: {mode_storage}. Choose one of {self.MODE_STORAGES}.")
+        if polarization is None:
+            polarization = runner[4:] if runner.startswith("run_") else runner
+
+        k_path = list(mp.interpolate(interp, self.k_points))
+        # The path has a kink at the corners, the curvature is not estimated across them
+        is_corner = np.zeros(len(k_path), dtype=bool)
+        is_corner[::interp + 1] = True
+        min_length = self.ADAPTIVE_MIN_SEGMENT * self._k_path_distances(self.k_points)[-1]
+
+        freqs = self._solve_k_point_list(k_path, runner, polarization, mode_storage)
+        for _ in range(max_refinements):
+            segments = self._segments_to_refine(self._k_path_distances(k_path), freqs, is_corner, 
+                                                tolerance, degeneracy_tolerance, min_length)
+            if len(segments) == 0:
+                break
+            midpoints = [(k_path[j] + k_path[j + 1]).scale(0.5) for j in segments]
+            midpoint_freqs = self._solve_k_point_list(midpoints, runner, polarization, mode_storage)
+            # Insert from the end of the path, so that the indices of the other segments stay valid
+            for j, midpoint, midpoint_freq in reversed(list(zip(segments, midpoints, midpoint_freqs))):
+                k_path.insert(j + 1, midpoint)
+                is_corner = np.insert(is_corner, j + 1, False)
+                freqs = np.insert(freqs, j + 1, midpoint_freq, axis=0)
+
+        self.freqs[polarization] = freqs
+        self.gaps[polarization] = compute_gap_list(freqs)
+        self.band_k_points[polarization] = k_path
+        self.build_mode_index()
+
+    def _solve_k_point_list(self, k_points, runner, polarization, mode_storage="fields") -> np.ndarray:
+        """
+        Solve a list of k-points with a new ModeSolver, storing the modes in the crystal.
+
+        Args:
+            k_points (list): The k-points to solve.
+            runner (str): The name of the MPB runner.
+            polarization (str): The polarization of the simulation.
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'fields'.
+
+        Returns:
+            np.ndarray: The frequencies, with shape (number of k-points, number of bands).
+        """
+        ms = mpb.ModeSolver(geometry=self.geometry.to_list(),
+                            geometry_lattice=self.geometry_lattice,
+                            k_points=k_points,
+                            resolution=self.resolution,
+                            num_bands=self.num_bands,
+                            target_freq=self.target_freq or 0)
+
+        def get_mode_data(ms, band):
+            self.modes.append(self._get_mode_data(ms, band, runner, polarization, mode_storage))
+
+        with suppress_output():
+            getattr(ms, runner)(get_mode_data)
+        return np.array(ms.all_freqs)
+
+    @staticmethod
+    def _segments_to_refine(distances, freqs, is_corner, tolerance, degeneracy_tolerance, min_length) -> np.ndarray:
+        """
+        Find the segments of a k-path to bisect, see run_adaptive_simulation().
+
+        Args:
+            distances (np.ndarray): The distance of each k-point along the path.
+            freqs (np.ndarray): The frequencies, with shape (number of k-points, number of bands).
+            is_corner (np.ndarray): Whether each k-point is a corner of the path.
+            tolerance (float): The target error on the frequencies.
+            degeneracy_tolerance (float): Two bands closer than this are near-degenerate.
+            min_length (float): Segments shorter than this are not bisected.
+
+        Returns:
+            np.ndarray: The indices of the segments to bisect. Segment j goes from k-point j to k-point j+1.
+        """
+        num_k_points, num_bands = freqs.shape
+        lengths = np.diff(distances)
+        refine = np.zeros(num_k_points - 1, dtype=bool)
+
+        # Band curvature: the error of the linear interpolation on a segment of length h is h^2 |f''| / 8
+        slopes = np.diff(freqs, axis=0) / lengths[:, np.newaxis]
+        curvature = np.zeros_like(freqs)
+        curvature[1:-1] = 2 * np.abs(np.diff(slopes, axis=0)) / (lengths[:-1] + lengths[1:])[:, np.newaxis]
+        curvature[is_corner] = 0
+        interpolation_error = lengths**2 / 8 * np.max(np.maximum(curvature[:-1], curvature[1:]), axis=1)
+        refine |= interpolation_error > tolerance
+
+        # Near-degeneracies: close bands whose separation changes along the segment
+        if num_bands > 1:
+            separation = np.diff(freqs, axis=1)
+            near = np.minimum(separation[:-1], separation[1:]) < degeneracy_tolerance
+            changing = np.abs(np.diff(separation, axis=0)) > tolerance
+            refine |= np.any(near & changing, axis=1)
+
+        # Gap edges: the extrema of the bands bounding each gap
+        for band in range(num_bands - 1):
+            if freqs[:, band + 1].min() <= freqs[:, band].max():
+                continue
+            for edge_band, i in ((band, np.argmax(freqs[:, band])), (band + 1, np.argmin(freqs[:, band + 1]))):
+                for j in (i - 1, i):
+                    if 0 <= j < num_k_points - 1 and abs(freqs[j + 1, edge_band] - freqs[j, edge_band]) > tolerance:
+                        refine[j] = True
+
+        refine &= lengths > min_length
+        return np.nonzero(refine)[0]
+
+    def _k_path_distances(self, k_points) -> np.ndarray:
+        """
+        Compute the cumulative distance along a k-path, in Cartesian reciprocal space.
+
+        Args:
+            k_points (list): The k-points of the path, in the basis of the reciprocal lattice.
+
+        Returns:
+            np.ndarray: The distance of each k-point from the first one, along the path.
+        """
+        cartesian = self._k_points_to_cartesian(k_points)
+        return np.concatenate([[0], np.cumsum(np.linalg.norm(np.diff(cartesian, axis=0), axis=1))])
+
+    def converge_resolution(self, tolerance=1e-3, resolutions=None, runner="run_zeven", k_points=None, order=2) -> dict:
+        """
+        Find the cheapest resolution that meets a tolerance on the frequencies. 
+        The k-points are solved at a ladder of increasing resolutions. After each step, the frequencies of the 
+        last two resolutions are extrapolated to infinite resolution (Richardson extrapolation):
+
+            f_inf = f_2 + (f_2 - f_1) / ((r_2 / r_1)^order - 1)
+
+        and the error of the last resolution is estimated as |f_inf - f_2|. The ladder stops at the first 
+        resolution whose estimated error is below the tolerance for every band and k-point.
+        The crystal is not modified, set the resolution returned if it fits.
+
+        Args:
+            tolerance (float, optional): The target error on the frequencies (c/a). Default is 1e-3.
+            resolutions (list, optional): The ladder of increasing resolutions (int or mp.Vector3). Default is None, 
+                which uses 0.5, 0.75, 1, 1.5 and 2 times the current resolution.
+            runner (str, optional): The name of the MPB runner, see run_simulation(). Default is 'run_zeven'.
+            k_points (list, optional): The k-points to solve. Default is None, which uses the corners k_points.
+            order (float, optional): The convergence order of the frequencies with the resolution. Default is 2, 
+                which is the order of MPB with its sub-pixel smoothing of epsilon.
+
+        Returns:
+            dict: A dictionary with:
+
+                - 'resolution': The cheapest resolution meeting the tolerance, or the last one if none does.
+                - 'converged' (bool): Whether the tolerance was met.
+                - 'resolutions' (list): The resolutions solved.
+                - 'freqs' (list): The frequencies at each resolution solved, with shape (number of k-points, number of bands).
+                - 'extrapolated_freqs' (np.ndarray): The frequencies extrapolated to infinite resolution.
+                - 'error' (np.ndarray): The estimated error of each band at 'resolution', the maximum over the k-points.
+        """
+        if resolutions is None:
+            resolutions = [self._scale_resolution(self.resolution, factor) for factor in (0.5, 0.75, 1, 1.5, 2)]
+        if len(resolutions) < 2:
+            raise ValueError("At least two resolutions are needed to extrapolate the frequencies.")
+        if k_points is None:
+            k_points = self.k_points
+
+        solved = []
+        all_freqs = []
+        for resolution in resolutions:
+            ms = mpb.ModeSolver(geometry=self.geometry.to_list(),
+                                geometry_lattice=self.geometry_lattice,
+                                k_points=k_points,
+                                resolution=resolution,
+                                num_bands=self.num_bands,
+                                target_freq=self.target_freq or 0)
+            with suppress_output():
+                getattr(ms, runner)()
+            solved.append(resolution)
+            all_freqs.append(np.array(ms.all_freqs))
+            if len(solved) < 2:
+                continue
+
+            ratio = self._resolution_scale(solved[-1]) / self._resolution_scale(solved[-2])
+            extrapolated_freqs = all_freqs[-1] + (all_freqs[-1] - all_freqs[-2]) / (ratio**order - 1)
+            error = np.max(np.abs(extrapolated_freqs - all_freqs[-1]), axis=0)
+            print(f"Resolution {resolution}: estimated error {np.max(error):.2e}")
+            if np.all(error <= tolerance):
+                break
+
+        return {
+            "resolution": solved[-1],
+            "converged": bool(np.all(error <= tolerance)),
+            "resolutions": solved,
+            "freqs": all_freqs,
+            "extrapolated_freqs": extrapolated_freqs,
+            "error": error,
+        }
+
+    @staticmethod
+    def _scale_resolution(resolution, factor):
+        """
+        Scale a resolution, rounding it to integers.
+
+        Args:
+            resolution (int | tuple | mp.Vector3): The resolution.
+            factor (float): The scale factor.
+
+        Returns:
+            int | tuple | mp.Vector3: The scaled resolution, of the same type.
+        """
+        if isinstance(resolution, mp.Vector3):
+            return mp.Vector3(*[max(1, round(r * factor)) for r in (resolution.x, resolution.y, resolution.z)])
+        if isinstance(resolution, (tuple, list)):
+            return type(resolution)(max(1, round(r * factor)) for r in resolution)
+        return max(1, round(resolution * factor))
+
+    @staticmethod
+    def _resolution_scale(resolution) -> float:
+        """
+        Get a scalar measure of a resolution, to compute the ratio between resolutions of a ladder.
+
+        Args:
+            resolution (int | tuple | mp.Vector3): The resolution.
+
+        Returns:
+            float: The resolution along x.
+        """
+        if isinstance(resolution, mp.Vector3):
+            return float(resolution.x)
+        if isinstance(resolution, (tuple, list)):
+            return float(resolution[0])
+        return float(resolution)
+
+    def run_k_grid(self, runner="run_zeven", num_k=21, k_max=None, use_symmetry=True, refinements=0, 
+                   tolerance=1e-3, degeneracy_tolerance=1e-2, num_workers=None) -> dict:
+        """
+        Compute the bands on a uniform 2D grid of k-points (kx, ky) centered at Gamma, for example to plot 
+        isofrequency contours with plot_isofrequency_contours(). Only the grid points in the first Brillouin zone 
+        of the lattice are solved, the others are NaN: for a triangular lattice the contours fill the hexagonal zone.
+        The lattice must be periodic in the xy plane, as the lattices of Crystal2D and CrystalSlab.
+        
+        If use_symmetry is True and the crystal is invariant under the point group of its lattice 
+        (see point_group_operations()), only one k-point of each set of equivalent grid points is solved 
+        (the irreducible wedge) and the results are unfolded to the full grid. For a square lattice the whole 
+        C4v group is used (about 8 times fewer solves). The Cartesian grid is not closed under the 60° rotations 
+        of C6v, so for a triangular lattice only its subgroup {E, C2, sigma_x, sigma_y} is used (about 4 times 
+        fewer solves), see crystal_symmetries.grid_preserving_operations().
+        The k-points to solve are split across a pool of worker processes, the largest chunks first 
+        (see estimate_cost()), and the progress is printed with an estimated time left.
+
+        With refinements, the grid is made twice as fine at each refinement, but only the cells where a band 
+        is curved or two bands are near-degenerate (see run_adaptive_simulation()) are solved again; 
+        in the other cells the frequencies are interpolated linearly.
+
+        Args:
+            runner (str, optional): The name of the MPB runner, see run_simulation(). Default is 'run_zeven'.
+            num_k (int, optional): The number of grid points along kx and ky. Default is 21.
+            k_max (float, optional): The grid covers [-k_max, k_max] along kx and ky, in Cartesian coordinates 
+                (units of 2π/a). Default is None, which covers the first Brillouin zone.
+            use_symmetry (bool, optional): Solve only the irreducible grid points. Default is True.
+            refinements (int, optional): The number of adaptive refinements. Default is 0.
+            tolerance (float, optional): The target error on the frequencies (c/a) for the refinements. Default is 1e-3.
+            degeneracy_tolerance (float, optional): Two bands closer than this (c/a) are near-degenerate. Default is 1e-2.
+            num_workers (int, optional): The number of worker processes. Default is None, which uses all available CPUs. 
+                If 1, the k-points are solved in this process.
+
+        Returns:
+            dict: A dictionary with:
+
+                - 'kx', 'ky' (np.ndarray): The Cartesian coordinates of the grid.
+                - 'freqs' (np.ndarray): The frequencies, with shape (len(kx), len(ky), number of bands). 
+                    NaN outside the first Brillouin zone.
+                - 'solved' (np.ndarray): Whether each grid point was solved (or is equivalent to a solved one) 
+                    rather than interpolated, with shape (len(kx), len(ky)).
+                - 'in_zone' (np.ndarray): Whether each grid point is in the first Brillouin zone, 
+                    with shape (len(kx), len(ky)).
+                - 'polarization' (str): The polarization, from the runner name.
+
+        Raises:
+            ValueError: If the lattice is not periodic in the xy plane.
+        """
+        lattice = self.geometry_lattice
+        if lattice is None or any(abs(basis.z) > 1e-12 for basis in (lattice.basis1, lattice.basis2)):
+            raise ValueError("run_k_grid() needs a lattice periodic in the xy plane, such as the lattices "
+                             "of Crystal2D and CrystalSlab.")
+        reciprocal_vectors = self._k_points_to_cartesian([mp.Vector3(1, 0), mp.Vector3(0, 1)])[:, :2]
+        if k_max is None:
+            k_max = float(np.max(np.abs(brillouin_zone_vertices(reciprocal_vectors))))
+
+        operations = None
+        if use_symmetry:
+            if runner in self.SYMMETRY_REDUCIBLE_RUNNERS:
+                operations = self.point_group_operations()
+            if operations is not None:
+                operations = grid_preserving_operations(operations)
+            if operations is None:
+                print("The crystal or the runner do not allow a symmetry reduction, "
+                      "all the grid points are solved.")
+        if operations is None:
+            operations = {"E": np.identity(2)}
+
+        def grid(num_k):
+            k_values = np.linspace(-k_max, k_max, num_k)
+            kx, ky = np.meshgrid(k_values, k_values, indexing="ij")
+            points = np.stack([kx.ravel(), ky.ravel(), np.zeros(kx.size)], axis=1)
+            in_zone = first_brillouin_zone_mask(points, reciprocal_vectors).reshape(num_k, num_k)
+            return k_values, points.reshape(num_k, num_k, 3), in_zone
+
+        k_values, points, in_zone = grid(num_k)
+        # frequencies of the solved orbits, by canonical key
+        known = {}
+        zone_freqs = self._solve_k_grid_points(points[in_zone], operations, known, runner, num_workers)
+        freqs = np.full((num_k, num_k, zone_freqs.shape[1]), np.nan)
+        freqs[in_zone] = zone_freqs
+        solved = in_zone.copy()
+
+        for _ in range(refinements):
+            cells = self._k_grid_cells_to_refine(freqs, tolerance, degeneracy_tolerance)
+            if not np.any(cells):
+                break
+            num_k = 2 * num_k - 1
+            k_values, points, in_zone = grid(num_k)
+
+            # Linear interpolation of the new points: edge midpoints and cell centers
+            fine_freqs = np.empty((num_k, num_k, freqs.shape[2]))
+            fine_freqs[::2, ::2] = freqs
+            fine_freqs[1::2, ::2] = (freqs[:-1, :] + freqs[1:, :]) / 2
+            fine_freqs[::2, 1::2] = (freqs[:, :-1] + freqs[:, 1:]) / 2
+            fine_freqs[1::2, 1::2] = (freqs[:-1, :-1] + freqs[1:, :-1] + freqs[:-1, 1:] + freqs[1:, 1:]) / 4
+            fine_freqs[~in_zone] = np.nan
+            fine_solved = np.zeros((num_k, num_k), dtype=bool)
+            fine_solved[::2, ::2] = solved
+
+            # The new points of the flagged cells are solved, and so are the points of the zone 
+            # that cannot be interpolated because a neighbor is outside the zone
+            to_solve = np.zeros((num_k, num_k), dtype=bool)
+            for i, j in np.argwhere(cells):
+                to_solve[2 * i:2 * i + 3, 2 * j:2 * j + 3] = True
+            to_solve |= np.isnan(fine_freqs[..., 0])
+            to_solve &= in_zone & ~fine_solved
+            if np.any(to_solve):
+                fine_freqs[to_solve] = self._solve_k_grid_points(points[to_solve], operations, known, runner, num_workers)
+            fine_solved |= to_solve
+
+            freqs, solved = fine_freqs, fine_solved
+
+        return {
+            "kx": k_values,
+            "ky": k_values,
+            "freqs": freqs,
+            "solved": solved,
+            "in_zone": in_zone,
+            "polarization": runner[4:] if runner.startswith("run_") else runner,
+        }
+
+    def _solve_k_grid_points(self, points, operations, known, runner, num_workers=None) -> np.ndarray:
+        """
+        Solve the grid points whose orbit has not been solved yet, then get the frequencies of all the points.
+
+        Args:
+            points (np.ndarray): The k-points in Cartesian coordinates, with shape (N, 3).
+            operations (dict): The point group operations used to find equivalent k-points.
+            known (dict): The frequencies of the orbits already solved, by canonical key. It is updated.
+            runner (str): The name of the MPB runner.
+            num_workers (int, optional): The number of worker processes, see run_k_grid(). Default is None.
+
+        Returns:
+            np.ndarray: The frequencies of the points, with shape (N, number of bands).
+        """
+        keys = [canonical_k_point_key(point, operations) for point in points]
+        new_keys = {}
+        for key, point in zip(keys, points):
+            if key not in known and key not in new_keys:
+                new_keys[key] = mp.cartesian_to_reciprocal(mp.Vector3(*point), self.geometry_lattice)
+        print(f"k-grid: {len(new_keys)} of {len(points)} k-points solved.")
+
+        if new_keys:
+            k_points = list(new_keys.values())
+            if num_workers == 1 or len(k_points) == 1:
+                freqs = self._solve_frequencies(k_points, runner)
+            else:
+                if num_workers is None:
+                    num_workers = default_num_workers()
+                chunks = split_k_points(k_points, num_workers)
+                calls = [(self._worker_copy(), "_solve_frequencies", {"k_points": chunk, "runner": runner}) 
+                         for chunk in chunks]
+                costs = [self.estimate_cost(len(chunk)) for chunk in chunks]
+                freqs = np.vstack(run_in_pool(calls, num_workers=num_workers, costs=costs, progress=True))
+            known.update(zip(new_keys, freqs))
+        return np.array([known[key] for key in keys])
+
+    def _solve_frequencies(self, k_points, runner) -> np.ndarray:
+        """
+        Solve a list of k-points with a new ModeSolver, keeping only the frequencies.
+        This method is also executed in the worker processes by run_k_grid().
+
+        Args:
+            k_points (list): The k-points to solve.
+            runner (str): The name of the MPB runner.
+
+        Returns:
+            np.ndarray: The frequencies, with shape (number of k-points, number of bands).
+        """
+        ms = mpb.ModeSolver(geometry=self.geometry.to_list(),
+                            geometry_lattice=self.geometry_lattice,
+                            k_points=k_points,
+                            resolution=self.resolution,
+                            num_bands=self.num_bands,
+                            target_freq=self.target_freq or 0)
+        with suppress_output():
+            getattr(ms, runner)()
+        return np.array(ms.all_freqs)
+
+    def estimate_cost(self, num_k_points=None) -> float:
+        """
+        Estimate the relative cost of solving the crystal with one runner, from the size of its grid 
+        (resolution and lattice size), its number of bands and the number of k-points, see estimate_solve_cost().
+        It is used to schedule the points of a sweep and to estimate the time left.
+
+        Args:
+            num_k_points (int, optional): The number of k-points. Default is None, which uses the interpolated k-points.
+
+        Returns:
+            float: The estimated cost, in arbitrary units. Only ratios of costs are meaningful.
+        """
+        if num_k_points is None:
+            num_k_points = len(self.k_points_interpolated)
+        return estimate_solve_cost(self.resolution, self.geometry_lattice.size, self.num_bands, num_k_points)
+
+    def _solve_sweep_point(self, k_points, runners) -> list:
+        """
+        Solve the k-points of a sweep point with every runner, keeping only the frequencies.
+        This method is executed in the worker processes by run_sweep().
+
+        Args:
+            k_points (list): The k-points to solve.
+            runners (list): The names of the MPB runners.
+
+        Returns:
+            list: The frequencies of each runner, with shape (number of k-points, number of bands).
+        """
+        return [self._solve_frequencies(k_points, runner) for runner in runners]
+
+    @staticmethod
+    def _k_grid_cells_to_refine(freqs, tolerance, degeneracy_tolerance) -> np.ndarray:
+        """
+        Find the cells of a k-grid to refine, see run_k_grid().
+
+        Args:
+            freqs (np.ndarray): The frequencies on the grid, with shape (num_k, num_k, number of bands).
+            tolerance (float): The target error on the frequencies.
+            degeneracy_tolerance (float): Two bands closer than this are near-degenerate.
+
+        Returns:
+            np.ndarray: Whether each cell must be refined, with shape (num_k - 1, num_k - 1). 
+                Cell (i, j) has the grid points (i, j) and (i + 1, j + 1) as corners.
+        """
+        # The error of the linear interpolation at the middle of a cell is about |second difference| / 8
+        second_difference = np.zeros_like(freqs)
+        second_difference[1:-1, :] = np.abs(freqs[2:, :] - 2 * freqs[1:-1, :] + freqs[:-2, :])
+        second_difference[:, 1:-1] = np.maximum(second_difference[:, 1:-1], 
+                                                np.abs(freqs[:, 2:] - 2 * freqs[:, 1:-1] + freqs[:, :-2]))
+        curved = np.max(second_difference, axis=2) / 8 > tolerance
+        cells = curved[:-1, :-1] | curved[1:, :-1] | curved[:-1, 1:] | curved[1:, 1:]
+
+        # Near-degeneracies: close bands whose separation changes inside the cell
+        if freqs.shape[2] > 1:
+            separation = np.diff(freqs, axis=2)
+            corners = np.stack([separation[:-1, :-1], separation[1:, :-1], separation[:-1, 1:], separation[1:, 1:]])
+            near = np.min(corners, axis=0) < degeneracy_tolerance
+            changing = np.max(corners, axis=0) - np.min(corners, axis=0) > tolerance
+            cells |= np.any(near & changing, axis=2)
+        return cells
+
+    def plot_isofrequency_contours(self, k_grid, band, fig=None, ncontours=20, colorscale='Viridis') -> go.Figure:
+        """
+        Plot the isofrequency contours of a band computed on a k-grid with run_k_grid().
+        Circular contours around Gamma show that a Dirac-cone mode is isotropic.
+
+        Args:
+            k_grid (dict): The result of run_k_grid().
+            band (int): The band to plot, starting from 1.
+            fig (go.Figure, optional): The Plotly figure to add the plot to. Default is None.
+            ncontours (int, optional): The maximum number of contours. Default is 20.
+            colorscale (str, optional): The colorscale. Default is 'Viridis'.
+
+        Returns:
+            go.Figure: The Plotly figure object.
+        """
+        if fig is None:
+            fig = go.Figure()
+        fig.add_trace(go.Contour(
+            x=k_grid["kx"],
+            y=k_grid["ky"],
+            # Plotly expects the rows of z along y
+            z=k_grid["freqs"][:, :, band - 1].T,
+            ncontours=ncontours,
+            colorscale=colorscale,
+            colorbar=dict(title='frequency (c/a)'),
+            hovertemplate="k-point: (%{x:.4f}, %{y:.4f})<br>frequency: %{z:.4f}<extra></extra>",
+        ))
+        fig.update_layout(
+            title=f"Isofrequency contours, band {band} ({k_grid['polarization']})",
+            xaxis_title='kx (2π/a)',
+            yaxis_title='ky (2π/a)',
+            yaxis=dict(scaleanchor='x', scaleratio=1),
+        )
+        return fig
+
+    def _k_points_to_cartesian(self, k_points) -> np.ndarray:
+        """
+        Convert k-points from the basis of the reciprocal lattice to Cartesian coordinates.
+
+        Args:
+            k_points (list): The k-points, in the basis of the reciprocal lattice.
+
+        Returns:
+            np.ndarray: The k-points in Cartesian coordinates, with shape (N, 3).
+        """
+        cartesian = []
+        for k_point in k_points:
+            k_point = mp.Vector3(*self._k_point_to_array(k_point))
+            cartesian.append(self._k_point_to_array(mp.reciprocal_to_cartesian(k_point, self.geometry_lattice)))
+        return np.array(cartesian).reshape(-1, 3)
+
+    def _run_warm_started(self, runner, *band_functions, cold_reference=False) -> np.ndarray:
+        """
+        Solve the k-points of the solver set by set_solver() one at a time, seeding each k-point with the 
+        converged eigenvectors of the same k-point from the previous warm-started run of the same runner.
+        The seeds are used only if that run had the same number of k-points, bands and grid points, 
+        otherwise the run starts cold. 
+
+        The iterations are stored in solver_iterations[runner], a dictionary with:
+
+        - 'iterations' (list): The eigensolver iterations of each k-point.
+        - 'warm' (bool): Whether the run was seeded.
+        - 'cold_iterations' (list | None): The iterations of each k-point of a cold run of the same configuration 
+            and k-points, as solved by the MPB runners: random fields, each k-point seeded with the previous one. 
+            For an unseeded run, the run itself. For a seeded run, they are measured by a reference solve 
+            before the seeded one only if cold_reference is True, otherwise None.
+        - 'saved' (int | None): The total cold iterations minus the total iterations, or None if not measured.
+
+        Args:
+            runner (str): The name of the MPB runner. It must be a key of RUNNER_PARITIES.
+            *band_functions: The band functions, called as band_function(ms, band) for each band of each k-point.
+            cold_reference (bool, optional): Measure the cold iterations of a seeded run with a reference solve, 
+                which doubles its cost. Default is False.
+
+        Returns:
+            np.ndarray: The frequencies, with shape (number of k-points, number of bands).
+        """
+        if runner not in self.RUNNER_PARITIES:
+            raise ValueError(f"Warm start is not supported for the runner {runner}. Choose one of {list(self.RUNNER_PARITIES)}.")
+        parity = self.RUNNER_PARITIES[runner]
+        num_bands = self.ms.num_bands
+        k_points = list(self.ms.k_points)
+
+        self.ms.init_params(parity, True)
+        previous = self._warm_start.get(runner)
+        seeds = None
+        if previous is not None and len(previous["eigenvectors"]) == len(k_points):
+            if np.shape(previous["eigenvectors"][0]) == np.shape(self.ms.get_eigenvectors(1, num_bands)):
+                seeds = previous["eigenvectors"]
+
+        cold_iterations = None
+        if seeds is not None and cold_reference:
+            _, cold_iterations, _ = self._solve_k_points_sequentially(k_points)
+            # Start the seeded run from random fields again
+            self.ms.init_params(parity, True)
+        freqs, iterations, eigenvectors = self._solve_k_points_sequentially(k_points, seeds, band_functions)
+        if seeds is None:
+            cold_iterations = iterations
+
+        self._warm_start[runner] = {"eigenvectors": eigenvectors}
+        self.solver_iterations[runner] = {
+            "iterations": iterations,
+            "warm": seeds is not None,
+            "cold_iterations": cold_iterations,
+            "saved": sum(cold_iterations) - sum(iterations) if cold_iterations is not None else None,
+        }
+        return np.array(freqs)
+
+    def _solve_k_points_sequentially(self, k_points, seeds=None, band_functions=()) -> tuple:
+        """
+        Solve k-points one at a time with the current solver, see _run_warm_started().
+
+        Args:
+            k_points (list): The k-points.
+            seeds (list, optional): The eigenvectors to seed each k-point with. Default is None: 
+                each k-point starts from the eigenvectors of the previous one, as in the MPB runners.
+            band_functions (tuple, optional): The band functions, called as band_function(ms, band) for each band 
+                of each k-point. Default is ().
+
+        Returns:
+            tuple: The frequencies, the eigensolver iterations and the converged eigenvectors of each k-point.
+        """
+        num_bands = self.ms.num_bands
+        freqs, iterations, eigenvectors = [], [], []
+        for i, k_point in enumerate(k_points):
+            if seeds is not None:
+                self.ms.set_eigenvectors(seeds[i], 1)
+            self.ms.current_k = k_point
+            self.ms.solve_kpoint(k_point)
+            # ms.iterations is updated only by the MPB runners: read the count of this solve from the solver
+            iterations.append(self.ms.mode_solver.get_iterations())
+            freqs.append(np.array(self.ms.freqs))
+            for band in range(1, num_bands + 1):
+                for band_function in band_functions:
+                    band_function(self.ms, band)
+            eigenvectors.append(self.ms.get_eigenvectors(1, num_bands))
+        return freqs, iterations, eigenvectors
+
+    def _run_simulation_parallel(self, runner, polarization, num_workers, mode_storage="fields"):
+        """
+        Run the simulation splitting the interpolated k-points across a pool of worker processes.
+        Each worker solves a contiguous chunk of the k-path with its own ModeSolver.
+        The results are merged in k-path order, so that freqs, gaps and modes are the same as in a serial run.
+        The largest chunks are started first (see estimate_cost()) and the progress is printed with an estimated time left.
+
+        Args:
+            runner (str): The name of the MPB runner.
+            polarization (str): The polarization of the simulation.
+            num_workers (int): The number of worker processes.
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'fields'.
+        """
+        calls = []
+        costs = []
+        for k_points in split_k_points(self.k_points_interpolated, num_workers):
+            crystal = self._worker_copy()
+            crystal.k_points_interpolated = k_points
+            calls.append((crystal, "_solve_k_points", {"runner": runner, "polarization": polarization, "mode_storage": mode_storage}))
+            costs.append(self.estimate_cost(len(k_points)))
+
+        results = run_in_pool(calls, num_workers=num_workers, costs=costs, progress=True)
+
+        freqs = np.vstack([chunk_freqs for chunk_freqs, _ in results])
+        for _, chunk_modes in results:
+            self.modes.extend(chunk_modes)
+        self.freqs[polarization] = freqs
+        self.gaps[polarization] = compute_gap_list(freqs)
+        self.band_k_points.pop(polarization, None)
+        self.build_mode_index()
+
+    def _solve_k_points(self, runner, polarization, mode_storage="fields"):
+        """
+        Solve the interpolated k-points of this crystal serially. 
+        This method is executed in the worker processes by _run_simulation_parallel().
+
+        Args:
+            runner (str): The name of the MPB runner.
+            polarization (str): The polarization of the simulation.
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'fields'.
+
+        Returns:
+            tuple: A tuple containing the frequencies array and the list of mode dictionaries.
+        """
+        self.set_solver()
+        self.run_simulation(runner=runner, polarization=polarization, mode_storage=mode_storage)
+        return self.freqs[polarization], self.modes
+
+    def _worker_copy(self) -> 'PhotonicCrystal':
+        """
+        Create a lightweight copy of the crystal to be sent to a worker process.
+        The solver, the stored modes and the results are not copied.
+
+        Returns:
+            PhotonicCrystal: The copy of the crystal.
+        """
+        state = self.__getstate__()
+        state['modes'] = []
+        state['freqs'] = {}
+        state['gaps'] = {}
+        state['_mode_fields_cache'] = OrderedDict()
+        crystal = self.__class__.__new__(self.__class__)
+        crystal.__setstate__(state)
+        return crystal
+
+    @staticmethod
+    def _get_result_cache(cache):
+        """
+        Get the result cache to use from the cache argument of the run methods.
+
+        Args:
+            cache (ResultCache | bool | None): The cache argument.
+
+        Returns:
+            ResultCache: The result cache, or None if no cache must be used.
+        """
+        if cache is None or cache is False:
+            return None
+        if cache is True:
+            return ResultCache()
+        if isinstance(cache, ResultCache):
+            return cache
+        raise ValueError(f"Invalid cache: {cache}. Use None, True or a ResultCache.")
+
+    def _simulation_key(self, cache, k_points, num_bands, target_freq=None, configuration=None, **options) -> str:
+        """
+        Compute the result cache key of a simulation of this crystal.
 
-    def run_simulation_with_output(self, runner="run_zeven", polarization=None):
+        Args:
+            cache (ResultCache): The result cache.
+            k_points (list): The k-points of the simulation.
+            num_bands (int): The number of bands of the simulation.
+            target_freq (float, optional): The target frequency of the solver. Default is None.
+            configuration (tuple, optional): The (geometry objects, lattice, resolution) the simulation is solved with.
+                Default is None, which uses the current configuration of the crystal. Simulations run with the 
+                solver set by set_solver() pass the configuration captured there, since the crystal may have 
+                changed since.
+            **options: The other options that change the result, for example the runner.
+
+        Returns:
+            str: The key.
+        """
+        if target_freq:
+            options["target_freq"] = target_freq
+        if configuration is None:
+            configuration = (self.geometry.to_list(), self.geometry_lattice, self.resolution)
+        return cache.key(*configuration, num_bands, k_points, options)
+
+    def run_simulation_with_output(self, runner="run_zeven", polarization=None, cache=None, warm_start=False, 
+                                   mode_storage="fields", cold_reference=False):
         """
         Run the simulation and get mode data. Mode data are not stored in the crystal object, 
         but are returned as a list of dictionaries.
@@ -275,8 +1537,16 @@ class PhotonicCrystal:
                 - 'run': Do not consider symmetry.   
 
             polarization (str, optional): The polarization of the simulation. Default is None. If None, it uses the runner name.
+            cache (ResultCache | bool, optional): The on-disk result cache, see run_simulation(). Default is None.
+            warm_start (bool, optional): Seed the eigensolver with the eigenvectors of the previous warm-started run, 
+                see run_simulation(). Default is False.
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'fields'.
+            cold_reference (bool, optional): With warm_start, measure the iterations of a cold run too, 
+                see run_simulation(). Default is False.
 
         """
+        if mode_storage not in self.MODE_STORAGES:
+            raise ValueError(f"Invalid mode_storage: {mode_storage}. Choose one of {self.MODE_STORAGES}.")
         if self.ms is None:
             raise ValueError("Solver is not set. Call set_solver() before running the simulation.")
         
@@ -287,26 +1557,156 @@ class PhotonicCrystal:
                 polarization = runner[4:]
             else:
                 polarization = runner
+
+        cache = self._get_result_cache(cache)
+        if cache is not None:
+            # Modes with fields keep the key they had before mode_storage was an option
+            options = {} if mode_storage == "fields" else {"mode_storage": mode_storage}
+            key = self._simulation_key(cache, self.ms.k_points, self.ms.num_bands, self.ms.target_freq,
+                                       configuration=self._solver_configuration,
+                                       runner=runner, polarization=polarization, output="modes", **options)
+            modes = cache.get(key)
+            if modes is not None:
+                return modes
         modes=[]
-        # This is a custom mpb output function that stores the fields and frequencies
+        # This is a custom mpb output function that stores the mode data
         def get_mode_data(ms, band):
-            mode = {
-                "h_field": ms.get_hfield(band, bloch_phase=True),
-                "e_field": ms.get_efield(band, bloch_phase=True),
-                "h_field_periodic": ms.get_hfield(band, bloch_phase=False),
-                "e_field_periodic": ms.get_efield(band, bloch_phase=False),
-                "freq": ms.freqs[band-1],
-                "k_point": ms.current_k,
-                "polarization": polarization
-            }
-            modes.append(mode)
+            modes.append(self._get_mode_data(ms, band, runner, polarization, mode_storage))
         with suppress_output():
-            getattr(self.ms, runner)(get_mode_data, mpb.fix_efield_phase, mpb.fix_hfield_phase)
+            if warm_start:
+                self._run_warm_started(runner, get_mode_data, mpb.fix_efield_phase, mpb.fix_hfield_phase, 
+                                       cold_reference=cold_reference)
+            else:
+                getattr(self.ms, runner)(get_mode_data, mpb.fix_efield_phase, mpb.fix_hfield_phase)
+        if cache is not None:
+            cache.put(key, modes)
         return modes
         
        
 
 
+    def get_mode_fields(self, mode) -> dict:
+        """
+        Get a mode dictionary including the fields ('e_field', 'h_field', 'e_field_periodic', 'h_field_periodic').
+        If the mode was stored without fields (for example with mode_storage='frequencies'), 
+        only the single k-point of the mode is solved again, with the runner and the number of bands of the 
+        original solve, so that degenerate bands are found in the same order. If the mode was stored with 
+        mode_storage='eigenvectors', the stored eigenvectors of the k-point are used as starting guess, 
+        so the solver only has to confirm convergence, and the band whose eigenvector overlaps most with the 
+        stored one is selected. The fields are not built from the stored eigenvector alone: MPB scales the 
+        D and E fields by the frequencies of its last solve, which cannot be set without solving the k-point.
+        The phase of the fields is fixed with mpb.fix_efield_phase and mpb.fix_hfield_phase, as in run_simulation().
+        The result is cached, keyed by the configuration of the crystal (geometry, lattice and resolution), 
+        so asking again for the same mode costs nothing and a changed crystal never returns stale fields.
+
+        Args:
+            mode (dict): The mode dictionary.
+
+        Returns:
+            dict: The mode dictionary with the fields. It is the same dictionary if the fields were already stored.
+
+        Raises:
+            ValueError: If the runner of the mode is not a key of RUNNER_PARITIES.
+        """
+        if "e_field" in mode:
+            return mode
+
+        k_point = mode["k_point"]
+        configuration = configuration_hash(self.geometry.to_list(), self.geometry_lattice, self.resolution)
+        key = (configuration, mode["polarization"], (k_point.x, k_point.y, k_point.z), mode["band"], 
+               mode.get("runner"), mode.get("target_freq"))
+        if key in self._mode_fields_cache:
+            self._mode_fields_cache.move_to_end(key)
+            return self._mode_fields_cache[key]
+
+        runner = mode.get("runner", "run")
+        if runner not in self.RUNNER_PARITIES:
+            raise ValueError(f"Cannot recompute the fields of a mode of the runner {runner}. "
+                             f"Choose one of {list(self.RUNNER_PARITIES)}.")
+        ms = mpb.ModeSolver(geometry=self.geometry.to_list(),
+                            geometry_lattice=self.geometry_lattice,
+                            k_points=[k_point],
+                            resolution=self.resolution,
+                            num_bands=self._mode_num_bands(mode),
+                            target_freq=mode.get("target_freq", 0))
+        eigenvectors = self._stored_eigenvectors(mode)
+        with suppress_output():
+            ms.init_params(self.RUNNER_PARITIES[runner], True)
+            if eigenvectors is not None:
+                ms.set_eigenvectors(eigenvectors, 1)
+            ms.current_k = k_point
+            ms.solve_kpoint(k_point)
+            band = mode["band"]
+            if "eigenvector" in mode:
+                band = 1 + int(np.argmax(self._eigenvector_overlaps(mode["eigenvector"], 
+                                                                    ms.get_eigenvectors(1, ms.num_bands))))
+            # The same phase convention as the band functions of run_simulation()
+            mpb.fix_efield_phase(ms, band)
+            mpb.fix_hfield_phase(ms, band)
+            mode_with_fields = dict(mode)
+            mode_with_fields["h_field"] = ms.get_hfield(band, bloch_phase=True)
+            mode_with_fields["e_field"] = ms.get_efield(band, bloch_phase=True)
+            mode_with_fields["e_field_periodic"] = ms.get_efield(band, bloch_phase=False)
+            mode_with_fields["h_field_periodic"] = ms.get_hfield(band, bloch_phase=False)
+
+        self._mode_fields_cache[key] = mode_with_fields
+        while len(self._mode_fields_cache) > self.MODE_FIELDS_CACHE_SIZE:
+            self._mode_fields_cache.popitem(last=False)
+        return mode_with_fields
+
+    def _mode_num_bands(self, mode) -> int:
+        """
+        Get the number of bands of the solve that found a mode.
+        Modes stored before the number of bands was recorded use the number of bands of the crystal.
+
+        Args:
+            mode (dict): The mode dictionary.
+
+        Returns:
+            int: The number of bands.
+        """
+        return mode.get("num_bands", max(self.num_bands, mode["band"]))
+
+    @staticmethod
+    def _eigenvector_overlaps(reference, eigenvectors) -> np.ndarray:
+        """
+        Compute the overlaps |<v_j, reference>| of a reference eigenvector with the eigenvectors v_j of a solve.
+
+        Args:
+            reference (np.ndarray): The reference eigenvector, as returned by ModeSolver.get_eigenvectors(band, 1).
+            eigenvectors (np.ndarray): The eigenvectors, with the bands along the last axis.
+
+        Returns:
+            np.ndarray: The overlap with each band, with shape (number of bands,).
+        """
+        eigenvectors = np.asarray(eigenvectors)
+        eigenvectors = eigenvectors.reshape(-1, eigenvectors.shape[-1])
+        return np.abs(eigenvectors.conj().T @ np.asarray(reference).reshape(-1))
+
+    def _stored_eigenvectors(self, mode):
+        """
+        Collect the stored eigenvectors of all the bands of the solve that found the mode, at the k-point of the mode
+        (see _mode_num_bands()). They are used as starting guess to rebuild the fields of the mode.
+
+        Args:
+            mode (dict): The mode dictionary.
+
+        Returns:
+            np.ndarray | None: The eigenvectors, with the bands along the last axis. 
+                None if the mode was not stored with eigenvectors or some band is missing.
+        """
+        if "eigenvector" not in mode or mode.get("runner") not in self.RUNNER_PARITIES:
+            return None
+        num_bands = self._mode_num_bands(mode)
+        eigenvectors = {}
+        for other in self.look_for_mode(mode["polarization"], mode["k_point"], mode["freq"], freq_tolerance=np.inf):
+            if ("eigenvector" in other and other["band"] <= num_bands 
+                    and other.get("target_freq") == mode.get("target_freq")):
+                eigenvectors[other["band"]] = other["eigenvector"]
+        if len(eigenvectors) != num_bands:
+            return None
+        return np.concatenate([np.asarray(eigenvectors[band]) for band in range(1, num_bands + 1)], axis=-1)
+
     def run_dumb_simulation(self) -> mpb.ModeSolver:    
         """
         Run a dumb simulation.  It is the first band of the gamma point.
@@ -315,6 +1715,7 @@ class PhotonicCrystal:
         """
 
         #run the simulation in the gamma point, find one mode
+        self._solver_configuration = (self.geometry.to_list(), self.geometry_lattice, self.resolution)
         self.ms = mpb.ModeSolver(geometry=self.geometry.to_list(),
                                   geometry_lattice=self.geometry_lattice,
                                   k_points=[mp.Vector3()],
@@ -325,6 +1726,32 @@ class PhotonicCrystal:
         ms = self.ms
         return ms
     
+    def get_epsilon_and_lattice(self) -> tuple:
+        """
+        Get the epsilon grid and the lattice (as returned by ModeSolver.get_lattice()) of the crystal.
+        They are computed by initializing a ModeSolver, without running any eigensolve, and cached.
+        The cache is invalidated when the geometry, the materials, the lattice or the resolution change.
+
+        Returns:
+            tuple: A tuple containing the epsilon array and the lattice array.
+        """
+        key = configuration_hash(self.geometry.to_list(), self.geometry_lattice, self.resolution)
+        if self._epsilon_cache is None or self._epsilon_cache["key"] != key:
+            ms = mpb.ModeSolver(geometry=self.geometry.to_list(),
+                                geometry_lattice=self.geometry_lattice,
+                                k_points=[mp.Vector3()],
+                                resolution=self.resolution,
+                                num_bands=1)
+            with suppress_output():
+                # Initializing the solver computes epsilon, no eigensolve is needed
+                ms.init_params(mp.NO_PARITY, True)
+                self._epsilon_cache = {
+                    "key": key,
+                    "epsilon": ms.get_epsilon(),
+                    "lattice": ms.get_lattice(),
+                }
+        return self._epsilon_cache["epsilon"], self._epsilon_cache["lattice"]
+
     def convert_mode_fields(self, mode, periods=1)-> tuple:
         """
         Convert the mode fields to mpb.MPBArray for visualization.
@@ -337,12 +1764,13 @@ class PhotonicCrystal:
         Returns:
             tuple: A tuple containing the electric field array and the magnetic field array for visualization.
         """
+        mode = self.get_mode_fields(mode)
 
+        _, lattice = self.get_epsilon_and_lattice()
         with suppress_output():
-            self.run_dumb_simulation()
-            md = mpb.MPBData(rectify=True, periods=periods, lattice=self.ms.get_lattice())
-            e_field_array = mpb.MPBArray(mode["e_field"], lattice=self.ms.get_lattice(), kpoint=mode["k_point"])
-            h_field_array = mpb.MPBArray(mode["h_field"], lattice=self.ms.get_lattice(), kpoint=mode["k_point"])
+            md = mpb.MPBData(rectify=True, periods=periods, lattice=lattice)
+            e_field_array = mpb.MPBArray(mode["e_field"], lattice=lattice, kpoint=mode["k_point"])
+            h_field_array = mpb.MPBArray(mode["h_field"], lattice=lattice, kpoint=mode["k_point"])
             
             e_field =  md.convert(e_field_array)
             h_field =  md.convert(h_field_array)            
@@ -388,6 +1816,10 @@ class PhotonicCrystal:
 
         This method plots the bands for the specified polarization.
         In Dash and Jupyter Notebook, the plot is interactive and data are shown on hover.
+        The bands are built from the frequency matrix in a single WebGL trace per polarization, 
+        so that large band diagrams render quickly. The x-axis is the distance along the k-path, 
+        so non-uniform k-points (see run_adaptive_simulation()) are placed correctly.
+        The hover data include the group velocity of the modes, when it was stored.
 
         Args:
             polarization (str, optional): The polarization of the bands. Default is 'te'.
@@ -398,53 +1830,56 @@ class PhotonicCrystal:
         Returns:
             go.Figure: The Plotly figure object.
         """
-        if self.freqs[polarization] is None:
+        if self.freqs.get(polarization) is None:
             print("Simulation not run yet. Please run the simulation first.")
             return
-        freqs = self.freqs[polarization]
+        freqs = np.asarray(self.freqs[polarization])
         gaps = self.gaps[polarization]
+        num_k_points, num_bands = freqs.shape
 
-        xs = list(range(len(freqs)))
+        k_path = self.band_k_points.get(polarization, self.k_points_interpolated)
+        xs = self._k_path_distances(k_path)
+        # The corners of the path are the ticks of the x-axis
+        corner_xs = list(self._k_path_distances(self.k_points))
 
-        # Extract the interpolated k-points as vectors and format them for hover and click
-        k_points_interpolated = [kp for kp in self.k_points_interpolated]
+        # Solved k-points as an (N, 3) array, for hover and click
+        k_points = np.array([self._k_point_to_array(kp) for kp in k_path])
 
         if fig is None:
             fig = go.Figure()
 
-        # Iterate through each frequency band and add them to the plot
-        for band_index, band in enumerate(zip(*freqs)):
-            # Generate hover text with the corresponding k-point and frequency
-            hover_texts = [
-                f"k-point: ({kp.x:.4f}, {kp.y:.4f}, {kp.z:.4f})<br>frequency: {f:.4f}"
-                for kp, f in zip(k_points_interpolated, band)
-            ]
-
-
-            
-            modes =[]
-            for i, kp in enumerate(k_points_interpolated):
-                mode = self.look_for_mode(polarization, kp, band[i], freq_tolerance=1e-12)
-                modes.append(mode[0])
-            
-            
-
-            # Add the line trace with hover info
-            fig.add_trace(go.Scatter(
-                x=xs, 
-                y=band, 
-                mode='lines', 
-                line=dict(color=color),
-                text=hover_texts,  # Custom hover text
-                hoverinfo='text',  # Display only the custom hover text
-                customdata=[(kp.x, kp.y, kp.z, f, polarization) for kp, f in zip(k_points_interpolated, band)],  # Attach k-points and frequency as custom data
-                showlegend=False,  # Hide from legend (we’ll add a separate legend entry)
-                legendgroup=polarization,  # Group traces by polarization for toggling visibility
-                visible=True,  # Initially visible
-                selectedpoints=[],  # Placeholder for selected points
-                selected=dict(marker=dict(color="red", size=10)),  # Change color and size of selected points
-                unselected=dict(marker=dict(opacity=0.3))  # Make unselected points more transparent
-            ))
+        # All the bands go in a single WebGL trace, separated by a NaN point so that they are not connected.
+        # Rows of the arrays below are bands, columns are k-points plus the separator.
+        x = np.tile(np.append(xs, np.nan), num_bands)
+        y = np.hstack([freqs.T, np.full((num_bands, 1), np.nan)]).ravel()
+
+        # custom data: (kx, ky, kz, frequency, polarization, vx, vy, vz), the first five are read back when a point is clicked
+        customdata = np.full((num_bands, num_k_points + 1, 8), None, dtype=object)
+        customdata[:, :num_k_points, :3] = k_points[np.newaxis, :, :]
+        customdata[:, :num_k_points, 3] = freqs.T
+        customdata[:, :num_k_points, 4] = polarization
+        customdata[:, :num_k_points, 5:] = self._group_velocity_matrix(polarization, k_points, num_bands).transpose(1, 0, 2)
+        customdata = customdata.reshape(-1, 8)
+
+        fig.add_trace(go.Scattergl(
+            x=x, 
+            y=y, 
+            mode='lines', 
+            line=dict(color=color),
+            customdata=customdata,  # Attach k-points and frequency as custom data
+            hovertemplate=(
+                "k-point: (%{customdata[0]:.4f}, %{customdata[1]:.4f}, %{customdata[2]:.4f})"
+                "<br>frequency: %{y:.4f}"
+                "<br>group velocity: (%{customdata[5]:.4f}, %{customdata[6]:.4f}, %{customdata[7]:.4f}) c<extra></extra>"
+            ),
+            name=f'{polarization.upper()}',  # Legend entry for the polarization
+            showlegend=True,  # Show the legend entry
+            legendgroup=polarization,  # Group traces by polarization for toggling visibility
+            visible=True,  # Initially visible
+            selectedpoints=[],  # Placeholder for selected points
+            selected=dict(marker=dict(color="red", size=10)),  # Change color and size of selected points
+            unselected=dict(marker=dict(opacity=0.3))  # Make unselected points more transparent
+        ))
         
         # Add bandgap shading (optional, grouped with the polarization for toggling visibility)
         for gap in gaps:
@@ -463,17 +1898,6 @@ class PhotonicCrystal:
                     visible=True  # Initially visible
                 )
 
-        # Add a single legend entry for toggling visibility
-        fig.add_trace(go.Scatter(
-            x=[None], y=[None],
-            mode='lines',
-            line=dict(color=color),
-            name=f'{polarization.upper()}',  # Legend entry for the polarization
-            legendgroup=polarization,  # Group with the same polarization traces
-            showlegend=True,  # Show the legend entry
-            visible=True,  # Initially visible
-        ))
-
         # Customize the x-axis 
         if self.use_XY is True:  # Use X and Y directions for the x-axis
             relevant_k_points = self.get_XY_k_points_near_gamma()
@@ -481,7 +1905,7 @@ class PhotonicCrystal:
                 title=title,
                 xaxis=dict(
                     tickmode='array',
-                    tickvals=[i * (len(freqs) - 3) / 2 + i for i in range(3)],
+                    tickvals=corner_xs,
                     ticktext=list(relevant_k_points.keys())  # Only three values, no repetition
                 ),
                 yaxis_title='frequency (c/a)',
@@ -501,7 +1925,7 @@ class PhotonicCrystal:
                 title=title,
                 xaxis=dict(
                     tickmode='array',
-                    tickvals=[i * (len(freqs) - 4) / 3 + i for i in range(4)],
+                    tickvals=corner_xs,
                     ticktext=list(relevant_k_points.keys()) + [list(relevant_k_points.keys())[0]]  # Repeat the first element at the end
                 ),
                 yaxis_title='frequency (c/a)',
@@ -517,6 +1941,34 @@ class PhotonicCrystal:
         return fig
     
 
+    def _group_velocity_matrix(self, polarization, k_points, num_bands) -> np.ndarray:
+        """
+        Collect the group velocities stored in the modes of a polarization, for each k-point and band.
+        The modes of each k-point are found with the mode index (see build_mode_index()), not by scanning the modes.
+
+        Args:
+            polarization (str): The polarization.
+            k_points (np.ndarray): The k-points, with shape (number of k-points, 3).
+            num_bands (int): The number of bands.
+
+        Returns:
+            np.ndarray: The group velocities, with shape (number of k-points, number of bands, 3). 
+                NaN where no mode with a group velocity is stored.
+        """
+        velocities = np.full((len(k_points), num_bands, 3), np.nan)
+        index = self._get_mode_index().get(polarization)
+        if index is None or len(k_points) == 0:
+            return velocities
+        # The modes at each k-point, from the k-tree of the mode index. Repeated k-points (e.g. Gamma at both 
+        # ends of the path) get the same modes; if a band is stored twice, the last stored mode is used.
+        for i, matches in enumerate(index["k_tree"].query_ball_point(k_points, r=self.K_POINT_TOLERANCE)):
+            matches = np.sort(np.asarray(matches, dtype=int))
+            bands = index["bands"][matches]
+            group_velocities = index["group_velocities"][matches]
+            keep = (bands <= num_bands) & ~np.isnan(group_velocities[:, 0])
+            velocities[i, bands[keep] - 1] = group_velocities[keep]
+        return velocities
+
     def get_XY_k_points_near_gamma(self, distance = 0.1) -> dict:
         """
         Get the relevant k-points near the gamma point for the X and Y directions.
@@ -638,9 +2090,79 @@ class PhotonicCrystal:
 
 
 
+    def build_mode_index(self):
+        """
+        Build the index of the stored modes used by look_for_mode(). 
+        It is built at the end of each run and rebuilt automatically if the modes list changes size.
+        For each polarization it stores:
+
+        - the positions of the modes in self.modes,
+        - the k-points as an (N, 3) array, with a KD-tree for nearest k-point queries,
+        - the frequencies, sorted, for tolerance windows,
+        - the bands and the group velocities (NaN if not stored), for plot_bands().
+        """
+        positions = defaultdict(list)
+        for i, mode in enumerate(self.modes):
+            positions[mode["polarization"]].append(i)
+
+        index = {}
+        for polarization, mode_positions in positions.items():
+            k_points = np.array([self._k_point_to_array(self.modes[i]["k_point"]) for i in mode_positions])
+            freqs = np.array([self.modes[i]["freq"] for i in mode_positions], dtype=float)
+            freq_order = np.argsort(freqs, kind="stable")
+            group_velocities = np.full((len(mode_positions), 3), np.nan)
+            for row, i in enumerate(mode_positions):
+                if "group_velocity" in self.modes[i]:
+                    group_velocities[row] = self.modes[i]["group_velocity"]
+            index[polarization] = {
+                "positions": np.array(mode_positions),
+                "k_points": k_points,
+                "freqs": freqs,
+                "freq_order": freq_order,
+                "sorted_freqs": freqs[freq_order],
+                "k_tree": cKDTree(k_points),
+                "bands": np.array([self.modes[i]["band"] for i in mode_positions], dtype=int),
+                "group_velocities": group_velocities,
+            }
+        self._mode_index = {
+            "modes_id": id(self.modes),
+            "num_modes": len(self.modes),
+            "polarizations": index,
+        }
+
+    def _get_mode_index(self) -> dict:
+        """
+        Get the index of the stored modes, rebuilding it if the modes changed since it was built.
+
+        Returns:
+            dict: The index for each polarization, see build_mode_index().
+        """
+        if (self._mode_index is None 
+                or self._mode_index["modes_id"] != id(self.modes) 
+                or self._mode_index["num_modes"] != len(self.modes)):
+            self.build_mode_index()
+        return self._mode_index["polarizations"]
+
+    @staticmethod
+    def _k_point_to_array(k_point) -> np.ndarray:
+        """
+        Convert a k-point (mp.Vector3, tuple or list) to a numpy array with 3 components.
+
+        Args:
+            k_point (mp.Vector3 | tuple | list): The k-point.
+
+        Returns:
+            np.ndarray: The k-point as an array of shape (3,).
+        """
+        if isinstance(k_point, mp.Vector3):
+            return np.array([k_point.x, k_point.y, k_point.z], dtype=float)
+        k_point = np.asarray(k_point, dtype=float).ravel()
+        return np.pad(k_point, (0, 3 - len(k_point)))
+
     def look_for_mode(self, polarization, k_point, freq,  freq_tolerance=0.01, k_point_max_distance = None):
         """
         Look for modes within the specified criteria.
+        It uses the mode index (see build_mode_index()), so the cost is logarithmic in the number of stored modes.
 
         Args:
             polarization (str): The polarization of the mode.
@@ -653,16 +2175,22 @@ class PhotonicCrystal:
             list: A list of mode dictionaries that match the criteria.
         """
 
-        target_modes = []
-        if k_point_max_distance is None:
-            for mode in self.modes:
-                if mode["polarization"] == polarization and mode["k_point"] == k_point and abs(mode["freq"] - freq) <= freq_tolerance:
-                    target_modes.append(mode)
-        else:
-            for mode in self.modes:
-                if mode["polarization"] == polarization and np.linalg.norm(np.array(mode["k_point"]) - np.array(k_point)) <= k_point_max_distance and abs(mode["freq"] - freq) <= freq_tolerance:
-                    target_modes.append(mode)
-        return target_modes
+        index = self._get_mode_index().get(polarization)
+        if index is None:
+            return []
+
+        # modes within the frequency window
+        start = np.searchsorted(index["sorted_freqs"], freq - freq_tolerance, side="left")
+        stop = np.searchsorted(index["sorted_freqs"], freq + freq_tolerance, side="right")
+        in_window = index["freq_order"][start:stop]
+
+        # modes close enough to the k-point
+        distance = self.K_POINT_TOLERANCE if k_point_max_distance is None else k_point_max_distance
+        near_k = np.asarray(index["k_tree"].query_ball_point(self._k_point_to_array(k_point), r=distance), dtype=int)
+
+        matches = np.intersect1d(in_window, near_k)
+        matches = matches[np.abs(index["freqs"][matches] - freq) <= freq_tolerance]
+        return [self.modes[i] for i in np.sort(index["positions"][matches])]
         
     
 
@@ -690,6 +2218,7 @@ class PhotonicCrystal:
         
         colorscales = ["blues", "reds", "greens", "purples", "oranges", "ylorbr"]
         
+        modes = [self.get_mode_fields(mode) for mode in modes]
         h_fields = [mode["h_field"] for mode in modes]
         e_fields = [mode["e_field"] for mode in modes]
 
@@ -756,6 +2285,7 @@ class PhotonicCrystal:
         Returns:
             tuple: A tuple containing the Plotly figures for the electric and magnetic fields.
         """
+        mode = self.get_mode_fields(mode)
         fields = [mode["e_field"], mode["h_field"]]
         fields_norm_to_k = self._calculate_field_norm_to_k(fields, k)
         fig_e = go.Figure()
@@ -950,67 +2480,816 @@ class PhotonicCrystal:
         """
         raise NotImplementedError("calculate_effective_parameter method not implemented yet.")  
 
-    def sweep_geometry_parameter(self, param_to_sweep: str, sweep_values: list, num_bands: int =4)-> list:
+    def sweep_geometry_parameter(self, param_to_sweep: str, sweep_values: list, num_bands: int =4, cache=None, 
+                                 warm_start=False, target_freq=None, checkpoint=None, mode_storage="fields")-> list:
         
         """
         Sweep a parameter of the geometry and run simulations for each value.
+        Deprecated: use run_geometry_sweep(), which returns a SweepResult with the frequencies as arrays 
+        and keeps the modes only if asked to.
+
+        Args:
+            param_to_sweep (str): The parameter to sweep.
+            sweep_values (list): The values to sweep.
+            num_bands (int, optional): The number of bands to calculate. Defaults to 4.
+            cache, warm_start, target_freq, checkpoint: See run_geometry_sweep().
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'fields'. 
+                'frequencies' is not allowed, since the steps hold the modes.
+
+        Returns:
+            list: A list of dictionaries with the simulation data, one per value, with the keys 'parameter_name', 
+                'parameter_value', 'modes_zeven' and 'modes_zodd', see SweepResult.to_steps().
+
+        Raises:
+            ValueError: If mode_storage is 'frequencies'.
+        """
+        warnings.warn("sweep_geometry_parameter() is deprecated, use run_geometry_sweep(), which returns a SweepResult.",
+                      DeprecationWarning, stacklevel=2)
+        if mode_storage == "frequencies":
+            raise ValueError("The steps of sweep_geometry_parameter() hold the modes, use run_geometry_sweep() "
+                             "to keep only the frequencies.")
+        result = self.run_geometry_sweep(param_to_sweep, sweep_values, num_bands, cache=cache, warm_start=warm_start, 
+                                         target_freq=target_freq, checkpoint=checkpoint, mode_storage=mode_storage)
+        return result.to_steps()
+
+    def run_geometry_sweep(self, param_to_sweep: str, sweep_values: list, num_bands: int =4, cache=None, 
+                           warm_start=False, target_freq=None, checkpoint=None, 
+                           mode_storage="frequencies", cold_reference=False)-> SweepResult:
+        
+        """
+        Sweep a parameter of the geometry and run simulations for each value, at Gamma.
+        It replaces sweep_geometry_parameter(), which returned a list of step dictionaries with the modes.
         
         Args:
             param_to_sweep (str): The parameter to sweep.
             sweep_values (list): The values to sweep.
             num_bands (int, optional): The number of bands to calculate. Defaults to 4.
+            cache (ResultCache | bool, optional): The on-disk result cache, see run_simulation(). Default is None.
+                Values already simulated are loaded from the cache.
+            warm_start (bool, optional): Seed each step with the converged eigenvectors of the previous step. 
+                Default is False. The first solved step is cold. The eigensolver iterations of each step, the iterations 
+                of a cold solve of the step and the iterations saved are stored in the iterations of the result 
+                and printed.
+            target_freq (float, optional): Find the num_bands bands closest to this frequency at each step, 
+                instead of the lowest ones, see set_solver(). Default is None.
+            checkpoint (bool | str, optional): Append each step to a checkpoint file as soon as it is solved, 
+                see _get_sweep_checkpoint(). A sweep restarted with the same specification skips the values already 
+                in the file. The file is removed when the sweep completes. Default is None, which does not 
+                checkpoint the sweep.
+            mode_storage (str, optional): What is stored for each mode, see run_simulation(). Default is 'frequencies', 
+                which keeps only the frequency arrays. With 'fields' or 'eigenvectors' the mode dictionaries are 
+                also kept, out of the frequency arrays, in the modes of the result.
+            cold_reference (bool, optional): With warm_start, solve each seeded step cold too, to measure the iterations 
+                it saves, see _run_warm_started(). Default is False, which takes the iterations of the first 
+                solved step, which is cold, as the cold baseline of every step.
         
         Returns:
-            list: A list of dictionaries with the simulation data.
+            SweepResult: The frequencies at Gamma of the 'zeven' and 'zodd' polarizations, with dimensions 
+                (param_to_sweep, 'k_point', 'band'), see crystal_sweeps.SweepResult.
+                With warm_start, the iterations of the result have, for each runner, the arrays over the sweep 
+                'iterations', 'cold_iterations' (the cold baseline), 'cold_measured' (whether the baseline was 
+                solved at the step itself, or taken from the first solved step) and 'saved' (cold_iterations minus 
+                iterations). Steps loaded from the cache are NaN.
 
         """
+        runners = {"zeven": "run_zeven", "zodd": "run_zodd"}
         data = []
         old_geom  = self.geometry
         old_num_bands = self.num_bands
+        old_target_freq = self.target_freq
 
         partial_geom = self.geometry.to_partial(exclude_key=param_to_sweep)
-        for value in sweep_values:
-            kwargs = {param_to_sweep: value}
-            self.geometry = partial_geom(**kwargs)
-            self.num_bands = num_bands
-            self.set_solver(k_point=mp.Vector3())
-            modes_zeven = self.run_simulation_with_output(runner="run_zeven", polarization="zeven")
-            modes_zodd  = self.run_simulation_with_output(runner="run_zodd", polarization="zodd")
-            data.append({
-                'parameter_value': value,
-                'modes_zeven': modes_zeven,
-                'modes_zodd': modes_zodd,
-                'parameter_name': param_to_sweep,
-            })
-        self.geometry = old_geom
-        self.num_bands = old_num_bands
-        return data
+        cache = self._get_result_cache(cache)
+        # The key keeps the former name of the method, so that existing checkpoints are still found
+        checkpoint = self._get_sweep_checkpoint(checkpoint, "sweep_geometry_parameter", param_to_sweep, 
+                                                list(sweep_values), num_bands, target_freq, mode_storage)
+        if checkpoint is not None and len(checkpoint) > 0:
+            print(f"Sweep checkpoint {checkpoint.path}: {len(checkpoint)} of {len(sweep_values)} values already solved.")
+        if warm_start:
+            # The first step is solved cold
+            self._warm_start = {}
+        try:
+            for i, value in enumerate(sweep_values):
+                if checkpoint is not None and i in checkpoint:
+                    data.append(checkpoint.results[i])
+                    continue
+                kwargs = {param_to_sweep: value}
+                self.geometry = partial_geom(**kwargs)
+                self.num_bands = num_bands
+                self.set_solver(k_point=mp.Vector3(), target_freq=target_freq)
+                step = {'freqs': {}, 'modes': {}, 'iterations': {}}
+                for polarization, runner in runners.items():
+                    # Steps loaded from the cache are not solved and do not report any iterations
+                    self.solver_iterations.pop(runner, None)
+                    modes = self.run_simulation_with_output(runner=runner, polarization=polarization, cache=cache, 
+                                                            warm_start=warm_start, mode_storage=mode_storage, 
+                                                            cold_reference=cold_reference)
+                    step['freqs'][polarization] = np.array([mode["freq"] for mode in modes])
+                    if mode_storage != "frequencies":
+                        step['modes'][polarization] = modes
+                    iterations = self.solver_iterations.get(runner)
+                    if warm_start and iterations is not None:
+                        cold_iterations = iterations["cold_iterations"]
+                        step['iterations'][runner] = {
+                            "iterations": sum(iterations["iterations"]),
+                            "cold_iterations": sum(cold_iterations) if cold_iterations is not None else None,
+                            "warm": iterations["warm"],
+                        }
+                data.append(step)
+                if checkpoint is not None:
+                    checkpoint.append(i, step)
+            if checkpoint is not None:
+                # The sweep is complete, a new sweep with the same specification must not reuse its steps
+                checkpoint.remove()
+        finally:
+            # An interrupted sweep leaves the crystal as it was, so that it is resumed with the same checkpoint
+            self.geometry = old_geom
+            self.num_bands = old_num_bands
+            self.target_freq = old_target_freq
+
+        freqs = {
+            polarization: np.array([step['freqs'][polarization] for step in data])[:, np.newaxis, :]
+            for polarization in runners
+        }
+        modes = None
+        if mode_storage != "frequencies":
+            modes = {polarization: [step['modes'][polarization] for step in data] for polarization in runners}
+        iterations = None
+        if warm_start:
+            iterations = {runner: self._sweep_iterations([step['iterations'].get(runner) for step in data]) 
+                          for runner in runners.values()}
+            for runner, runner_iterations in iterations.items():
+                counts = [None if np.isnan(n) else int(n) for n in runner_iterations["iterations"]]
+                saved = runner_iterations["saved"]
+                print(f"Warm start, {runner}: eigensolver iterations per step {counts}, "
+                      f"{int(np.nansum(saved))} iterations saved with respect to cold solves.")
+        return SweepResult({param_to_sweep: sweep_values}, True, [mp.Vector3()], freqs, modes=modes, 
+                           iterations=iterations)
      
 
 
-    def plot_sweep_result(self, data, fig=None) -> go.Figure:
+    @staticmethod
+    def _sweep_iterations(steps) -> dict:
         """
-        Plot the sweep result using Plotly.
+        Collect the eigensolver iterations of the steps of a warm-started sweep, see run_geometry_sweep().
+        The cold baseline of a seeded step without a reference solve is the first step solved cold.
 
         Args:
-            data (list): The data from the sweep.
+            steps (list): For each step, None if it was not solved, otherwise a dictionary with the total 
+                'iterations', the total 'cold_iterations' (None if not measured) and whether the step was 'warm'.
+                Steps of checkpoints written before the cold iterations were recorded hold a number, they are skipped.
+
+        Returns:
+            dict: The arrays 'iterations', 'cold_iterations', 'cold_measured' and 'saved', with one value per step.
+        """
+        steps = [step if isinstance(step, dict) else None for step in steps]
+        first_cold = next((step["iterations"] for step in steps if step is not None and not step["warm"]), np.nan)
+        iterations = np.full(len(steps), np.nan)
+        cold_iterations = np.full(len(steps), np.nan)
+        cold_measured = np.zeros(len(steps), dtype=bool)
+        for i, step in enumerate(steps):
+            if step is None:
+                continue
+            iterations[i] = step["iterations"]
+            cold_measured[i] = step["cold_iterations"] is not None
+            cold_iterations[i] = step["cold_iterations"] if cold_measured[i] else first_cold
+        return {
+            "iterations": iterations,
+            "cold_iterations": cold_iterations,
+            "cold_measured": cold_measured,
+            "saved": cold_iterations - iterations,
+        }
+
+    def with_parameters(self, **parameters) -> 'PhotonicCrystal':
+        """
+        Create a copy of the crystal with some parameters changed. The crystal itself is not modified.
+        The copy is lightweight, see _worker_copy(): it has no solver, modes or results.
+
+        Each parameter is routed by its name:
+
+        - SOLVER_PARAMETERS ('num_bands', 'resolution', 'target_freq') are set on the crystal.
+        - LATTICE_PARAMETERS ('lattice_type', and 'height_supercell' for slabs) rebuild the lattice with basic_lattice().
+        - Material parameters, named '<key>_<component>' such as 'epsilon_bulk', 'epsilon_atom' or 'epsilon_diag_bulk', 
+            rebuild the materials of the geometry, see Crystal_Materials.with_parameters().
+        - Any other parameter is an argument of the geometry, such as 'r', 'a', 'b' or 'height_slab'.
+            'height_supercell' is also passed to the geometry if it is one of its arguments.
+
+        Args:
+            **parameters: The new values of the parameters.
+
+        Returns:
+            PhotonicCrystal: The new crystal.
+
+        Raises:
+            ValueError: If a parameter is not valid for the geometry.
+        """
+        crystal = self._worker_copy()
+        geometry_parameters = {}
+        lattice_parameters = {}
+        material_parameters = {}
+        for name, value in parameters.items():
+            if name in self.SOLVER_PARAMETERS:
+                setattr(crystal, name, value)
+                continue
+            if name in self.LATTICE_PARAMETERS:
+                lattice_parameters[name] = value
+                if name not in self.geometry.arguments:
+                    continue
+            if Crystal_Materials.parse_parameter(name) is not None:
+                material_parameters[name] = value
+            else:
+                geometry_parameters[name] = value
+
+        if material_parameters or geometry_parameters:
+            arguments = {**self.geometry.arguments, **geometry_parameters}
+            if material_parameters:
+                arguments["material"] = self.geometry.material.with_parameters(**material_parameters)
+                if self.material is self.geometry.material:
+                    crystal.material = arguments["material"]
+            try:
+                crystal.geometry = self.geometry.__class__(**arguments)
+            except TypeError as e:
+                raise ValueError(f"Invalid parameters {list(geometry_parameters)} for "
+                                 f"{self.geometry.__class__.__name__}: {e}") from e
+
+        if lattice_parameters:
+            lattice_arguments = {**self._lattice_arguments(), **lattice_parameters}
+            crystal.lattice_type = lattice_arguments["lattice_type"]
+            crystal.geometry_lattice, k_points = crystal.basic_lattice(**lattice_arguments)
+            if not crystal.use_XY:
+                crystal.k_points = k_points
+                crystal.k_points_interpolated = mp.interpolate(crystal.interp, k_points)
+        return crystal
+
+    def _lattice_arguments(self) -> dict:
+        """
+        Get the arguments of basic_lattice() that build the current lattice, see with_parameters().
+
+        Returns:
+            dict: The arguments, by name.
+        """
+        return {"lattice_type": self.lattice_type}
+
+    def _get_sweep_checkpoint(self, checkpoint, *specification):
+        """
+        Get the checkpoint of a sweep from the checkpoint argument of the sweep methods.
+        The checkpoint file is keyed by the configuration hash of the crystal (geometry, lattice, resolution, 
+        number of bands and target frequency) and of the specification of the sweep. 
+        It lives only until the sweep completes: the sweep methods remove it once every point is solved.
+
+        Args:
+            checkpoint (bool | str | None): The checkpoint argument. True uses the default directory of 
+                SweepCheckpoint, a string is the directory of the checkpoint files.
+            *specification: The other objects that identify the sweep, such as the swept values and the runners.
+
+        Returns:
+            SweepCheckpoint: The checkpoint, or None if the sweep must not be checkpointed.
+        """
+        if checkpoint is None or checkpoint is False:
+            return None
+        key = configuration_hash(self.geometry.to_list(), self.geometry_lattice, self.resolution, self.num_bands, 
+                                 self.target_freq, *specification)
+        if checkpoint is True:
+            return SweepCheckpoint(key)
+        if isinstance(checkpoint, str):
+            return SweepCheckpoint(key, directory=checkpoint)
+        raise ValueError(f"Invalid checkpoint: {checkpoint}. Use None, True or a directory.")
+
+    def run_sweep(self, parameters, grid=True, runners=("run_zeven", "run_zodd"), polarizations=None, k_points=None, 
+                  num_workers=None, checkpoint=None) -> SweepResult:
+        """
+        Sweep any number of geometry, material, lattice and solver parameters at once, for example 
+        `r` x `height_slab` x `epsilon_bulk`. The parameters are applied with with_parameters() and each point 
+        of the sweep is solved in a worker process. Only the frequencies are kept.
+
+        Example:
+            ```python
+            result = crystal.run_sweep({"r": [0.2, 0.25, 0.3], "epsilon_bulk": [4.5, 5.0]}, num_workers=4)
+            result.sel("zeven", r=0.25)   # Frequencies over epsilon_bulk, k-points and bands
+            ```
+
+        Args:
+            parameters (dict): The values of each parameter, by parameter name, see with_parameters().
+            grid (bool, optional): If True (default), sweep the Cartesian product of the values. If False, the values 
+                of all the parameters have the same length and are swept together as an explicit list of points.
+            runners (tuple, optional): The MPB runners solved at every point. Default is ('run_zeven', 'run_zodd').
+            polarizations (list, optional): The polarization name of each runner. Default is None, which uses the 
+                runner names.
+            k_points (list, optional): The k-points solved at every point. Default is None, which solves Gamma only.
+            num_workers (int, optional): The number of worker processes. Default is None, which uses all 
+                available CPUs. With 1, the points are solved serially in this process. Otherwise the points are 
+                scheduled largest first by their estimated cost (see estimate_cost()) and the progress is printed 
+                with an estimated time left.
+            checkpoint (bool | str, optional): Write each point to an append-only checkpoint file as soon as it is 
+                solved, see _get_sweep_checkpoint(). A sweep restarted with the same specification skips the points 
+                already in the file. The file is removed when the sweep completes. Default is None, which does not 
+                checkpoint the sweep.
+
+        Returns:
+            SweepResult: The frequencies of each polarization, as a labelled array with dimensions 
+                (*sweep dimensions, 'k_point', 'band').
+        """
+        points, shape = sweep_points(parameters, grid)
+        if k_points is None:
+            k_points = [mp.Vector3()]
+        if polarizations is None:
+            polarizations = [runner[4:] if runner.startswith("run_") else runner for runner in runners]
+        if len(polarizations) != len(runners):
+            raise ValueError("There must be one polarization per runner.")
+
+        kwargs = {"k_points": k_points, "runners": list(runners)}
+        results = [None] * len(points)
+        to_solve = list(range(len(points)))
+        checkpoint = self._get_sweep_checkpoint(checkpoint, "run_sweep", parameters, grid, kwargs)
+        if checkpoint is not None:
+            for i, result in checkpoint.results.items():
+                results[i] = result
+            to_solve = [i for i in to_solve if i not in checkpoint]
+            print(f"Sweep checkpoint {checkpoint.path}: {len(points) - len(to_solve)} of {len(points)} points "
+                  "already solved.")
+
+        def store(j, result):
+            results[to_solve[j]] = result
+            if checkpoint is not None:
+                checkpoint.append(to_solve[j], result)
+
+        # Parameters are applied here, so that invalid ones fail before any solve
+        crystals = [self.with_parameters(**points[i]) for i in to_solve]
+        costs = [crystal.estimate_cost(len(k_points)) * len(runners) for crystal in crystals]
+        print(f"Sweep: {len(to_solve)} points, {len(runners)} runners, {len(k_points)} k-points.")
+        if num_workers == 1 or len(crystals) <= 1:
+            tracker = ProgressTracker(costs, label="Sweep")
+            for j, crystal in enumerate(crystals):
+                store(j, crystal._solve_sweep_point(**kwargs))
+                tracker.update(costs[j])
+        else:
+            # The most expensive points are started first, see run_in_pool()
+            run_in_pool([(crystal, "_solve_sweep_point", kwargs) for crystal in crystals], 
+                        num_workers=num_workers, callback=store, costs=costs, progress=True)
+        if checkpoint is not None:
+            # The sweep is complete, a new sweep with the same specification must not reuse its points
+            checkpoint.remove()
+
+        num_bands = max(freqs.shape[1] for result in results for freqs in result)
+        sweep_freqs = {}
+        for i, polarization in enumerate(polarizations):
+            freqs = np.full((len(points), len(k_points), num_bands), np.nan)
+            for j, result in enumerate(results):
+                freqs[j, :, :result[i].shape[1]] = result[i]
+            sweep_freqs[polarization] = freqs.reshape(shape + (len(k_points), num_bands))
+        return SweepResult(parameters, grid, k_points, sweep_freqs)
+
+    def run_perturbative_sweep(self, param, values, polarizations=None, tolerance=1e-3) -> SweepResult:
+        """
+        Sweep a material parameter, such as 'epsilon_bulk' or 'epsilon_diag_bulk', predicting the frequencies of 
+        the modes stored in `modes` with first-order perturbation theory instead of solving them.
+        A change of the parameter changes the epsilon grid by Δε, and the frequency of each mode shifts by
+
+            Δω/ω ≈ -½ ∫Δε|E|² / ∫ε|E|²
+
+        where E is the electric field of the mode. The epsilon grids are computed without any eigensolve 
+        (see get_epsilon_and_lattice()). The error of the prediction is estimated with the second-order term of 
+        a uniform change of epsilon, for which ω ∝ ε^(-1/2): 3/2 (Δω/ω)² ω. 
+        When the estimated error of any mode exceeds the tolerance, the k-points of the modes are solved again 
+        at that value, which becomes the reference for the next values.
+
+        The perturbation uses the scalar epsilon grid of MPB, so for anisotropic materials the prediction 
+        is first-order exact only when all the diagonal components change by the same amount.
+        Modes stored without fields get them from get_mode_fields(), which solves their k-point once.
+
+        Args:
+            param (str): The material parameter, see Crystal_Materials.parse_parameter().
+            values (list): The values of the parameter. They are best ordered, e.g. increasing, 
+                so that each value is close to the previous reference.
+            polarizations (list, optional): The polarizations of the modes to perturb. Default is None, 
+                which perturbs all the stored modes.
+            tolerance (float, optional): The maximum estimated error of a frequency, in c/a, before solving again. 
+                Default is 1e-3.
+
+        Returns:
+            SweepResult: The frequencies of each polarization, with dimensions (param, 'k_point', 'band'), 
+                and their estimated errors (zero where the value was solved).
+
+        Raises:
+            ValueError: If param is not a material parameter or no modes are stored.
+        """
+        if Crystal_Materials.parse_parameter(param) is None:
+            raise ValueError(f"{param} is not a material parameter, see Crystal_Materials.parse_parameter().")
+        modes = [mode for mode in self.modes if polarizations is None or mode["polarization"] in polarizations]
+        if not modes:
+            raise ValueError("No modes to perturb. Run a simulation first.")
+
+        k_indices = {}
+        for mode in modes:
+            key = tuple(np.round(self._k_point_to_array(mode["k_point"]), 8) + 0.0)
+            k_indices.setdefault(key, (len(k_indices), mode["k_point"]))
+        polarizations = list(dict.fromkeys(mode["polarization"] for mode in modes))
+        num_bands = max(mode["band"] for mode in modes)
+        shape = (len(values), len(k_indices), num_bands)
+        freqs = {polarization: np.full(shape, np.nan) for polarization in polarizations}
+        errors = {polarization: np.full(shape, np.nan) for polarization in polarizations}
+
+        epsilon, weights, reference_freqs = self._perturbation_reference(modes)
+        num_solves = 0
+        for i, value in enumerate(values):
+            crystal = self.with_parameters(**{param: value})
+            delta_epsilon = np.ravel(crystal.get_epsilon_and_lattice()[0]) - epsilon
+            shifts = -0.5 * (weights @ delta_epsilon)
+            predicted = reference_freqs * (1 + shifts)
+            error = 1.5 * shifts**2 * reference_freqs
+            if np.max(error) > tolerance:
+                modes = crystal._solve_perturbation_reference(modes)
+                epsilon, weights, reference_freqs = crystal._perturbation_reference(modes)
+                predicted = reference_freqs
+                error = np.zeros_like(reference_freqs)
+                num_solves += 1
+            for mode, freq, mode_error in zip(modes, predicted, error):
+                if mode["band"] > num_bands:
+                    continue
+                key = tuple(np.round(self._k_point_to_array(mode["k_point"]), 8) + 0.0)
+                index = (i, k_indices[key][0], mode["band"] - 1)
+                freqs[mode["polarization"]][index] = freq
+                errors[mode["polarization"]][index] = mode_error
+        print(f"Perturbative sweep: {len(values)} values of {param}, {num_solves} solved.")
+        k_points = [k_point for _, k_point in k_indices.values()]
+        return SweepResult({param: values}, True, k_points, freqs, errors=errors)
+
+    def _perturbation_reference(self, modes) -> tuple:
+        """
+        Get what run_perturbative_sweep() needs to perturb modes of this crystal.
+
+        Args:
+            modes (list): The mode dictionaries.
+
+        Returns:
+            tuple: A tuple containing the flattened epsilon grid, the weights |E|²/∫ε|E|² of each mode 
+                with shape (number of modes, number of grid points), and the frequencies of the modes.
+
+        Raises:
+            ValueError: If the fields of the modes do not match the epsilon grid.
+        """
+        epsilon = np.ravel(self.get_epsilon_and_lattice()[0])
+        weights = np.empty((len(modes), epsilon.size))
+        for i, mode in enumerate(modes):
+            e_field = self.get_mode_fields(mode)["e_field"]
+            intensity = np.ravel(np.sum(np.abs(e_field)**2, axis=-1))
+            if intensity.size != epsilon.size:
+                raise ValueError("The fields of the modes do not match the epsilon grid of the crystal. "
+                                 "Were they computed with another resolution?")
+            weights[i] = intensity / np.dot(epsilon, intensity)
+        return epsilon, weights, np.array([mode["freq"] for mode in modes])
+
+    def _solve_perturbation_reference(self, modes) -> list:
+        """
+        Solve again the k-points of some modes, with their runners, to get a new reference for run_perturbative_sweep().
+
+        Args:
+            modes (list): The mode dictionaries of the previous reference.
+
+        Returns:
+            list: The new mode dictionaries, with fields.
+        """
+        self.modes = []
+        groups = defaultdict(dict)
+        for mode in modes:
+            key = tuple(np.round(self._k_point_to_array(mode["k_point"]), 8) + 0.0)
+            groups[(mode.get("runner", "run"), mode["polarization"])].setdefault(key, mode["k_point"])
+        for (runner, polarization), k_points in groups.items():
+            self._solve_k_point_list(list(k_points.values()), runner, polarization, mode_storage="fields")
+        return self.modes
+
+    def compute_sensitivities(self, params, modes=None, step=None) -> dict:
+        """
+        Compute the derivatives dω/dp of the frequencies of the modes with respect to geometry parameters, 
+        such as 'r', 'a', 'b' or 'height_slab', from the fields already stored in the modes: no eigensolve is needed.
+        It uses the boundary-perturbation formula for a displaced interface between two materials,
+
+            dω/dp = -ω/2 ∫ [dε/dp |E_∥|² - d(1/ε)/dp |D_⊥|²] / ∫ε|E|²
+
+        where E_∥ and D_⊥ are the components of the fields parallel and normal to the interface. 
+        dε/dp and d(1/ε)/dp are central finite differences of the epsilon grids of the crystal with the parameter 
+        moved by ±step (computed without any eigensolve, see get_epsilon_and_lattice()), so they are localized on 
+        the interfaces moved by the parameter. The normal of the interfaces is along the gradient of the epsilon grid.
+        Away from the interfaces the normal is undefined and the formula reduces to the material perturbation 
+        of run_perturbative_sweep(), so material parameters such as 'epsilon_bulk' are also accepted.
+        The accuracy is limited by the resolution of the epsilon grid at the interfaces.
+
+        Example:
+            ```python
+            sensitivities = crystal.compute_sensitivities(["r", "height_slab"])
+            sensitivities["r"][0]   # dω/dr of crystal.modes[0], in (c/a) per unit of a
+            ```
+
+        Args:
+            params (str | list): The geometry (or material) parameters.
+            modes (list, optional): The mode dictionaries. Default is None, which uses all the stored modes.
+                Modes stored without fields get them from get_mode_fields(), which solves their k-point once.
+            step (float, optional): The finite-difference step of the parameters. Default is None, 
+                which uses a quarter of the grid spacing.
+
+        Returns:
+            dict: The derivatives of the frequencies of the modes, by parameter, as arrays in the order of modes.
+
+        Raises:
+            ValueError: If a parameter is a lattice or solver parameter, or has a non-scalar value.
+        """
+        if isinstance(params, str):
+            params = [params]
+        if modes is None:
+            modes = self.modes
+        if step is None:
+            step = 0.25 / self._resolution_scale(self.resolution)
+
+        epsilon = self.get_epsilon_and_lattice()[0]
+        lattice_vectors = self._grid_lattice_vectors(epsilon.ndim)
+        normals = self._epsilon_normals(epsilon, lattice_vectors)
+        fields = [self.get_mode_fields(mode)["e_field"] for mode in modes]
+
+        sensitivities = {}
+        for param in params:
+            if param in self.LATTICE_PARAMETERS or param in self.SOLVER_PARAMETERS:
+                raise ValueError(f"{param} changes the grid of the crystal, its sensitivity cannot be computed.")
+            value = self._parameter_value(param)
+            epsilon_plus = self.with_parameters(**{param: value + step}).get_epsilon_and_lattice()[0]
+            epsilon_minus = self.with_parameters(**{param: value - step}).get_epsilon_and_lattice()[0]
+            d_epsilon = (epsilon_plus - epsilon_minus) / (2 * step)
+            d_inverse_epsilon = (1 / epsilon_plus - 1 / epsilon_minus) / (2 * step)
+
+            derivatives = np.empty(len(modes))
+            for i, (mode, e_field) in enumerate(zip(modes, fields)):
+                e_field = np.reshape(e_field, epsilon.shape + (3,))
+                intensity = np.sum(np.abs(e_field)**2, axis=-1)
+                normal_intensity = np.abs(np.sum(normals * e_field, axis=-1))**2
+                integrand = (d_epsilon * (intensity - normal_intensity) 
+                             - d_inverse_epsilon * epsilon**2 * normal_intensity)
+                derivatives[i] = -0.5 * mode["freq"] * np.sum(integrand) / np.sum(epsilon * intensity)
+            sensitivities[param] = derivatives
+        return sensitivities
+
+    def _parameter_value(self, param) -> float:
+        """
+        Get the current value of a geometry or material parameter, see with_parameters().
+        Geometry parameters that were not given to the geometry have the default value of its atomic function.
+
+        Args:
+            param (str): The parameter.
+
+        Returns:
+            float: The value.
+
+        Raises:
+            ValueError: If the parameter is unknown or its value is not a scalar.
+        """
+        parsed = Crystal_Materials.parse_parameter(param)
+        if parsed is not None:
+            key, component = parsed
+            value = self.geometry.material.configuration(component).get(key)
+        elif param in self.geometry.arguments:
+            value = self.geometry.arguments[param]
+        else:
+            signature = inspect.signature(self.geometry.atomic_function)
+            if param not in signature.parameters:
+                raise ValueError(f"Unknown parameter {param} of {self.geometry.__class__.__name__}.")
+            value = signature.parameters[param].default
+        if not isinstance(value, (int, float, np.number)):
+            raise ValueError(f"The value of {param} is not a scalar: {value}.")
+        return float(value)
+
+    def _grid_lattice_vectors(self, ndim) -> np.ndarray:
+        """
+        Get the Cartesian vectors spanned by the axes of the MPB grids (epsilon and fields) of the crystal.
+
+        Args:
+            ndim (int): The number of dimensions of the grids.
+
+        Returns:
+            np.ndarray: The vectors, with shape (ndim, 3). Row i is the lattice vector along axis i of the grids.
+        """
+        size = self.geometry_lattice.size
+        vectors = [mp.Vector3(x=size.x), mp.Vector3(y=size.y), mp.Vector3(z=size.z)]
+        return np.array([self._k_point_to_array(mp.lattice_to_cartesian(v, self.geometry_lattice)) 
+                         for v in vectors[:ndim]])
+
+    @staticmethod
+    def _epsilon_normals(epsilon, lattice_vectors) -> np.ndarray:
+        """
+        Get the unit normals of the interfaces of an epsilon grid, from its periodic central-difference gradient.
+        They point from the higher to the lower epsilon, i.e. out of high-epsilon rods and into air holes.
+
+        Args:
+            epsilon (np.ndarray): The epsilon grid.
+            lattice_vectors (np.ndarray): The Cartesian vectors spanned by the axes of the grid, with shape (ndim, 3).
+
+        Returns:
+            np.ndarray: The Cartesian unit normals, with shape epsilon.shape + (3,). They are zero where epsilon is uniform.
+        """
+        # Derivatives with respect to the fractional coordinates along each axis of the grid
+        gradient_fractional = np.stack([
+            (np.roll(epsilon, -1, axis=axis) - np.roll(epsilon, 1, axis=axis)) * epsilon.shape[axis] / 2
+            for axis in range(epsilon.ndim)
+        ], axis=-1)
+        # The fractional derivatives are the projections of the Cartesian gradient on the lattice vectors
+        gradient = gradient_fractional @ np.linalg.pinv(lattice_vectors).T
+        norm = np.linalg.norm(gradient, axis=-1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            normals = np.where(norm > 1e-8 * np.max(norm), -gradient / norm, 0.0)
+        return normals
+
+    def find_dirac_point(self, param, bracket, band, runner="run_zeven", k_point=None, tolerance=1e-4, max_solves=30, 
+                         degeneracy_tolerance=1e-6) -> dict:
+        """
+        Find the value of a geometry parameter where two bands cross at a k-point (Gamma by default), 
+        for example the radius of the accidental degeneracy of a Dirac-like cone.
+
+        The bands are sorted by frequency, so their difference never changes sign. To get a signed function, 
+        the modes of bands band and band + 1 at the start of the bracket are followed through the parameter values 
+        by their eigenvectors. Bands band + 2 and below are solved, so that the third band of a C4v Dirac-like cone 
+        at Gamma (a doublet crossing a singlet) is in the window. At each value:
+
+        - the bands are grouped into degenerate subspaces (frequencies closer than degeneracy_tolerance);
+        - each followed mode is assigned to the subspace with the largest projection of its reference eigenvector, 
+            and its reference is replaced by that (normalized) projection, so that it follows the mode as it changes;
+        - the signed difference is the distance from the first mode to the nearest other subspace, positive if 
+            the second mode is above the first one and negative if it is below. It is zero when the two modes 
+            are in the same degenerate subspace.
+
+        The root of the signed difference is found with Brent's method (bracketing, secant and inverse 
+        quadratic steps). The solver state is reused between the iterations: each solve starts from the 
+        eigenvectors of the previous one, see run_simulation(warm_start=True).
+
+        Args:
+            param (str): The geometry parameter, e.g. 'r'.
+            bracket (tuple): The parameter values (start, end) on the two sides of the crossing.
+            band (int): The lower band of the pair at the start of the bracket, starting from 1. 
+                The crossing is between the modes of band and band + 1 at the start of the bracket.
+            runner (str, optional): The name of the MPB runner, see run_simulation(). Default is 'run_zeven'.
+            k_point (mp.Vector3, optional): The k-point. Default is None, which uses Gamma.
+            tolerance (float, optional): The tolerance on the parameter value. Default is 1e-4.
+            max_solves (int, optional): The maximum number of solves. Default is 30.
+            degeneracy_tolerance (float, optional): Bands closer than this (c/a) form a degenerate subspace. 
+                Default is 1e-6.
+
+        Returns:
+            dict: A dictionary with:
+
+                - 'parameter_name' (str): The parameter.
+                - 'parameter_value' (float): The parameter value of the crossing.
+                - 'freq' (float): The mean frequency of the two modes at the crossing.
+                - 'splitting' (float): The frequency difference of the two modes at the crossing.
+                - 'num_solves' (int): The number of solves.
+                - 'history' (list): The (parameter value, frequency of the first mode, frequency of the second mode, 
+                    swapped) of each solve.
+
+        Raises:
+            ValueError: If the two modes do not swap between the two ends of the bracket.
+            RuntimeError: If the crossing is not found in max_solves solves, or the two modes cannot be told apart.
+        """
+        if k_point is None:
+            k_point = mp.Vector3()
+        old_geom = self.geometry
+        old_num_bands = self.num_bands
+        old_warm_start = self._warm_start
+        partial_geom = self.geometry.to_partial(exclude_key=param)
+
+        history = []
+        solved = {}
+        # The reference eigenvectors of the two followed modes
+        references = []
+
+        def signed_difference(value):
+            if value in solved:
+                return solved[value]
+            if len(history) >= max_solves:
+                raise RuntimeError(f"The crossing was not found in {max_solves} solves.")
+            self.geometry = partial_geom(**{param: value})
+            self.set_solver(k_point=k_point)
+            with suppress_output():
+                freqs = self._run_warm_started(runner)[0]
+            eigenvectors = self._warm_start[runner]["eigenvectors"][0]
+            if not references:
+                references.extend([eigenvectors[..., band - 1], eigenvectors[..., band]])
+
+            groups = self._degenerate_groups(freqs, degeneracy_tolerance)
+            group_freqs = np.array([np.mean(freqs[group]) for group in groups])
+            (first, references[0]), (second, references[1]) = [
+                self._follow_mode(reference, eigenvectors, groups) for reference in references
+            ]
+            if first == second and len(groups[first]) < 2:
+                raise RuntimeError(f"The modes of bands {band} and {band + 1} cannot be told apart at {param}={value}: "
+                                   "both follow the same non-degenerate band.")
+            freq_first, freq_second = group_freqs[first], group_freqs[second]
+            swapped = freq_second < freq_first
+            if first == second:
+                difference = 0.0
+            else:
+                distance = np.min(np.abs(np.delete(group_freqs, first) - freq_first))
+                difference = -distance if swapped else distance
+            history.append((value, freq_first, freq_second, swapped))
+            solved[value] = difference
+            return difference
+
+        self.num_bands = band + 2
+        self._warm_start = {}
+        try:
+            start, end = bracket
+            difference_start, difference_end = signed_difference(start), signed_difference(end)
+            if difference_start * difference_end > 0:
+                raise ValueError(f"The modes of bands {band} and {band + 1} do not swap between {param}={start} and "
+                                 f"{param}={end} (signed splitting {difference_start:.3g} and {difference_end:.3g}). "
+                                 "Widen the bracket or check the band.")
+            value = brentq(signed_difference, start, end, xtol=tolerance)
+            signed_difference(value)
+        finally:
+            self.geometry = old_geom
+            self.num_bands = old_num_bands
+            self._warm_start = old_warm_start
+
+        _, freq_first, freq_second, _ = next(solve for solve in history if solve[0] == value)
+        print(f"Dirac point: {param}={value:.6g}, frequency {(freq_first + freq_second) / 2:.6g}, {len(history)} solves.")
+        return {
+            "parameter_name": param,
+            "parameter_value": value,
+            "freq": (freq_first + freq_second) / 2,
+            "splitting": abs(freq_second - freq_first),
+            "num_solves": len(history),
+            "history": history,
+        }
+
+    @staticmethod
+    def _degenerate_groups(freqs, tolerance) -> list:
+        """
+        Group sorted frequencies into degenerate subspaces, see find_dirac_point().
+
+        Args:
+            freqs (np.ndarray): The frequencies of the bands, sorted.
+            tolerance (float): Consecutive bands closer than this are in the same subspace.
+
+        Returns:
+            list: The band indices (from 0) of each subspace, in order of frequency.
+        """
+        groups = [[0]]
+        for j in range(1, len(freqs)):
+            if freqs[j] - freqs[j - 1] < tolerance:
+                groups[-1].append(j)
+            else:
+                groups.append([j])
+        return groups
+
+    @staticmethod
+    def _follow_mode(reference, eigenvectors, groups) -> tuple:
+        """
+        Find the degenerate subspace a mode belongs to, from the projection of its reference eigenvector 
+        on the subspace of each group of bands, see find_dirac_point().
+
+        Args:
+            reference (np.ndarray): The reference eigenvector of the mode.
+            eigenvectors (np.ndarray): The orthonormal eigenvectors of the solve, with the bands along the last axis.
+            groups (list): The band indices of each degenerate subspace, see _degenerate_groups().
+
+        Returns:
+            tuple: The index of the group with the largest projection and the normalized projection, 
+                the reference to use at the next solve.
+        """
+        eigenvectors = np.asarray(eigenvectors)
+        eigenvectors = eigenvectors.reshape(-1, eigenvectors.shape[-1])
+        coefficients = eigenvectors.conj().T @ np.asarray(reference).reshape(-1)
+        weights = [np.sum(np.abs(coefficients[group])**2) for group in groups]
+        best = int(np.argmax(weights))
+        projection = eigenvectors[:, groups[best]] @ coefficients[groups[best]]
+        return best, projection / np.linalg.norm(projection)
+
+    def plot_sweep_result(self, data, fig=None, k_index=0) -> go.Figure:
+        """
+        Plot the sweep result using Plotly: the frequency of every band and polarization against the swept parameter.
+
+        Args:
+            data (SweepResult | list): The result of a sweep over a single parameter, see run_geometry_sweep().
+                The list of step dictionaries returned by sweep_geometry_parameter() is also accepted.
             fig (go.Figure): The Plotly figure to add the plot to.
+            k_index (int, optional): The index of the k-point to plot. Default is 0.
 
         Returns:
-            go.Figure: The Plotly figure object.
+            go.Figure: The Plotly figure object. The traces of band i of a polarization are in the legend group 
+                '<polarization>-<i>', with the colors of SWEEP_POLARIZATION_STYLES.
         """
 
         if fig is None:
             fig = go.Figure()
-
-        # For each data parameter value in the x axis, add all the modes frequencies (mode["freq"])in the y axis
-        num_bands = len(data[0]['modes_zeven'])
-        for i in range(num_bands):
-            modes_zeven = [d['modes_zeven'][i] for d in data]
-            modes_zodd = [d['modes_zodd'][i] for d in data]
-            param_values = [d['parameter_value'] for d in data]   
-            fig.add_trace(go.Scatter(x=param_values, y=[m["freq"] for m in modes_zeven], mode='lines+markers', name=f'Band {i} TE', line=dict(color='red'), marker=dict(symbol=i, size=10)))
-            fig.add_trace(go.Scatter(x=param_values, y=[m["freq"] for m in modes_zodd], mode='lines+markers', name=f'Band {i} TM', line=dict(color='blue'), marker=dict(symbol=i, size=10)))
+        if isinstance(data, list):
+            data = SweepResult.from_steps(data)
+        if len(data.shape) != 1:
+            raise ValueError(f"Only sweeps over a single parameter can be plotted, this sweep has dimensions {data.dims}. "
+                             "Select the values of the other parameters with SweepResult.sel() first.")
+
+        parameter_name = data.dims[0]
+        param_values = data.parameters[parameter_name] if data.grid else np.arange(data.shape[0])
+        for polarization, freqs in data.freqs.items():
+            name, color = self.SWEEP_POLARIZATION_STYLES.get(polarization, (polarization, None))
+            for i in range(freqs.shape[-1]):
+                # The legend group lets other traces of the same band (e.g. interpolated curves) toggle with it
+                fig.add_trace(go.Scatter(x=param_values, y=freqs[:, k_index, i], mode='lines+markers', 
+                                         name=f'Band {i} {name}', legendgroup=f'{polarization}-{i}',
+                                         line=dict(color=color), marker=dict(symbol=i, size=10)))
         fig.update_layout(
             autosize=False,
             width=700,
@@ -1020,7 +3299,7 @@ class PhotonicCrystal:
         fig.update_layout(
             xaxis_title='Parameter Value',
             yaxis_title='Frequency (c/a)',
-            title=f"Sweep of {data[0]['parameter_name']}",
+            title=f"Sweep of {parameter_name}",
             showlegend=True
         )
 
@@ -1109,7 +3388,7 @@ class Crystal2D(PhotonicCrystal):
         k_points (list): List of k-points for the simulation.
         geometry (list): List of geometric objects defining the photonic crystal.
         k_points_interpolated (list): Interpolated k-points for the simulation.
-        epsilon (ndarray): Dielectric distribution of the photonic crystal.
+        epsilon (ndarray): Dielectric distribution of the photonic crystal, as last plotted by plot_epsilon().
     
     Methods:
         __init__(self, lattice_type=None, num_bands=6, resolution=(32, 32), interp=4, periods=3, pickle_id=None, geometry=None, use_XY=True, k_point_max=0.2):
@@ -1193,11 +3472,9 @@ class Crystal2D(PhotonicCrystal):
         """
 
         with suppress_output():
-            if self.epsilon is None:
-                md = mpb.MPBData(rectify=True, periods=self.periods, resolution=self.resolution, lattice=self.geometry_lattice)
-                converted_eps = md.convert(self.ms.get_epsilon())
-            else:
-                converted_eps = self.epsilon
+            # The epsilon grid is cached by get_epsilon_and_lattice() and rebuilt when the crystal changes
+            md = mpb.MPBData(rectify=True, periods=self.periods, resolution=self.resolution, lattice=self.geometry_lattice)
+            converted_eps = md.convert(self.get_epsilon_and_lattice()[0])
             if fig is None:
                 fig = go.Figure()
 
@@ -1262,14 +3539,15 @@ class Crystal2D(PhotonicCrystal):
         fig_e = go.Figure()
         fig_h = go.Figure()
         target_modes = self.look_for_mode(target_polarization, target_k_point, target_frequency, frequency_tolerance, k_point_max_distance)
+        target_modes = [self.get_mode_fields(mode) for mode in target_modes]
         if not target_modes:
             print("No modes found with the specified criteria.")
             return
 
+        epsilon, lattice = self.get_epsilon_and_lattice()
         with suppress_output():
-            self.run_dumb_simulation()
-            md = mpb.MPBData(rectify=rectify, periods=periods, lattice=self.ms.get_lattice())
-            eps = md.convert(self.ms.get_epsilon()) 
+            md = mpb.MPBData(rectify=rectify, periods=periods, lattice=lattice)
+            eps = md.convert(epsilon) 
 
         min_eps, max_eps = np.min(eps), np.max(eps)
         midpoint = (max_eps + min_eps) / 2
@@ -1294,13 +3572,13 @@ class Crystal2D(PhotonicCrystal):
             # Take the specified component of the fields in the center of the slab
             if bloch_phase:
                 
-                e_field = mpb.MPBArray(mode["e_field"], lattice = self.ms.get_lattice(),  kpoint = mode["k_point"] )
-                h_field = mpb.MPBArray(mode["h_field"], lattice = self.ms.get_lattice(),  kpoint = mode["k_point"])
+                e_field = mpb.MPBArray(mode["e_field"], lattice = lattice,  kpoint = mode["k_point"] )
+                h_field = mpb.MPBArray(mode["h_field"], lattice = lattice,  kpoint = mode["k_point"])
                 
             else:
 
-                e_field = mpb.MPBArray(mode["e_field_periodic"], lattice = self.ms.get_lattice(),  kpoint = mp.Vector3())
-                h_field = mpb.MPBArray(mode["h_field_periodic"], lattice = self.ms.get_lattice(),  kpoint = mp.Vector3())
+                e_field = mpb.MPBArray(mode["e_field_periodic"], lattice = lattice,  kpoint = mp.Vector3())
+                h_field = mpb.MPBArray(mode["h_field_periodic"], lattice = lattice,  kpoint = mp.Vector3())
                 #  here the k-point is set to zero so that the phase term is basically 1.
                 
             e_field = e_field[..., component]
@@ -1483,12 +3761,13 @@ class Crystal2D(PhotonicCrystal):
 
             target_modes = self.look_for_mode(target_polarization, target_k_point, target_frequency,
                                             freq_tolerance=frequency_tolerance, k_point_max_distance=k_point_max_distance)
+            target_modes = [self.get_mode_fields(mode) for mode in target_modes]
             print(f"Number of target modes found: {len(target_modes)}")
 
+            epsilon, lattice = self.get_epsilon_and_lattice()
             with suppress_output():
-                self.run_dumb_simulation()
-                md = mpb.MPBData(rectify=rectify, periods=periods, lattice=self.ms.get_lattice())
-                eps = md.convert(self.ms.get_epsilon())
+                md = mpb.MPBData(rectify=rectify, periods=periods, lattice=lattice)
+                eps = md.convert(epsilon)
 
             # Calculate the midpoint between min and max of the permittivity (eps)
             min_eps, max_eps = np.min(eps), np.max(eps)
@@ -1507,11 +3786,11 @@ class Crystal2D(PhotonicCrystal):
             for i, mode in enumerate(target_modes):
                 # Get field arrays for this mode
                 if bloch_phase:
-                    e_field_array = mpb.MPBArray(mode["e_field"], lattice=self.ms.get_lattice(), kpoint=mode["k_point"])
-                    h_field_array = mpb.MPBArray(mode["h_field"], lattice=self.ms.get_lattice(), kpoint=mode["k_point"])
+                    e_field_array = mpb.MPBArray(mode["e_field"], lattice=lattice, kpoint=mode["k_point"])
+                    h_field_array = mpb.MPBArray(mode["h_field"], lattice=lattice, kpoint=mode["k_point"])
                 else:
-                    e_field_array = mpb.MPBArray(mode["e_field_periodic"], lattice=self.ms.get_lattice(), kpoint=mp.Vector3(0,0,0))
-                    h_field_array = mpb.MPBArray(mode["h_field_periodic"], lattice=self.ms.get_lattice(), kpoint=mp.Vector3(0,0,0))
+                    e_field_array = mpb.MPBArray(mode["e_field_periodic"], lattice=lattice, kpoint=mp.Vector3(0,0,0))
+                    h_field_array = mpb.MPBArray(mode["h_field_periodic"], lattice=lattice, kpoint=mp.Vector3(0,0,0))
                     # Here the k-point is set to zero so that the phase term is basically 1.
 
                 # Extract field components
@@ -1912,6 +4191,8 @@ class CrystalSlab(PhotonicCrystal):
             Plots the field components (Ex, Ey, Ez) and (Hx, Hy, Hz) for specific modes with consistent color scales.
     """
 
+    LATTICE_PARAMETERS = ("lattice_type", "height_supercell")
+
     def __init__(self,
                 lattice_type = "square",
                 material: Crystal_Materials = None,
@@ -1974,18 +4255,13 @@ class CrystalSlab(PhotonicCrystal):
             go.Figure: The Plotly figure object.
         """
 
-        if self.epsilon is None:
-            
-            if override_resolution_with is None:
-                resolution = self.resolution
-            else:
-                resolution = override_resolution_with
-            md = mpb.MPBData(rectify=True, periods=periods, resolution=resolution)
-            
-            
-            converted_eps = md.convert(self.ms.get_epsilon())
+        # The epsilon grid is cached by get_epsilon_and_lattice() and rebuilt when the crystal changes
+        if override_resolution_with is None:
+            resolution = self.resolution
         else:
-            converted_eps = self.epsilon
+            resolution = override_resolution_with
+        md = mpb.MPBData(rectify=True, periods=periods, resolution=resolution)
+        converted_eps = md.convert(self.get_epsilon_and_lattice()[0])
         self.epsilon = converted_eps
         if fig is None:
             fig = go.Figure()
@@ -2038,6 +4314,15 @@ class CrystalSlab(PhotonicCrystal):
         return fig
 
 
+    def _lattice_arguments(self) -> dict:
+        """
+        Get the arguments of basic_lattice() that build the current lattice, see with_parameters().
+
+        Returns:
+            dict: The arguments, by name.
+        """
+        return {"lattice_type": self.lattice_type, "height_supercell": self.geometry_lattice.size.z}
+
     def basic_lattice(self, lattice_type='square', height_supercell=4)-> tuple:
         """
         Define the basic lattice structure for the photonic crystal.
@@ -2149,12 +4434,13 @@ class CrystalSlab(PhotonicCrystal):
             tuple: A tuple containing the electric field figure and the magnetic field figure.
         """
         target_modes = self.look_for_mode(target_polarization, target_k_point, target_frequency, freq_tolerance = frequency_tolerance, k_point_max_distance = k_point_max_distance)
+        target_modes = [self.get_mode_fields(mode) for mode in target_modes]
         #print(len(target_modes))
         
+        epsilon, lattice = self.get_epsilon_and_lattice()
         with suppress_output():
-            self.run_dumb_simulation()
-            md = mpb.MPBData(rectify=True, periods=periods, lattice=self.ms.get_lattice())
-            eps = md.convert(self.ms.get_epsilon()) 
+            md = mpb.MPBData(rectify=True, periods=periods, lattice=lattice)
+            eps = md.convert(epsilon) 
 
         z_points = eps.shape[2] // periods
         z_mid = eps.shape[2] // 2
@@ -2188,11 +4474,11 @@ class CrystalSlab(PhotonicCrystal):
 
             # Take the specified component of the fields in the center of the slab
             if bloch_phase:
-                e_field = mpb.MPBArray(mode["e_field"], lattice = self.ms.get_lattice(),  kpoint = mode["k_point"] )
-                h_field = mpb.MPBArray(mode["h_field"], lattice = self.ms.get_lattice(),  kpoint = mode["k_point"])
+                e_field = mpb.MPBArray(mode["e_field"], lattice = lattice,  kpoint = mode["k_point"] )
+                h_field = mpb.MPBArray(mode["h_field"], lattice = lattice,  kpoint = mode["k_point"])
             else:
-                e_field = mpb.MPBArray(mode["e_field_periodic"], lattice = self.ms.get_lattice(),  kpoint = mode["k_point"] )
-                h_field = mpb.MPBArray(mode["h_field_periodic"], lattice = self.ms.get_lattice(),  kpoint = mode["k_point"])
+                e_field = mpb.MPBArray(mode["e_field_periodic"], lattice = lattice,  kpoint = mode["k_point"] )
+                h_field = mpb.MPBArray(mode["h_field_periodic"], lattice = lattice,  kpoint = mode["k_point"])
             e_field = e_field[..., z_points // 2, component]
             h_field = h_field[..., z_points // 2, component]
             with suppress_output():
@@ -2334,12 +4620,13 @@ class CrystalSlab(PhotonicCrystal):
 
         target_modes = self.look_for_mode(target_polarization, target_k_point, target_frequency,
                                         freq_tolerance=frequency_tolerance, k_point_max_distance=k_point_max_distance)
+        target_modes = [self.get_mode_fields(mode) for mode in target_modes]
         print(f"Number of target modes found: {len(target_modes)}")
 
+        epsilon, lattice = self.get_epsilon_and_lattice()
         with suppress_output():
-            self.run_dumb_simulation()
-            md = mpb.MPBData(rectify=True, periods=periods, lattice=self.ms.get_lattice())
-            eps = md.convert(self.ms.get_epsilon())
+            md = mpb.MPBData(rectify=True, periods=periods, lattice=lattice)
+            eps = md.convert(epsilon)
 
         z_points = eps.shape[2] // periods
         z_mid = eps.shape[2] // 2
@@ -2359,11 +4646,11 @@ class CrystalSlab(PhotonicCrystal):
         for i, mode in enumerate(target_modes):
             # Get field arrays for this mode
             if bloch_phase:
-                e_field_array = mpb.MPBArray(mode["e_field"], lattice=self.ms.get_lattice(), kpoint=mode["k_point"])
-                h_field_array = mpb.MPBArray(mode["h_field"], lattice=self.ms.get_lattice(), kpoint=mode["k_point"])
+                e_field_array = mpb.MPBArray(mode["e_field"], lattice=lattice, kpoint=mode["k_point"])
+                h_field_array = mpb.MPBArray(mode["h_field"], lattice=lattice, kpoint=mode["k_point"])
             else:
-                e_field_array = mpb.MPBArray(mode["e_field_periodic"], lattice=self.ms.get_lattice(), kpoint=mode["k_point"])
-                h_field_array = mpb.MPBArray(mode["h_field_periodic"], lattice=self.ms.get_lattice(), kpoint=mode["k_point"])
+                e_field_array = mpb.MPBArray(mode["e_field_periodic"], lattice=lattice, kpoint=mode["k_point"])
+                h_field_array = mpb.MPBArray(mode["h_field_periodic"], lattice=lattice, kpoint=mode["k_point"])
 
             # Extract field components in the center of the slab
             e_field_x = e_field_array[..., z_points // 2, 0]  # Shape (Nx, Ny)
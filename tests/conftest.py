@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules of the package are imported from src, as the app does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
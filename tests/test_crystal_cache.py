@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pytest
+
+mp = pytest.importorskip("meep")
+
+from crystal_cache import canonical_form, configuration_hash, ResultCache
+
+
+def test_canonical_form_ignores_float_noise_and_key_order():
+    a = {"r": 0.1 + 0.2, "epsilon": 12.0, "k": mp.Vector3(0.5, 0, 0)}
+    b = {"k": mp.Vector3(0.5, 0.0, 0.0), "epsilon": 12.0, "r": 0.3}
+    assert canonical_form(a) == canonical_form(b)
+    assert configuration_hash(a) == configuration_hash(b)
+
+
+def test_canonical_form_of_arrays_and_objects():
+    assert canonical_form(np.array([[1.0, 2.0]])) == ["ndarray", [1, 2], [1.0, 2.0]]
+    assert canonical_form((np.int64(3), np.float32(0.5), None)) == [3, 0.5, None]
+    assert canonical_form(mp.Medium(epsilon=4))["__class__"] == "Medium"
+    assert canonical_form(mp.Medium(epsilon=4)) != canonical_form(mp.Medium(epsilon=5))
+
+
+def test_configuration_hash_is_stable():
+    # The hash depends only on the canonical JSON, so that it is the same across processes and sessions
+    expected = hashlib.sha256(json.dumps([[1, 0.5, "run_zeven"], {"a": 2}], separators=(",", ":")).encode()).hexdigest()
+    assert configuration_hash([1, 0.5, "run_zeven"], {"a": 2}) == expected
+    assert configuration_hash([1, 0.5, "run_zeven"], {"a": 2}) != configuration_hash([1, 0.5, "run_zodd"], {"a": 2})
+
+
+def test_result_cache_put_get(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    key = cache.key("geometry", 32, [mp.Vector3()])
+    assert cache.get(key) is None
+    assert key not in cache
+    cache.put(key, {"freqs": [0.1, 0.2]})
+    assert key in cache
+    assert cache.get(key) == {"freqs": [0.1, 0.2]}
+    assert cache.info()["num_entries"] == 1
+
+
+def test_result_cache_discards_unreadable_entry(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    with open(cache._path("broken"), "wb") as f:
+        f.write(b"not a pickle")
+    assert cache.get("broken") is None
+    assert "broken" not in cache
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(directory=str(tmp_path), max_size=10**9)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, bytes(1000))
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    # Reading "a" makes it the most recently used
+    cache.get("a")
+    cache.max_size = 2 * os.path.getsize(cache._path("a"))
+    cache.evict()
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    cache.clear()
+    assert cache.info()["num_entries"] == 0
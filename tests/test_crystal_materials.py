@@ -0,0 +1,49 @@
+import pytest
+
+mp = pytest.importorskip("meep")
+
+from crystal_materials import Crystal_Materials
+
+
+def _materials():
+    materials = Crystal_Materials()
+    materials.background = {"epsilon": 1}
+    materials.bulk = {"epsilon_diag": mp.Vector3(4, 4, 5), "epsilon_offdiag": mp.Vector3()}
+    materials.atom = {"epsilon": 12}
+    return materials
+
+
+@pytest.mark.parametrize("name, parsed", [
+    ("epsilon_bulk", ("epsilon", "bulk")),
+    ("epsilon_atom", ("epsilon", "atom")),
+    ("epsilon_diag_bulk", ("epsilon_diag", "bulk")),
+    ("E_chi2_diag_substrate", ("E_chi2_diag", "substrate")),
+    ("epsilon", None),
+    ("r", None),
+    ("mu_bulk", None),
+])
+def test_parse_parameter(name, parsed):
+    assert Crystal_Materials.parse_parameter(name) == parsed
+
+
+def test_with_parameters_changes_only_the_given_values():
+    materials = _materials()
+    changed = materials.with_parameters(epsilon_atom=9)
+    assert changed.configuration("atom") == {"epsilon": 9}
+    assert changed.configuration("background") == {"epsilon": 1}
+    assert changed.configuration("bulk") == materials.configuration("bulk")
+    # The original materials are not modified
+    assert materials.configuration("atom") == {"epsilon": 12}
+
+
+def test_with_parameters_replaces_the_tensor_with_a_scalar():
+    changed = _materials().with_parameters(epsilon_bulk=4.5, epsilon_substrate=2)
+    assert changed.configuration("bulk") == {"epsilon": 4.5}
+    assert changed.configuration("substrate") == {"epsilon": 2}
+    back = changed.with_parameters(epsilon_diag_bulk=mp.Vector3(4, 4, 5))
+    assert set(back.configuration("bulk")) == {"epsilon_diag"}
+
+
+def test_with_parameters_rejects_unknown_parameters():
+    with pytest.raises(ValueError):
+        _materials().with_parameters(r=0.2)
@@ -0,0 +1,132 @@
+import json
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+pytest.importorskip("meep")
+
+from crystal_optimizer import DiracTarget, TrustRegionOptimizer
+
+
+def _cone(center, splitting, slope, dk=0.05, num_degenerate=2, num_bands=4):
+    """Frequencies at Gamma and dk of bands 1 to num_bands, with a cone of the given slope on the bands 2 to 2 + num_degenerate - 1."""
+    freqs = np.array([[0.2, 0.2 - 0.01]] + [[center, center] for _ in range(num_degenerate)] 
+                     + [[0.9, 0.9]] * (num_bands - 1 - num_degenerate)).T
+    freqs[0, 1] -= splitting / 2
+    freqs[0, num_degenerate] += splitting / 2
+    freqs[1, 1] = freqs[0, 1] - slope * dk
+    freqs[1, num_degenerate] = freqs[0, num_degenerate] + slope * dk
+    return freqs
+
+
+class _StubCrystal:
+    """A crystal whose target bands split by |r - 0.25| at Gamma, forming a cone of slope 0.3."""
+
+    num_bands = 4
+
+    def run_sweep(self, parameters, grid, runners, polarizations, k_points, num_workers):
+        freqs = np.array([_cone(0.5, abs(r - 0.25), 0.3) for r in parameters["r"]])
+        return SimpleNamespace(freqs={"target": freqs})
+
+
+def test_dirac_target_perfect_cone():
+    metrics = DiracTarget(0.5, band=2).evaluate(_cone(0.5, 0.0, 0.3))
+    assert metrics["objective"] == pytest.approx(0)
+    assert metrics["slope"] == pytest.approx(0.3)
+
+
+def test_dirac_target_mismatches():
+    target = DiracTarget(0.5, band=2, weights=(1, 2, 3, 4))
+    metrics = target.evaluate(_cone(0.52, 0.01, 0.3))
+    assert metrics["freq_error"] == pytest.approx(0.02)
+    assert metrics["splitting"] == pytest.approx(0.01)
+    assert metrics["slope_mismatch"] == pytest.approx(0)
+    assert metrics["objective"] == pytest.approx(0.02**2 + 2 * 0.01**2)
+
+
+def test_dirac_target_penalizes_flat_bands():
+    metrics = DiracTarget(0.5, band=2, min_slope=0.1).evaluate(_cone(0.5, 0.0, 0.0))
+    assert metrics["slope_deficit"] == pytest.approx(0.1)
+    assert metrics["objective"] == pytest.approx(0.01)
+    assert DiracTarget(0.5, band=2, min_slope=0.1).evaluate(_cone(0.5, 0.0, 0.2))["slope_deficit"] == 0
+
+
+def test_dirac_target_three_bands():
+    target = DiracTarget(0.5, band=2, num_degenerate=3)
+    assert target.upper_band == 4
+    # The middle band of the C4v Dirac-like cone is flat
+    metrics = target.evaluate(_cone(0.5, 0.0, 0.3, num_degenerate=3, num_bands=5))
+    assert metrics["objective"] == pytest.approx(0)
+    freqs = _cone(0.5, 0.0, 0.3, num_degenerate=3, num_bands=5)
+    freqs[0, 2] = 0.53
+    assert target.evaluate(freqs)["splitting"] == pytest.approx(0.03)
+    assert target.evaluate(freqs)["freq_error"] == pytest.approx(0.01)
+
+
+def test_dirac_target_checks_arguments():
+    with pytest.raises(ValueError):
+        DiracTarget(0.5, band=2, weights=(1, 1, 1))
+    with pytest.raises(ValueError):
+        DiracTarget(0.5, band=2, num_degenerate=1)
+    crystal = _StubCrystal()
+    with pytest.raises(ValueError):
+        TrustRegionOptimizer(crystal, {"r": (0.1, 0.4)}, DiracTarget(0.5, band=3, num_degenerate=3))
+
+
+def test_latin_hypercube():
+    optimizer = TrustRegionOptimizer(_StubCrystal(), {"r": (0.1, 0.4), "h": (1, 2), "e": (4, 6)}, 
+                                     DiracTarget(0.5, band=2), num_workers=1, seed=0)
+    points = optimizer._latin_hypercube(10)
+    assert points.shape == (10, 3)
+    assert np.all((points >= 0) & (points < 1))
+    # One point in each of the 10 strata of every parameter
+    for column in points.T:
+        assert sorted(np.floor(10 * column).astype(int)) == list(range(10))
+
+
+def _optimizer_with_history(unit_points, objectives):
+    optimizer = TrustRegionOptimizer(_StubCrystal(), {"r": (0.1, 0.4), "h": (1, 2)}, DiracTarget(0.5, band=2), 
+                                     num_workers=1, seed=1)
+    optimizer.history = [{"unit_point": list(point), "objective": objective} 
+                         for point, objective in zip(unit_points, objectives)]
+    return optimizer
+
+
+@pytest.mark.parametrize("unit_points, objectives", [
+    # Fewer points than dimension + 1
+    ([[0.5, 0.5], [0.2, 0.7]], [1.0, 2.0]),
+    # Repeated points
+    ([[0.5, 0.5], [0.5, 0.5], [0.5, 0.5], [0.2, 0.7]], [1.0, 0.5, 2.0, 3.0]),
+    # Points on a line, for which the linear term of the spline cannot be fitted
+    ([[0.1, 0.1], [0.3, 0.3], [0.5, 0.5], [0.7, 0.7]], [3.0, 2.0, 1.0, 2.0]),
+])
+def test_propose_degenerate_histories(unit_points, objectives):
+    optimizer = _optimizer_with_history(unit_points, objectives)
+    batch = optimizer._propose(4)
+    assert batch.shape == (4, 2)
+    center = np.array(optimizer.best()["unit_point"])
+    assert np.all(np.abs(batch - center) <= optimizer.radius + 1e-12)
+    assert np.all((batch >= 0) & (batch <= 1))
+    distances = np.linalg.norm(batch[:, np.newaxis] - np.array(unit_points)[np.newaxis], axis=2)
+    assert np.all(distances >= 0.1 * optimizer.radius)
+
+
+def test_propose_follows_the_surrogate():
+    rng = np.random.default_rng(0)
+    unit_points = rng.random((12, 2))
+    objectives = np.sum((unit_points - [0.6, 0.4])**2, axis=1)
+    optimizer = _optimizer_with_history(unit_points, objectives)
+    optimizer.radius = 0.5
+    batch = optimizer._propose(2)
+    assert np.all(np.linalg.norm(batch - [0.6, 0.4], axis=1) < np.min(np.linalg.norm(unit_points - [0.6, 0.4], axis=1)) + 0.1)
+
+
+def test_run_on_stub_objective(tmp_path):
+    log_path = tmp_path / "optimization.jsonl"
+    optimizer = TrustRegionOptimizer(_StubCrystal(), {"r": (0.1, 0.4)}, DiracTarget(0.5, band=2), budget=20, 
+                                     batch_size=2, num_workers=1, log_path=str(log_path), seed=0)
+    best = optimizer.run()
+    assert len(optimizer.history) <= 20
+    assert best["parameters"]["r"] == pytest.approx(0.25, abs=0.02)
+    with open(log_path) as f:
+        assert len([json.loads(line) for line in f]) == len(optimizer.history)
@@ -0,0 +1,73 @@
+import time
+import numpy as np
+import pytest
+
+from crystal_parallel import split_k_points, compute_gap_list, estimate_solve_cost, run_in_pool
+
+
+class _Job:
+    """A picklable job that returns the time it started at."""
+
+    def start_time(self):
+        start = time.monotonic()
+        time.sleep(0.01)
+        return start
+
+
+@pytest.mark.parametrize("num_k_points, num_chunks", [(10, 3), (7, 7), (3, 5), (1, 4), (12, 1)])
+def test_split_k_points_preserves_order(num_k_points, num_chunks):
+    k_points = list(range(num_k_points))
+    chunks = split_k_points(k_points, num_chunks)
+    assert len(chunks) == min(num_chunks, num_k_points)
+    assert all(chunks)
+    assert sum(chunks, []) == k_points
+
+
+def test_split_k_points_balances_chunks():
+    sizes = [len(chunk) for chunk in split_k_points(list(range(10)), 3)]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_compute_gap_list():
+    freqs = np.array([
+        [0.0, 0.40, 0.44],
+        [0.2, 0.45, 0.55],
+        [0.3, 0.35, 0.60],
+    ])
+    # Gap between bands 0 and 1 (0.3 to 0.35), none between bands 1 and 2 (0.45 overlaps 0.44)
+    gaps = compute_gap_list(freqs)
+    assert len(gaps) == 1
+    size, lower, upper = gaps[0]
+    assert (lower, upper) == (0.3, 0.35)
+    assert size == pytest.approx(200 * 0.05 / 0.65)
+
+
+def test_compute_gap_list_empty():
+    assert compute_gap_list(np.empty((0, 3))) == []
+    assert compute_gap_list(np.array([[0.1, 0.2], [0.1, 0.2]]))[0][1:] == (0.1, 0.2)
+
+
+def test_estimate_solve_cost_ordering():
+    base = estimate_solve_cost(32, (1, 1), 4)
+    assert estimate_solve_cost(64, (1, 1), 4) > base
+    assert estimate_solve_cost(32, (1, 1, 2), 4) > base
+    assert estimate_solve_cost(32, (1, 1), 8) > base
+    assert estimate_solve_cost(32, (1, 1), 4, num_k_points=3) == pytest.approx(3 * base)
+    # A direction with no size has a single grid point
+    assert estimate_solve_cost(32, (1, 1, 0), 4) == base
+
+
+def test_run_in_pool_submits_largest_cost_first():
+    costs = [1.0, 5.0, 3.0, 4.0, 2.0]
+    calls = [(_Job(), "start_time", {}) for _ in costs]
+    completed = []
+    starts = run_in_pool(calls, num_workers=1, costs=costs, callback=lambda i, result: completed.append(i))
+    # With a single worker, the calls run one after the other in submission order
+    assert list(np.argsort(starts)) == [1, 3, 2, 4, 0]
+    assert completed == [1, 3, 2, 4, 0]
+
+
+def test_run_in_pool_keeps_call_order_without_costs():
+    calls = [(_Job(), "start_time", {}) for _ in range(4)]
+    starts = run_in_pool(calls, num_workers=1)
+    assert list(np.argsort(starts)) == [0, 1, 2, 3]
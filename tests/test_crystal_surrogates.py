@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from crystal_sweeps import SweepResult
+from crystal_surrogates import SweepSurrogate
+
+GAMMA = SimpleNamespace(x=0.0, y=0.0, z=0.0)
+
+
+def _line_result(function, num_points=9):
+    r = np.linspace(0.1, 0.4, num_points)
+    freqs = np.stack([function(r), 2 * function(r)], axis=-1)[:, np.newaxis, :]
+    return SweepResult({"r": r}, True, [GAMMA], {"zeven": freqs})
+
+
+def test_predict_one_parameter():
+    surrogate = SweepSurrogate(_line_result(lambda r: r**3 - r))
+    r = np.linspace(0.1, 0.4, 50)
+    # A cubic is reproduced exactly by the interpolating cubic spline
+    assert np.allclose(surrogate.predict("zeven", r=r), np.stack([r**3 - r, 2 * (r**3 - r)], axis=-1))
+    assert surrogate.predict("zeven", band=1, r=0.25) == pytest.approx(2 * (0.25**3 - 0.25))
+    assert surrogate.predict("zeven", r=np.zeros((4, 5))).shape == (4, 5, 2)
+    with pytest.raises(ValueError):
+        surrogate.predict("zeven", h=0.2)
+
+
+def test_predict_two_parameters():
+    r, h = np.linspace(0.1, 0.4, 5), np.linspace(1.0, 2.0, 4)
+    rr, hh = np.meshgrid(r, h, indexing="ij")
+    freqs = (0.2 + rr + 0.05 * hh)[:, :, np.newaxis, np.newaxis]
+    surrogate = SweepSurrogate(SweepResult({"r": r, "h": h}, True, [GAMMA], {"zeven": freqs}))
+    # The thin-plate spline has a linear term: a linear function is reproduced exactly
+    assert surrogate.predict("zeven", band=0, r=[0.15, 0.33], h=1.7) == pytest.approx([0.2 + 0.15 + 0.085, 0.2 + 0.33 + 0.085])
+
+
+def test_loo_errors():
+    surrogate = SweepSurrogate(_line_result(lambda r: 0.5 + 0.2 * r))
+    errors = surrogate.loo_errors()["zeven"]
+    assert errors.shape == (9, 2)
+    assert np.allclose(errors, 0)
+
+    surrogate = SweepSurrogate(_line_result(lambda r: np.sin(20 * r)))
+    errors = surrogate.loo_errors()
+    assert surrogate.loo_errors() is errors
+    assert np.all(surrogate.error_estimate()["zeven"] > 1e-3)
+    assert surrogate.error_estimate()["zeven"] == pytest.approx(np.max(np.abs(errors["zeven"]), axis=0))
+
+
+def test_loo_errors_skip_missing_bands():
+    result = _line_result(lambda r: 0.5 + 0.2 * r)
+    result.freqs["zeven"][3, 0, 1] = np.nan
+    surrogate = SweepSurrogate(result)
+    errors = surrogate.loo_errors()["zeven"]
+    assert np.isnan(errors[3, 1])
+    assert not np.any(np.isnan(np.delete(errors[:, 1], 3)))
+    assert np.isfinite(surrogate.error_estimate()["zeven"][1])
@@ -0,0 +1,126 @@
+import csv
+import pickle
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from crystal_sweeps import sweep_points, SweepResult, SweepCheckpoint
+
+GAMMA = SimpleNamespace(x=0.0, y=0.0, z=0.0)
+X = SimpleNamespace(x=0.5, y=0.0, z=0.0)
+
+
+def _grid_result():
+    r, h = np.array([0.1, 0.2, 0.3]), np.array([1.0, 2.0])
+    # Frequencies with shape (r, h, k-point, band), encoding the indices of each value
+    freqs = (np.arange(3)[:, None, None, None] * 100 + np.arange(2)[None, :, None, None] * 10 
+             + np.arange(2)[None, None, :, None] + 0.1 * np.arange(3)[None, None, None, :]).astype(float)
+    return SweepResult({"r": r, "h": h}, True, [GAMMA, X], {"zeven": freqs, "zodd": -freqs})
+
+
+def test_sweep_points():
+    points, shape = sweep_points({"r": [0.1, 0.2], "h": [1, 2, 3]})
+    assert shape == (2, 3)
+    assert points[1] == {"r": 0.1, "h": 2}
+    points, shape = sweep_points({"r": [0.1, 0.2], "h": [1, 2]}, grid=False)
+    assert shape == (2,)
+    assert points == [{"r": 0.1, "h": 1}, {"r": 0.2, "h": 2}]
+    with pytest.raises(ValueError):
+        sweep_points({"r": [0.1, 0.2], "h": [1]}, grid=False)
+    with pytest.raises(ValueError):
+        sweep_points({})
+
+
+def test_sel_grid():
+    result = _grid_result()
+    assert result.dims == ("r", "h", "k_point", "band")
+    assert result.sel("zeven", r=0.2).shape == (2, 2, 3)
+    assert result.sel("zeven", r=0.2, h=2.0)[1, 2] == pytest.approx(111.2)
+    assert np.array_equal(result.sel("zodd"), -result.freqs["zeven"])
+    with pytest.raises(ValueError):
+        result.sel("zeven", r=0.25)
+    with pytest.raises(ValueError):
+        result.sel("zeven", epsilon=4)
+
+
+def test_sel_list():
+    freqs = np.arange(3, dtype=float).reshape(3, 1, 1)
+    result = SweepResult({"r": [0.1, 0.2, 0.1], "h": [1.0, 1.0, 2.0]}, False, [GAMMA], {"zeven": freqs})
+    assert result.dims == ("point", "k_point", "band")
+    assert list(result.sel("zeven", r=0.1)[:, 0, 0]) == [0, 2]
+    assert list(result.sel("zeven", r=0.1, h=2.0)[:, 0, 0]) == [2]
+    with pytest.raises(ValueError):
+        result.sel("zeven", r=0.3)
+
+
+def test_checkpoint_resumes(tmp_path):
+    checkpoint = SweepCheckpoint("sweep", directory=str(tmp_path))
+    assert len(checkpoint) == 0
+    checkpoint.append(0, {"freqs": [0.1]})
+    checkpoint.append(2, {"freqs": [0.3]})
+    resumed = SweepCheckpoint("sweep", directory=str(tmp_path))
+    assert resumed.results == {0: {"freqs": [0.1]}, 2: {"freqs": [0.3]}}
+    assert 2 in resumed and 1 not in resumed
+    resumed.remove()
+    assert len(SweepCheckpoint("sweep", directory=str(tmp_path))) == 0
+
+
+def test_checkpoint_discards_truncated_record(tmp_path):
+    checkpoint = SweepCheckpoint("sweep", directory=str(tmp_path))
+    checkpoint.append(0, "first")
+    valid_size = len(open(checkpoint.path, "rb").read())
+    # A crash while writing the second record leaves part of it in the file
+    record = pickle.dumps((1, "second"))
+    with open(checkpoint.path, "ab") as f:
+        f.write(record[:len(record) // 2])
+
+    resumed = SweepCheckpoint("sweep", directory=str(tmp_path))
+    assert resumed.results == {0: "first"}
+    assert len(open(resumed.path, "rb").read()) == valid_size
+    resumed.append(1, "second")
+    assert SweepCheckpoint("sweep", directory=str(tmp_path)).results == {0: "first", 1: "second"}
+
+
+def test_to_npz(tmp_path):
+    result = _grid_result()
+    path = tmp_path / "sweep.npz"
+    result.to_npz(str(path))
+    with np.load(path) as arrays:
+        assert np.array_equal(arrays["freqs_zeven"], result.freqs["zeven"])
+        assert np.array_equal(arrays["parameter_h"], [1.0, 2.0])
+        assert np.array_equal(arrays["k_points"], [[0, 0, 0], [0.5, 0, 0]])
+        assert list(arrays["dims"]) == list(result.dims)
+        assert "errors_zeven" not in arrays
+
+
+def test_to_csv_skips_missing_bands(tmp_path):
+    freqs = np.array([[[0.1, np.nan]], [[0.2, 0.25]]])
+    result = SweepResult({"r": [0.1, 0.2]}, True, [GAMMA], {"zeven": freqs})
+    path = tmp_path / "sweep.csv"
+    result.to_csv(str(path))
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["r", "polarization", "kx", "ky", "kz", "band", "freq"]
+    assert [(row[0], row[5], row[6]) for row in rows[1:]] == [("0.1", "0", "0.1"), ("0.2", "0", "0.2"), ("0.2", "1", "0.25")]
+
+
+def test_from_steps_and_to_steps():
+    steps = [
+        {"parameter_name": "r", "parameter_value": value,
+         "modes_zeven": [{"freq": value, "k_point": GAMMA}, {"freq": 2 * value, "k_point": GAMMA}],
+         "modes_zodd": [{"freq": 3 * value, "k_point": GAMMA}, {"freq": 4 * value, "k_point": GAMMA}]}
+        for value in (0.1, 0.2, 0.3)
+    ]
+    result = SweepResult.from_steps(steps)
+    assert result.dims == ("r", "k_point", "band")
+    assert result.freqs["zodd"].shape == (3, 1, 2)
+    assert result.band_freqs("zeven", 1) == pytest.approx([0.2, 0.4, 0.6])
+    assert result.to_steps() == steps
+
+
+def test_to_steps_needs_one_parameter_and_the_modes():
+    with pytest.raises(ValueError):
+        _grid_result().to_steps()
+    result = SweepResult({"r": [0.1]}, True, [GAMMA], {"zeven": np.zeros((1, 1, 1))})
+    with pytest.raises(ValueError):
+        result.to_steps()
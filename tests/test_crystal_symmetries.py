@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from crystal_symmetries import (C4v_operations, C6v_operations, canonical_k_point_key, irreducible_k_points, 
+                                first_brillouin_zone_mask, brillouin_zone_vertices, grid_preserving_operations)
+
+SQUARE_RECIPROCAL = np.array([[1.0, 0.0], [0.0, 1.0]])
+# Reciprocal vectors of the triangular lattice with basis (1, 0), (1/2, √3/2)
+TRIANGULAR_RECIPROCAL = np.array([[1.0, -1 / np.sqrt(3)], [0.0, 2 / np.sqrt(3)]])
+
+
+def _orbit(k_point, operations):
+    return {tuple(np.round(op @ np.asarray(k_point, dtype=float), 8) + 0.0) for op in operations.values()}
+
+
+@pytest.mark.parametrize("operations, k_point, size", [
+    (C4v_operations, (0.3, 0.1), 8),
+    (C4v_operations, (0.5, 0.0), 4),
+    (C4v_operations, (0.2, 0.2), 4),
+    (C4v_operations, (0.0, 0.0), 1),
+    (C6v_operations, (0.3, 0.1), 12),
+    (C6v_operations, (0.4, 0.0), 6),
+    (C6v_operations, (0.0, 0.0), 1),
+])
+def test_orbit_sizes(operations, k_point, size):
+    assert len(_orbit(k_point, operations)) == size
+
+
+@pytest.mark.parametrize("operations", [C4v_operations, C6v_operations])
+def test_canonical_key_is_shared_by_the_orbit(operations):
+    k_point = np.array([0.3, 0.1, 0.05])
+    keys = {canonical_k_point_key(np.append(op @ k_point[:2], k_point[2]), operations) for op in operations.values()}
+    assert len(keys) == 1
+    # The z component is not transformed
+    assert canonical_k_point_key(k_point, operations)[2] == 0.05
+    assert canonical_k_point_key([0.3, 0.1, 0.0], operations) != canonical_k_point_key([0.3, 0.2, 0.0], operations)
+
+
+def test_canonical_key_has_no_negative_zero():
+    key = canonical_k_point_key([-0.0, 0.0, -0.0], C4v_operations)
+    assert all(np.copysign(1, value) == 1 for value in key)
+
+
+@pytest.mark.parametrize("operations, size", [(C4v_operations, 8), (C6v_operations, 12)])
+def test_irreducible_k_points(operations, size):
+    generic = np.array([0.3, 0.1])
+    images = [np.append(op @ generic, 0) for op in operations.values()]
+    k_points = np.array([[0.0, 0.0, 0.0]] + images + [[0.35, 0.1, 0.0]])
+    representatives, orbits = irreducible_k_points(k_points, operations)
+    assert representatives == [0, 1, size + 1]
+    assert list(orbits) == [0] + [1] * size + [2]
+
+
+def test_first_brillouin_zone_mask_square():
+    k_points = np.array([[0.0, 0.0, 0.0], [0.5, 0.5, 0.0], [0.5, 0.0, 0.0], [0.6, 0.0, 0.0], [0.4, -0.55, 0.0]])
+    assert list(first_brillouin_zone_mask(k_points, SQUARE_RECIPROCAL)) == [True, True, True, False, False]
+
+
+def test_first_brillouin_zone_mask_triangular():
+    # M is at half a reciprocal vector, K at 2/3 from Gamma along x
+    m_point = TRIANGULAR_RECIPROCAL[1] / 2
+    k_points = np.array([m_point, 1.01 * m_point, [2 / 3, 0.0], [0.7, 0.0]])
+    assert list(first_brillouin_zone_mask(k_points, TRIANGULAR_RECIPROCAL)) == [True, False, True, False]
+
+
+@pytest.mark.parametrize("reciprocal_vectors, num_vertices, radius", [
+    (SQUARE_RECIPROCAL, 4, np.sqrt(0.5)),
+    (TRIANGULAR_RECIPROCAL, 6, 2 / 3),
+])
+def test_brillouin_zone_vertices(reciprocal_vectors, num_vertices, radius):
+    vertices = brillouin_zone_vertices(reciprocal_vectors)
+    assert vertices.shape == (num_vertices, 2)
+    assert np.allclose(np.linalg.norm(vertices, axis=1), radius)
+    angles = np.arctan2(vertices[:, 1], vertices[:, 0])
+    assert np.all(np.diff(angles) > 0)
+    assert np.all(first_brillouin_zone_mask(vertices, reciprocal_vectors))
+
+
+def test_grid_preserving_operations():
+    assert set(grid_preserving_operations(C4v_operations)) == set(C4v_operations)
+    assert set(grid_preserving_operations(C6v_operations)) == {"E", "C2", "sigma_x", "sigma_y"}
+    # The operations map the points of a centered grid onto points of the grid
+    k_values = np.linspace(-1, 1, 7)
+    grid = {(x, y) for x in k_values for y in k_values}
+    for op in grid_preserving_operations(C6v_operations).values():
+        assert {tuple(np.round(op @ point, 12) + 0.0) for point in grid} == {tuple(np.round(p, 12) + 0.0) for p in grid}
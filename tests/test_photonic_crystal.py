@@ -0,0 +1,1198 @@
+import math
+import os
+from collections import OrderedDict
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+mp = pytest.importorskip("meep")
+
+from photonic_crystal import PhotonicCrystal
+from crystal_symmetries import C4v_operations, C6v_operations
+from crystal_parallel import compute_gap_list
+from crystal_cache import ResultCache
+from crystal_sweeps import SweepCheckpoint
+
+
+def _segments(freqs, tolerance=1e-3, degeneracy_tolerance=5e-3, min_length=1e-3, corners=()):
+    freqs = np.asarray(freqs, dtype=float).reshape(len(freqs), -1)
+    distances = np.linspace(0, 1, len(freqs))
+    is_corner = np.zeros(len(freqs), dtype=bool)
+    is_corner[list(corners)] = True
+    return PhotonicCrystal._segments_to_refine(distances, freqs, is_corner, tolerance, degeneracy_tolerance, min_length)
+
+
+def test_segments_to_refine_linear_band():
+    assert len(_segments(0.2 + 0.1 * np.linspace(0, 1, 11))) == 0
+
+
+def test_segments_to_refine_curvature():
+    # The error of the linear interpolation of 0.5 d² on segments of length 0.1 is 0.1² / 8 > 1e-3
+    d = np.linspace(0, 1, 11)
+    assert list(_segments(0.5 * d**2)) == list(range(10))
+    assert len(_segments(0.5 * d**2, tolerance=2e-3)) == 0
+    assert len(_segments(0.5 * d**2, min_length=0.2)) == 0
+
+
+def test_segments_to_refine_near_degeneracy():
+    d = np.linspace(0, 1, 11)
+    freqs = np.stack([np.full_like(d, 0.5), 0.5 + 0.02 * d], axis=1)
+    assert list(_segments(freqs, tolerance=1e-4)) == [0, 1, 2]
+
+
+def test_segments_to_refine_gap_edge():
+    # The maximum of the lower band at index 5 bounds a gap: the segments around it are refined
+    d = np.linspace(0, 1, 11)
+    freqs = np.stack([0.3 + 0.1 * (0.5 - np.abs(d - 0.5)), np.full_like(d, 0.6)], axis=1)
+    assert list(_segments(freqs, tolerance=5e-3)) == [4, 5]
+
+
+def test_k_grid_cells_to_refine_kink():
+    i = np.arange(5)[:, np.newaxis, np.newaxis]
+    freqs = 0.3 + 0.1 * np.abs(i - 2) + np.zeros((5, 5, 1))
+    cells = PhotonicCrystal._k_grid_cells_to_refine(freqs, tolerance=0.01, degeneracy_tolerance=1e-3)
+    assert cells.shape == (4, 4)
+    assert np.all(cells[1:3]) and not np.any(cells[[0, 3]])
+
+
+def test_k_grid_cells_to_refine_near_degeneracy():
+    j = np.arange(5)[np.newaxis, :]
+    freqs = np.stack([np.full((5, 5), 0.5), 0.5 + 0.01 * j + np.zeros((5, 5))], axis=2)
+    cells = PhotonicCrystal._k_grid_cells_to_refine(freqs, tolerance=1e-3, degeneracy_tolerance=5e-3)
+    assert np.all(cells[:, 0]) and not np.any(cells[:, 1:])
+
+
+def test_k_grid_cells_to_refine_ignores_points_out_of_zone():
+    kx, ky = np.meshgrid(np.arange(5), np.arange(5), indexing="ij")
+    freqs = (0.1 + 0.01 * kx + 0.02 * ky)[..., np.newaxis]
+    freqs[0, 0] = np.nan
+    cells = PhotonicCrystal._k_grid_cells_to_refine(freqs, tolerance=1e-3, degeneracy_tolerance=1e-3)
+    assert not np.any(cells)
+
+
+class _WarmStartSolver:
+    """
+    A stand-in for the MPB ModeSolver of _run_warm_started(): a cold solve of k-point i takes 10 + i iterations, 
+    a solve seeded with set_eigenvectors() takes 2. Like MPB, solve_kpoint() does not update `iterations`.
+    """
+
+    def __init__(self, num_k_points=3, num_bands=2):
+        self.k_points = [i * 0.1 for i in range(num_k_points)]
+        self.num_bands = num_bands
+        self.iterations = 99
+        self.freqs = []
+        self.solves = []
+        self._last = 0
+        self._seeded = False
+        self.mode_solver = SimpleNamespace(get_iterations=lambda: self._last)
+
+    def init_params(self, parity, reset_fields):
+        self._seeded = False
+
+    def get_eigenvectors(self, first_band, num_bands):
+        return np.full((4, num_bands), self.current_k if self.solves else 0.0)
+
+    def set_eigenvectors(self, eigenvectors, first_band):
+        self._seeded = True
+
+    def solve_kpoint(self, k_point):
+        index = self.k_points.index(k_point)
+        self._last = 2 if self._seeded else 10 + index
+        self.solves.append((index, self._seeded))
+        self._seeded = False
+        self.freqs = [k_point, k_point + 1]
+
+
+def _warm_start_crystal():
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal._warm_start = {}
+    crystal.solver_iterations = {}
+    crystal.ms = _WarmStartSolver()
+    return crystal
+
+
+def test_warm_start_counts_iterations_per_solve():
+    crystal = _warm_start_crystal()
+    freqs = crystal._run_warm_started("run_zeven")
+    assert freqs.shape == (3, 2)
+    assert crystal.solver_iterations["run_zeven"] == {
+        "iterations": [10, 11, 12], "warm": False, "cold_iterations": [10, 11, 12], "saved": 0,
+    }
+
+    crystal._run_warm_started("run_zeven")
+    assert crystal.solver_iterations["run_zeven"] == {
+        "iterations": [2, 2, 2], "warm": True, "cold_iterations": None, "saved": None,
+    }
+
+
+def test_warm_start_cold_reference():
+    crystal = _warm_start_crystal()
+    crystal._run_warm_started("run_zeven")
+    crystal.ms.solves.clear()
+    band_calls = []
+    crystal._run_warm_started("run_zeven", lambda ms, band: band_calls.append(band), cold_reference=True)
+    iterations = crystal.solver_iterations["run_zeven"]
+    assert iterations["iterations"] == [2, 2, 2]
+    assert iterations["cold_iterations"] == [10, 11, 12]
+    assert iterations["saved"] == 33 - 6
+    # The reference solve is cold and the band functions are called only by the seeded solve
+    assert crystal.ms.solves == [(0, False), (1, False), (2, False), (0, True), (1, True), (2, True)]
+    assert band_calls == [1, 2] * 3
+
+
+def test_sweep_iterations_baseline():
+    steps = [
+        None,
+        {"iterations": 30, "cold_iterations": 30, "warm": False},
+        {"iterations": 8, "cold_iterations": None, "warm": True},
+        {"iterations": 6, "cold_iterations": 28, "warm": True},
+    ]
+    iterations = PhotonicCrystal._sweep_iterations(steps)
+    assert np.isnan(iterations["iterations"][0]) and np.isnan(iterations["saved"][0])
+    assert list(iterations["iterations"][1:]) == [30, 8, 6]
+    # The seeded step without a reference solve takes the first cold step as baseline
+    assert list(iterations["cold_iterations"][1:]) == [30, 30, 28]
+    assert list(iterations["cold_measured"]) == [False, True, False, True]
+    assert list(iterations["saved"][1:]) == [0, 22, 22]
+
+
+def _triangular_grid_crystal(solved):
+    """A triangular-lattice crystal invariant under C6v, whose 'solves' record the k-points and return f = kx² + 2 ky²."""
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.lattice_type = "triangular"
+    crystal.geometry_lattice = mp.Lattice(size=mp.Vector3(1, 1), basis2=mp.Vector3(1, 0), 
+                                          basis1=mp.Vector3(0.5, math.sqrt(3) / 2))
+    crystal.point_group_operations = lambda: C6v_operations
+
+    def solve_frequencies(k_points, runner):
+        solved.extend(k_points)
+        cartesian = crystal._k_points_to_cartesian(k_points)
+        return (cartesian[:, 0]**2 + 2 * cartesian[:, 1]**2)[:, np.newaxis]
+
+    crystal._solve_frequencies = solve_frequencies
+    return crystal
+
+
+def test_k_grid_triangular_symmetry_reduction():
+    full, reduced = [], []
+    k_grid = _triangular_grid_crystal(full).run_k_grid(num_k=21, use_symmetry=False, num_workers=1)
+    reduced_grid = _triangular_grid_crystal(reduced).run_k_grid(num_k=21, use_symmetry=True, num_workers=1)
+    num_in_zone = np.count_nonzero(k_grid["in_zone"])
+    assert len(full) == num_in_zone
+    # Generic points have orbits of 4 under {E, C2, sigma_x, sigma_y}, the points on the axes fewer
+    on_axes = np.count_nonzero(reduced_grid["in_zone"][10, :]) + np.count_nonzero(reduced_grid["in_zone"][:, 10]) - 1
+    assert len(reduced) == (num_in_zone - on_axes) // 4 + (on_axes - 1) // 2 + 1
+    assert np.allclose(reduced_grid["freqs"], k_grid["freqs"], equal_nan=True)
+
+
+def _pool_crystal(monkeypatch, pool_calls):
+    """A crystal whose worker pool records the costs of the calls and solves each k-point to the frequency [k.x]."""
+    import photonic_crystal
+
+    def run_in_pool(calls, num_workers=None, callback=None, costs=None, progress=False):
+        pool_calls.append({"sizes": [len(kwargs["k_points"]) if "k_points" in kwargs else len(obj.k_points_interpolated) 
+                                     for obj, _, kwargs in calls], "costs": costs, "progress": progress})
+        return [getattr(obj, method_name)(**kwargs) for obj, method_name, kwargs in calls]
+
+    monkeypatch.setattr(photonic_crystal, "run_in_pool", run_in_pool)
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.resolution = 16
+    crystal.num_bands = 2
+    crystal.geometry_lattice = mp.Lattice(size=mp.Vector3(1, 1))
+    crystal.geometry = None
+    crystal.modes, crystal.freqs, crystal.gaps, crystal.band_k_points = [], {}, {}, {}
+    crystal.build_mode_index = lambda: None
+
+    def worker_copy():
+        copy = PhotonicCrystal.__new__(PhotonicCrystal)
+        copy.__dict__.update({key: value for key, value in crystal.__dict__.items() if key != "build_mode_index"})
+        return copy
+
+    crystal._worker_copy = worker_copy
+    return crystal
+
+
+def test_k_grid_pool_is_scheduled_by_cost(monkeypatch):
+    pool_calls = []
+    crystal = _pool_crystal(monkeypatch, pool_calls)
+    monkeypatch.setattr(PhotonicCrystal, "_solve_frequencies", 
+                        lambda self, k_points, runner: np.array([[k.x, 2 * k.x] for k in k_points]))
+    points = np.array([[0.1 * i, 0.0, 0.0] for i in range(7)])
+    freqs = crystal._solve_k_grid_points(points, {"E": np.identity(2)}, {}, "run_zeven", num_workers=3)
+    assert freqs.shape == (7, 2)
+    (pool_call,) = pool_calls
+    assert pool_call["progress"]
+    assert pool_call["costs"] == [crystal.estimate_cost(size) for size in pool_call["sizes"]]
+    assert sorted(pool_call["sizes"]) == [2, 2, 3]
+
+
+def test_parallel_k_path_is_scheduled_by_cost(monkeypatch):
+    pool_calls = []
+    crystal = _pool_crystal(monkeypatch, pool_calls)
+    crystal.k_points_interpolated = [mp.Vector3(0.1 * i) for i in range(5)]
+    monkeypatch.setattr(PhotonicCrystal, "_solve_k_points", 
+                        lambda self, runner, polarization, mode_storage: (np.array([[k.x] for k in self.k_points_interpolated]), []))
+    crystal._run_simulation_parallel("run_zeven", "zeven", num_workers=2)
+    (pool_call,) = pool_calls
+    assert pool_call["progress"]
+    assert pool_call["costs"] == [crystal.estimate_cost(size) for size in pool_call["sizes"]]
+    assert crystal.freqs["zeven"][:, 0] == pytest.approx([0, 0.1, 0.2, 0.3, 0.4])
+
+
+def test_runners_are_scheduled_by_cost(monkeypatch):
+    pool_calls = []
+    crystal = _pool_crystal(monkeypatch, pool_calls)
+    crystal.k_points_interpolated = [mp.Vector3(0.1 * i) for i in range(4)]
+    monkeypatch.setattr(PhotonicCrystal, "_solve_k_points", 
+                        lambda self, runner, polarization, mode_storage: (np.full((4, 1), len(polarization)), []))
+    crystal.run_simulations(["run_zeven", "run_tm"], num_workers=2)
+    (pool_call,) = pool_calls
+    assert pool_call["progress"]
+    assert pool_call["costs"] == [crystal.estimate_cost(4)] * 2
+    assert set(crystal.freqs) == {"zeven", "tm"}
+
+
+def _indexed_crystal():
+    """A crystal with hand-built modes: two polarizations, repeated k-points and frequencies, mixed k-point types."""
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal._mode_index = None
+    k_points = [mp.Vector3(0, 0), mp.Vector3(0.5, 0), mp.Vector3(0.5, 0.5), (0.25, 0.0, 0.0), [0.25, 0.25, 0.0]]
+    crystal.modes = [
+        {"polarization": polarization, "k_point": k_point, "band": band, 
+         "freq": 0.125 * ((i + band) % 4) if band < 3 else 0.5}
+        for polarization in ["zeven", "zodd"] for i, k_point in enumerate(k_points) for band in range(1, 5)
+    ]
+    return crystal
+
+
+def _linear_scan(modes, polarization, k_point, freq, freq_tolerance=0.01, k_point_max_distance=None):
+    """The look_for_mode() of the linear scan: exact k-point equality if no distance is given."""
+    k_point = np.array(PhotonicCrystal._k_point_to_array(k_point))
+    matches = []
+    for mode in modes:
+        distance = np.linalg.norm(PhotonicCrystal._k_point_to_array(mode["k_point"]) - k_point)
+        near = distance == 0 if k_point_max_distance is None else distance <= k_point_max_distance
+        if mode["polarization"] == polarization and near and abs(mode["freq"] - freq) <= freq_tolerance:
+            matches.append(mode)
+    return matches
+
+
+@pytest.mark.parametrize("freq_tolerance", [0.01, 0.125, 0.25, 1.0])
+@pytest.mark.parametrize("k_point_max_distance", [None, 0.25, 0.5])
+def test_look_for_mode_matches_linear_scan(freq_tolerance, k_point_max_distance):
+    crystal = _indexed_crystal()
+    for polarization in ["zeven", "zodd"]:
+        for k_point in [mp.Vector3(0, 0), (0.25, 0, 0), mp.Vector3(0.5, 0.5), mp.Vector3(0.3, 0.1)]:
+            for freq in [0, 0.25, 0.5, 0.6]:
+                found = crystal.look_for_mode(polarization, k_point, freq, freq_tolerance, k_point_max_distance)
+                expected = _linear_scan(crystal.modes, polarization, k_point, freq, freq_tolerance, k_point_max_distance)
+                assert [id(mode) for mode in found] == [id(mode) for mode in expected]
+
+
+def test_look_for_mode_tolerances():
+    crystal = _indexed_crystal()
+    # The frequency tolerance is inclusive: the bands 3 and 4 at 0.5 are found from 0.25 with a tolerance of 0.25
+    assert [mode["band"] for mode in crystal.look_for_mode("zeven", mp.Vector3(0.5, 0), 0.25, 0.25)][-2:] == [3, 4]
+    assert all(mode["band"] < 3 for mode in crystal.look_for_mode("zeven", mp.Vector3(0.5, 0), 0.25, 0.125))
+    # Without a distance only the k-point itself matches, whatever its type
+    found = crystal.look_for_mode("zodd", [0.25, 0.25, 0], 0.5, 0.01)
+    assert [mode["band"] for mode in found] == [3, 4]
+    assert all(mode["polarization"] == "zodd" for mode in found)
+    assert crystal.look_for_mode("zodd", mp.Vector3(0.25, 0.25 + 1e-3), 0.5, 0.01) == []
+    assert len(crystal.look_for_mode("zodd", mp.Vector3(0.25, 0.25 + 1e-3), 0.5, 0.01, k_point_max_distance=1e-2)) == 2
+
+
+def test_look_for_mode_polarization_without_modes():
+    crystal = _indexed_crystal()
+    assert crystal.look_for_mode("tm", mp.Vector3(0, 0), 0.5, 1.0) == []
+    # The index is rebuilt when modes are added
+    crystal.modes.append({"polarization": "tm", "k_point": mp.Vector3(0, 0), "freq": 0.5, "band": 1})
+    assert crystal.look_for_mode("tm", mp.Vector3(0, 0), 0.5, 1.0) == [crystal.modes[-1]]
+
+
+def test_degenerate_groups():
+    assert PhotonicCrystal._degenerate_groups([0.1, 0.2, 0.3], 1e-3) == [[0], [1], [2]]
+    assert PhotonicCrystal._degenerate_groups([0.1, 0.1005, 0.2, 0.2, 0.2004], 1e-3) == [[0, 1], [2, 3, 4]]
+    # Bands closer than the tolerance only through their neighbours are in the same subspace
+    assert PhotonicCrystal._degenerate_groups([0.1, 0.1008, 0.1016, 0.1024, 0.2], 1e-3) == [[0, 1, 2, 3], [4]]
+    assert PhotonicCrystal._degenerate_groups([0.3], 1e-3) == [[0]]
+
+
+def test_follow_mode_across_band_crossing():
+    # Three bands on 4 plane waves, a mode of a field of shape (2, 2) per band
+    rng = np.random.default_rng(1)
+    basis, _ = np.linalg.qr(rng.normal(size=(4, 4)) + 1j * rng.normal(size=(4, 4)))
+    reference = basis[:, 0]
+    # After the crossing the mode is the second band, slightly mixed with the third one
+    mixed = np.stack([basis[:, 1], 0.99 * basis[:, 0] + 0.14 * basis[:, 2], -0.14 * basis[:, 0] + 0.99 * basis[:, 2]], axis=1)
+    mixed /= np.linalg.norm(mixed, axis=0)
+    group, projection = PhotonicCrystal._follow_mode(reference, mixed.reshape(2, 2, 3), [[0], [1], [2]])
+    assert group == 1
+    assert np.linalg.norm(projection) == pytest.approx(1)
+    assert abs(np.vdot(mixed[:, 1], projection)) == pytest.approx(1)
+
+
+def test_follow_mode_into_degenerate_subspace():
+    rng = np.random.default_rng(2)
+    basis, _ = np.linalg.qr(rng.normal(size=(6, 6)) + 1j * rng.normal(size=(6, 6)))
+    reference = (basis[:, 1] + 2j * basis[:, 2]) / math.sqrt(5)
+    # The degenerate bands 1 and 2 come out of the solve in a rotated basis
+    rotation = np.array([[0.6, 0.8], [-0.8, 0.6]])
+    eigenvectors = basis[:, :3].copy()
+    eigenvectors[:, 1:] = basis[:, 1:3] @ rotation
+    group, projection = PhotonicCrystal._follow_mode(reference, eigenvectors, [[0], [1, 2]])
+    assert group == 1
+    # The projection on the subspace is the reference itself, whatever the basis of the subspace
+    assert np.allclose(projection, reference)
+
+
+def _rod_epsilon(radius, n=64, epsilon_rod=12.0, width=1.5):
+    """The epsilon grid of a rod at the center of a unit square cell, with interfaces smoothed over `width` pixels."""
+    x = (np.arange(n) + 0.5) / n - 0.5
+    rho = np.hypot(*np.meshgrid(x, x, indexing="ij"))
+    return 1 + (epsilon_rod - 1) / (1 + np.exp((rho - radius) * n / width)), x
+
+
+def test_epsilon_normals_point_out_of_rods():
+    epsilon, x = _rod_epsilon(0.2)
+    normals = PhotonicCrystal._epsilon_normals(epsilon, np.identity(3)[:2])
+    assert normals.shape == (64, 64, 3)
+    X, Y = np.meshgrid(x, x, indexing="ij")
+    rho = np.hypot(X, Y)
+    interface = np.abs(rho - 0.2) < 0.03
+    radial = np.stack([X / rho, Y / rho], axis=-1)[interface]
+    assert np.allclose(np.linalg.norm(normals[interface], axis=-1), 1)
+    assert np.min(np.sum(normals[interface][:, :2] * radial, axis=-1)) > 0.99
+    assert np.allclose(normals[..., 2], 0)
+    # The normals of air holes point into the holes
+    assert np.allclose(PhotonicCrystal._epsilon_normals(13 - epsilon, np.identity(3)[:2]), -normals)
+
+
+def _rod_crystal(radius, e_field):
+    """A square lattice of smoothed rods, with the radius as parameter 'r' and a single mode of frequency 0.4."""
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.resolution = 64
+    crystal.modes = [{"freq": 0.4}]
+    crystal.get_epsilon_and_lattice = lambda: (_rod_epsilon(radius)[0], None)
+    crystal._grid_lattice_vectors = lambda ndim: np.identity(3)[:ndim]
+    crystal._parameter_value = lambda param: radius
+    crystal.with_parameters = lambda r: SimpleNamespace(get_epsilon_and_lattice=lambda: (_rod_epsilon(r)[0], None))
+    crystal.get_mode_fields = lambda mode: {"e_field": e_field}
+    return crystal
+
+
+def test_sensitivity_to_rod_radius():
+    radius = 0.2
+    # A uniform field parallel to the rods: dω/dr = -ω/2 <dε/dr> / <ε>, with the mean epsilon 1 + 11 pi (r² + s²) 
+    # of the smoothed rods, s² = pi² (1.5 / 64)² / 3 the variance of the smoothing
+    e_field = np.zeros((64, 64, 3))
+    e_field[..., 2] = 1
+    sensitivity = _rod_crystal(radius, e_field).compute_sensitivities("r")["r"]
+    mean_epsilon = 1 + 11 * math.pi * (radius**2 + math.pi**2 * (1.5 / 64)**2 / 3)
+    expected = -0.4 / 2 * 11 * 2 * math.pi * radius / mean_epsilon
+    assert sensitivity[0] == pytest.approx(expected, rel=1e-3)
+
+    # A field in the plane of the rods, normal to part of the interface: larger rods still lower the frequency
+    e_field = np.zeros((64, 64, 3))
+    e_field[..., 0] = 1
+    sensitivity = _rod_crystal(radius, e_field).compute_sensitivities(["r"])["r"]
+    assert sensitivity[0] < 0
+
+
+class _ResolutionSolver:
+    """A stand-in for the MPB ModeSolver of converge_resolution(): the frequencies converge as f0 + c / resolution²."""
+
+    f0 = np.array([[0.3, 0.5], [0.35, 0.6]])
+    c = np.array([[1.0, -2.0], [0.5, 1.5]])
+    resolutions = []
+
+    def __init__(self, geometry, geometry_lattice, k_points, resolution, num_bands, target_freq):
+        self.resolution = resolution
+        self.resolutions.append(resolution)
+
+    def run_zeven(self):
+        self.all_freqs = self.f0 + self.c / PhotonicCrystal._resolution_scale(self.resolution)**2
+
+
+@pytest.fixture
+def resolution_crystal(monkeypatch):
+    import photonic_crystal
+
+    monkeypatch.setattr(photonic_crystal.mpb, "ModeSolver", _ResolutionSolver, raising=False)
+    monkeypatch.setattr(_ResolutionSolver, "resolutions", [])
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.geometry = SimpleNamespace(to_list=lambda: [])
+    crystal.geometry_lattice = None
+    crystal.k_points = [mp.Vector3(), mp.Vector3(0.5)]
+    crystal.num_bands = 2
+    crystal.target_freq = None
+    crystal.resolution = 16
+    return crystal
+
+
+def test_converge_resolution_stops_at_tolerance(resolution_crystal):
+    # The error of resolution r is max |c| / r² = 2 / r², below 5e-3 from r = 20
+    result = resolution_crystal.converge_resolution(tolerance=5e-3)
+    assert result["resolutions"] == _ResolutionSolver.resolutions == [8, 12, 16, 24]
+    assert result["resolution"] == 24 and result["converged"]
+    assert np.allclose(result["extrapolated_freqs"], _ResolutionSolver.f0)
+    assert result["error"] == pytest.approx(np.max(np.abs(_ResolutionSolver.c), axis=0) / 24**2)
+    assert len(result["freqs"]) == 4
+
+
+def test_converge_resolution_not_converged(resolution_crystal):
+    result = resolution_crystal.converge_resolution(tolerance=1e-4, resolutions=[mp.Vector3(10, 10), mp.Vector3(20, 20)])
+    assert not result["converged"]
+    assert result["resolution"].x == 20
+    assert np.allclose(result["extrapolated_freqs"], _ResolutionSolver.f0)
+    # With the wrong order the extrapolation misses f0
+    result = resolution_crystal.converge_resolution(tolerance=1e-4, resolutions=[10, 20], order=1)
+    assert not np.allclose(result["extrapolated_freqs"], _ResolutionSolver.f0)
+    with pytest.raises(ValueError):
+        resolution_crystal.converge_resolution(resolutions=[16])
+
+
+def test_scale_resolution():
+    assert PhotonicCrystal._scale_resolution(16, 0.75) == 12
+    assert PhotonicCrystal._scale_resolution(1, 0.1) == 1
+    assert PhotonicCrystal._scale_resolution((16, 32), 1.5) == (24, 48)
+    assert PhotonicCrystal._scale_resolution([16, 8], 0.5) == [8, 4]
+    scaled = PhotonicCrystal._scale_resolution(mp.Vector3(16, 16, 0), 0.5)
+    assert isinstance(scaled, mp.Vector3) and (scaled.x, scaled.y, scaled.z) == (8, 8, 1)
+
+
+def _perturbed_crystal(epsilon_bulk, solved):
+    """
+    A crystal of 4 grid cells with epsilon [1, 1, 4, 4] + (epsilon_bulk - 4), whose modes store their fields. 
+    Solving a reference records the value of epsilon_bulk and returns the modes with their frequencies times 0.9.
+    """
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    epsilon = np.array([1.0, 1.0, 4.0, 4.0]) + epsilon_bulk - 4
+    crystal.get_epsilon_and_lattice = lambda: (epsilon, None)
+    crystal.get_mode_fields = lambda mode: mode
+    crystal.with_parameters = lambda epsilon_bulk: _perturbed_crystal(epsilon_bulk, solved)
+
+    def solve_perturbation_reference(modes):
+        solved.append(epsilon_bulk)
+        return [dict(mode, freq=0.9 * mode["freq"]) for mode in modes]
+
+    crystal._solve_perturbation_reference = solve_perturbation_reference
+    e_field = np.zeros((4, 3))
+    e_field[:, 2] = [1, 1, 0.5, 0.5]
+    crystal.modes = [
+        {"polarization": "zeven", "k_point": mp.Vector3(), "band": 1, "freq": 0.4, "e_field": e_field},
+        {"polarization": "zeven", "k_point": mp.Vector3(), "band": 2, "freq": 0.6, "e_field": 2j * e_field[::-1]},
+        {"polarization": "zeven", "k_point": mp.Vector3(0.5), "band": 1, "freq": 0.5, "e_field": e_field},
+    ]
+    return crystal
+
+
+def test_perturbative_sweep_first_order_shift():
+    solved = []
+    deltas = np.array([0, 0.01, 0.1])
+    result = _perturbed_crystal(4, solved).run_perturbative_sweep("epsilon_bulk", 4 + deltas)
+    assert solved == []
+    assert result.dims == ("epsilon_bulk", "k_point", "band") and result.freqs["zeven"].shape == (3, 2, 2)
+    # For a uniform Δε, Δω = -ω/2 Δε ∫|E|² / ∫ε|E|²: ∫|E|² / ∫ε|E|² = 2.5 / 4 for [1, 1, 0.5, 0.5] and 2.5 / 8.5 reversed
+    ratios = np.array([[2.5 / 4, 2.5 / 8.5], [2.5 / 4, np.nan]])
+    freqs = np.array([[0.4, 0.6], [0.5, np.nan]])
+    shifts = -0.5 * deltas[:, np.newaxis, np.newaxis] * ratios
+    assert np.allclose(result.freqs["zeven"], freqs * (1 + shifts), equal_nan=True)
+    assert np.allclose(result.errors["zeven"], 1.5 * shifts**2 * freqs, equal_nan=True)
+
+
+def test_perturbative_sweep_solves_again_beyond_tolerance():
+    solved = []
+    # The estimated error of the first mode at Δε = 0.2 is 1.5 (0.2 / 2 * 2.5 / 4)² 0.4 = 2.3e-3
+    result = _perturbed_crystal(4, solved).run_perturbative_sweep("epsilon_bulk", [4, 4.1, 4.2, 4.21], tolerance=1e-3)
+    assert solved == [4.2]
+    freqs = result.freqs["zeven"]
+    errors = result.errors["zeven"]
+    assert np.all(errors[2][~np.isnan(errors[2])] == 0)
+    assert freqs[2, 0] == pytest.approx([0.36, 0.54])
+    # The next value is perturbed from the new reference, whose epsilon is [1.2, 1.2, 4.2, 4.2]
+    assert freqs[3, 0, 0] == pytest.approx(0.36 * (1 - 0.5 * 0.01 * 2.5 / (2.4 + 2.1)))
+    assert 0 < errors[3, 0, 0] < 1e-3
+    with pytest.raises(ValueError):
+        _perturbed_crystal(4, solved).run_perturbative_sweep("r", [0.2])
+
+
+def _banded_crystal():
+    """A square-lattice crystal with 3 bands on a k-path of 5 points, solved for 'zeven', and the modes of 'zodd'."""
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.geometry_lattice = mp.Lattice(size=mp.Vector3(1, 1))
+    crystal.use_XY = False
+    crystal.get_high_symmetry_points = lambda: {"Γ": mp.Vector3(), "X": mp.Vector3(0.5), "M": mp.Vector3(0.5, 0.5)}
+    crystal.k_points = [mp.Vector3(), mp.Vector3(0.5), mp.Vector3(0.5, 0.5), mp.Vector3()]
+    crystal.k_points_interpolated = crystal.k_points
+    k_path = [mp.Vector3(), mp.Vector3(0.25), mp.Vector3(0.5), mp.Vector3(0.5, 0.5), mp.Vector3()]
+    crystal.band_k_points = {"zeven": k_path}
+    crystal.freqs = {"zeven": np.array([[0.0, 0.5, 0.6], [0.2, 0.45, 0.62], [0.35, 0.4, 0.65], [0.38, 0.55, 0.7], 
+                                        [0.0, 0.5, 0.6]])}
+    crystal.gaps = {"zeven": []}
+    crystal._mode_index = None
+    crystal.modes = [
+        {"polarization": "zeven", "k_point": k_point, "band": band + 1, "freq": crystal.freqs["zeven"][i, band], 
+         "group_velocity": [0.1 * i, -0.1 * band, 0.0]}
+        for i, k_point in enumerate(k_path[:-1]) for band in range(3) if (i, band) != (1, 2)
+    ]
+    return crystal
+
+
+def test_plot_bands_single_trace():
+    crystal = _banded_crystal()
+    fig = crystal.plot_bands("zeven", color="red")
+    assert len(fig.data) == 1
+    trace = fig.data[0]
+    # 3 bands of 5 k-points, each followed by a NaN separator
+    x, y = np.asarray(trace["x"], dtype=float), np.asarray(trace["y"], dtype=float)
+    customdata = np.asarray(trace["customdata"], dtype=object)
+    assert len(x) == len(y) == len(customdata) == 3 * 6
+    assert customdata.shape[1] == 8
+    separators = np.arange(5, 18, 6)
+    assert np.all(np.isnan(x[separators])) and np.all(np.isnan(y[separators]))
+    assert np.allclose(x[:5], [0, 0.25, 0.5, 1, 1 + math.sqrt(0.5)])
+    assert np.allclose(np.delete(y, separators), crystal.freqs["zeven"].T.ravel())
+
+    crystal.freqs["zodd"] = crystal.freqs["zeven"][:, :2]
+    crystal.gaps["zodd"] = []
+    crystal.band_k_points["zodd"] = crystal.band_k_points["zeven"]
+    crystal.plot_bands("zodd", fig=fig)
+    assert len(fig.data) == 2 and len(fig.data[1]["y"]) == 2 * 6
+
+
+def test_plot_bands_customdata_of_clicked_points():
+    crystal = _banded_crystal()
+    customdata = np.asarray(crystal.plot_bands("zeven").data[0]["customdata"], dtype=object)
+    for row, point in enumerate(customdata):
+        band, i = divmod(row, 6)
+        if i == 5:
+            assert all(value is None for value in point)
+            continue
+        # The click handler of the app reads (kx, ky, kz, frequency, polarization) and looks for the mode
+        kx, ky, kz, freq, polarization = point[:5]
+        assert polarization == "zeven"
+        assert freq == crystal.freqs["zeven"][i, band]
+        modes = crystal.look_for_mode(polarization, mp.Vector3(kx, ky, kz), freq, 1e-9)
+        if (i, band) == (1, 2):
+            assert modes == [] and np.all(np.isnan(point[5:].astype(float)))
+        else:
+            assert modes[0]["band"] == band + 1
+            assert list(point[5:]) == pytest.approx([0.1 * (i % 4), -0.1 * band, 0.0])
+
+
+class _FieldSolver:
+    """A stand-in for the MPB ModeSolver of get_mode_fields(), which logs the calls and returns fields tagged by band."""
+
+    log = []
+    # The eigenvectors of the solve: band j is the plane wave (j + 1) % 3
+    eigenvectors = np.roll(np.identity(3), 1, axis=0).reshape(1, 3, 3)
+
+    def __init__(self, geometry, geometry_lattice, k_points, resolution, num_bands, target_freq):
+        self.num_bands = num_bands
+        self.log.append(("solver", resolution, num_bands, target_freq))
+
+    def init_params(self, parity, reset_fields):
+        self.log.append(("init_params", parity))
+
+    def set_eigenvectors(self, eigenvectors, first_band):
+        self.log.append(("set_eigenvectors",))
+
+    def solve_kpoint(self, k_point):
+        self.log.append(("solve_kpoint", k_point.x))
+
+    def get_eigenvectors(self, first_band, num_bands):
+        return self.eigenvectors[..., first_band - 1:first_band - 1 + num_bands]
+
+    def get_efield(self, band, bloch_phase):
+        self.log.append(("get_efield", band))
+        return np.full((2, 2, 3), band)
+
+    def get_hfield(self, band, bloch_phase):
+        self.log.append(("get_hfield", band))
+        return np.full((2, 2, 3), -band)
+
+
+@pytest.fixture
+def fields_crystal(monkeypatch):
+    import photonic_crystal
+
+    monkeypatch.setattr(_FieldSolver, "log", [])
+    monkeypatch.setattr(photonic_crystal.mpb, "ModeSolver", _FieldSolver, raising=False)
+    monkeypatch.setattr(photonic_crystal.mpb, "fix_efield_phase", 
+                        lambda ms, band: _FieldSolver.log.append(("fix_efield_phase", band)), raising=False)
+    monkeypatch.setattr(photonic_crystal.mpb, "fix_hfield_phase", 
+                        lambda ms, band: _FieldSolver.log.append(("fix_hfield_phase", band)), raising=False)
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.geometry = SimpleNamespace(to_list=lambda: [{"radius": 0.2}])
+    crystal.geometry_lattice = None
+    crystal.resolution = 16
+    crystal.num_bands = 4
+    crystal.modes = []
+    crystal._mode_index = None
+    crystal._mode_fields_cache = OrderedDict()
+    return crystal
+
+
+def _stored_mode(band=2, k_x=0.1, **values):
+    return {"polarization": "zeven", "k_point": mp.Vector3(k_x), "band": band, "freq": 0.3, "runner": "run_zeven", 
+            "num_bands": 3, **values}
+
+
+def _solves():
+    return sum(entry[0] == "solve_kpoint" for entry in _FieldSolver.log)
+
+
+def test_mode_fields_phase_is_fixed(fields_crystal):
+    mode = fields_crystal.get_mode_fields(_stored_mode())
+    assert _FieldSolver.log[0] == ("solver", 16, 3, 0)
+    assert _FieldSolver.log[1] == ("init_params", PhotonicCrystal.RUNNER_PARITIES["run_zeven"])
+    # The phases are fixed, as by the band functions of run_simulation(), before any field is read
+    calls = [entry[0] for entry in _FieldSolver.log[2:]]
+    assert calls[:3] == ["solve_kpoint", "fix_efield_phase", "fix_hfield_phase"]
+    assert set(calls[3:]) == {"get_efield", "get_hfield"}
+    assert all(entry[1] == 2 for entry in _FieldSolver.log[3:])
+    assert np.all(mode["e_field"] == 2) and np.all(mode["h_field_periodic"] == -2)
+
+
+def test_mode_fields_cache_keys(fields_crystal, monkeypatch):
+    mode = _stored_mode()
+    first = fields_crystal.get_mode_fields(mode)
+    assert fields_crystal.get_mode_fields(dict(mode)) is first and _solves() == 1
+    # A mode that already has its fields is returned as it is
+    assert fields_crystal.get_mode_fields(first) is first and _solves() == 1
+    # Another band, k-point, target frequency or runner is another key
+    fields_crystal.get_mode_fields(_stored_mode(band=1))
+    fields_crystal.get_mode_fields(_stored_mode(k_x=0.2))
+    fields_crystal.get_mode_fields(_stored_mode(target_freq=0.3))
+    fields_crystal.get_mode_fields(_stored_mode(runner="run"))
+    assert _solves() == 5
+    # So is a changed crystal, whatever the mode
+    fields_crystal.resolution = 32
+    assert fields_crystal.get_mode_fields(mode) is not first and _solves() == 6
+    fields_crystal.resolution = 16
+    fields_crystal.geometry = SimpleNamespace(to_list=lambda: [{"radius": 0.25}])
+    fields_crystal.get_mode_fields(mode)
+    assert _solves() == 7
+    # The least recently used fields are evicted
+    monkeypatch.setattr(fields_crystal, "MODE_FIELDS_CACHE_SIZE", 2)
+    fields_crystal.get_mode_fields(_stored_mode(band=1))
+    fields_crystal.get_mode_fields(_stored_mode(band=3))
+    assert _solves() == 9 and len(fields_crystal._mode_fields_cache) == 2
+    fields_crystal.get_mode_fields(mode)
+    fields_crystal.get_mode_fields(_stored_mode(band=3))
+    assert _solves() == 10
+    with pytest.raises(ValueError):
+        fields_crystal.get_mode_fields(_stored_mode(runner="run_custom"))
+
+
+def test_mode_fields_follow_stored_eigenvector(fields_crystal):
+    # The stored eigenvector of band 2 is now the eigenvector of band 3 of the solve
+    reference = np.zeros((1, 3, 1), dtype=complex)
+    reference[0, 0, 0] = 1j
+    mode = fields_crystal.get_mode_fields(_stored_mode(eigenvector=reference))
+    assert ("fix_efield_phase", 3) in _FieldSolver.log
+    assert np.all(mode["e_field"] == 3)
+
+
+def test_eigenvector_overlaps():
+    rng = np.random.default_rng(3)
+    basis, _ = np.linalg.qr(rng.normal(size=(8, 8)) + 1j * rng.normal(size=(8, 8)))
+    eigenvectors = basis[:, :4].reshape(2, 4, 4)
+    reference = (0.6 * basis[:, 1] + 0.8j * basis[:, 3]).reshape(2, 4, 1)
+    overlaps = PhotonicCrystal._eigenvector_overlaps(reference, eigenvectors)
+    assert overlaps == pytest.approx([0, 0.6, 0, 0.8], abs=1e-12)
+    # The overlaps do not depend on the phase of the reference
+    assert PhotonicCrystal._eigenvector_overlaps(np.exp(0.7j) * reference, eigenvectors) == pytest.approx(overlaps)
+
+
+class _PathSolver:
+    """
+    A stand-in for the ModeSolver set by set_solver(), with two bands f1 = 0.1 + |k| and f2 = 0.9 - |k| 
+    and group velocities (band, k.x, 0).
+    """
+
+    def __init__(self, k_points, target_freq=0):
+        self.k_points = k_points
+        self.num_bands = 2
+        self.target_freq = target_freq
+        self.solved = []
+
+    def init_params(self, parity, reset_fields):
+        self.parity = parity
+
+    def solve_kpoint(self, k_point):
+        self.solved.append(k_point)
+        self.freqs = [0.1 + k_point.norm(), 0.9 - k_point.norm()]
+
+    def compute_one_group_velocity(self, band):
+        return mp.Vector3(band, self.current_k.x)
+
+
+def _iter_crystal():
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.ms = _PathSolver([mp.Vector3(0.1 * i) for i in range(4)])
+    crystal.modes, crystal.freqs, crystal.gaps, crystal.band_k_points = [], {}, {}, {}
+    crystal._mode_index = None
+    return crystal
+
+
+def test_iter_simulation_yields_each_k_point():
+    crystal = _iter_crystal()
+    results = list(crystal.iter_simulation("run_tm", mode_storage="frequencies"))
+    assert crystal.ms.parity == PhotonicCrystal.RUNNER_PARITIES["run_tm"]
+    assert [result["k_index"] for result in results] == [0, 1, 2, 3]
+    assert [result["k_point"].x for result in results] == pytest.approx([0, 0.1, 0.2, 0.3])
+    assert np.allclose([result["freqs"] for result in results], [[0.1 + 0.1 * i, 0.9 - 0.1 * i] for i in range(4)])
+    mode = results[2]["modes"][1]
+    assert (mode["band"], mode["polarization"], mode["runner"]) == (2, "tm", "run_tm")
+    assert list(mode["group_velocity"]) == pytest.approx([2, 0.2, 0])
+    assert "e_field" not in mode
+    # The results are stored when the iteration ends
+    assert crystal.freqs["tm"].shape == (4, 2)
+    assert len(crystal.modes) == 8 and len(crystal.band_k_points["tm"]) == 4
+    assert crystal.look_for_mode("tm", mp.Vector3(0.3), 0.6, 1e-9) == [crystal.modes[-1]]
+
+
+def test_iter_simulation_stopped_early():
+    crystal = _iter_crystal()
+    iterator = crystal.iter_simulation(polarization="te", mode_storage="frequencies")
+    for result in iterator:
+        if result["k_index"] == 1:
+            break
+    assert "te" not in crystal.freqs
+    iterator.close()
+    # Only the k-points solved before the stop are solved and stored
+    assert len(crystal.ms.solved) == 2
+    assert crystal.freqs["te"].shape == (2, 2) and len(crystal.modes) == 4
+    assert crystal.gaps["te"] == compute_gap_list(crystal.freqs["te"])
+
+
+def test_iter_simulation_without_storing():
+    crystal = _iter_crystal()
+    results = list(crystal.iter_simulation(mode_storage="frequencies", store=False))
+    assert len(results) == 4 and len(results[0]["modes"]) == 2
+    assert crystal.modes == [] and crystal.freqs == {} and crystal._mode_index is None
+    with pytest.raises(ValueError):
+        next(crystal.iter_simulation(runner="run_custom"))
+    with pytest.raises(ValueError):
+        next(crystal.iter_simulation(mode_storage="nothing"))
+    crystal.ms = None
+    with pytest.raises(ValueError):
+        next(crystal.iter_simulation())
+
+
+def _runners_crystal(monkeypatch, pool_calls, solved):
+    """A crystal whose runners solve 2 k-points to frequencies set by the polarization, recording the runners solved."""
+    crystal = _pool_crystal(monkeypatch, pool_calls)
+    crystal.geometry = SimpleNamespace(to_list=lambda: [{"radius": 0.2}])
+    crystal.target_freq = None
+    crystal.k_points_interpolated = [mp.Vector3(), mp.Vector3(0.5)]
+    crystal.build_mode_index = lambda: None
+
+    def solve_k_points(self, runner, polarization, mode_storage):
+        solved.append(runner)
+        freqs = np.array([[0.1, 0.5], [0.3, 0.6]]) + 0.01 * len(polarization)
+        return freqs, [{"polarization": polarization, "band": band} for band in (1, 2)]
+
+    monkeypatch.setattr(PhotonicCrystal, "_solve_k_points", solve_k_points)
+    return crystal
+
+
+def test_run_simulations_merges_in_runner_order(monkeypatch):
+    pool_calls, solved = [], []
+    crystal = _runners_crystal(monkeypatch, pool_calls, solved)
+    crystal.run_simulations(["run_te", "run_zeven", "run"], polarizations=["te", "zeven", "all"])
+    assert len(pool_calls) == 1 and sorted(solved) == ["run", "run_te", "run_zeven"]
+    assert [mode["polarization"] for mode in crystal.modes] == ["te", "te", "zeven", "zeven", "all", "all"]
+    assert crystal.freqs["zeven"] == pytest.approx(np.array([[0.15, 0.55], [0.35, 0.65]]))
+    assert crystal.gaps["te"] == compute_gap_list(crystal.freqs["te"])
+    with pytest.raises(ValueError):
+        crystal.run_simulations(["run_te", "run_tm"], polarizations=["te"])
+
+
+def test_run_simulations_skips_cached_runners(monkeypatch, tmp_path):
+    pool_calls, solved = [], []
+    cache = ResultCache(directory=str(tmp_path))
+    _runners_crystal(monkeypatch, pool_calls, solved).run_simulations(["run_te", "run_tm"], cache=cache)
+    assert sorted(solved) == ["run_te", "run_tm"]
+
+    solved.clear()
+    crystal = _runners_crystal(monkeypatch, pool_calls, solved)
+    crystal.run_simulations(["run_te", "run_zodd", "run_tm"], cache=cache)
+    # Only the runner that is not cached is solved, in this process since there is a single one
+    assert solved == ["run_zodd"] and len(pool_calls) == 1
+    assert [mode["polarization"] for mode in crystal.modes] == ["te", "te", "zodd", "zodd", "tm", "tm"]
+    assert set(crystal.freqs) == {"te", "zodd", "tm"}
+
+
+class _TargetSolver:
+    """
+    A stand-in for the MPB ModeSolver of run_simulation(). The spectrum at k is 0.1, 0.3, 0.5, 0.7, 0.9 shifted by k.x, 
+    of which the num_bands lowest bands are found, or the num_bands bands closest to target_freq if it is set.
+    """
+
+    solvers = []
+
+    def __init__(self, geometry, geometry_lattice, k_points, resolution, num_bands, target_freq):
+        self.k_points, self.num_bands, self.target_freq = k_points, num_bands, target_freq
+        self.runs = 0
+        self.solvers.append(self)
+
+    def run_zeven(self, *band_functions):
+        self.runs += 1
+        self.all_freqs = []
+        for k_point in self.k_points:
+            self.current_k = k_point
+            spectrum = np.arange(0.1, 1, 0.2) + k_point.x
+            if self.target_freq:
+                spectrum = spectrum[np.argsort(np.abs(spectrum - self.target_freq), kind="stable")]
+            self.freqs = sorted(spectrum[:self.num_bands])
+            self.all_freqs.append(self.freqs)
+            for band_function in band_functions:
+                for band in range(1, self.num_bands + 1):
+                    band_function(self, band)
+        self.all_freqs = np.array(self.all_freqs)
+        self.gap_list = compute_gap_list(self.all_freqs)
+
+    def compute_one_group_velocity(self, band):
+        return mp.Vector3()
+
+
+@pytest.fixture
+def target_crystal(monkeypatch):
+    import photonic_crystal
+
+    monkeypatch.setattr(_TargetSolver, "solvers", [])
+    monkeypatch.setattr(photonic_crystal.mpb, "ModeSolver", _TargetSolver, raising=False)
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.geometry = SimpleNamespace(to_list=lambda: [{"radius": 0.2}])
+    crystal.geometry_lattice = None
+    crystal.resolution = 16
+    crystal.num_bands = 2
+    crystal.k_points_interpolated = [mp.Vector3(), mp.Vector3(0.05)]
+    crystal.modes, crystal.freqs, crystal.gaps, crystal.band_k_points = [], {}, {}, {}
+    crystal._mode_index = None
+    crystal.target_freq = None
+    return crystal
+
+
+def _runs():
+    return sum(solver.runs for solver in _TargetSolver.solvers)
+
+
+def test_targeted_solve(target_crystal):
+    target_crystal.set_solver()
+    target_crystal.run_simulation(mode_storage="frequencies")
+    assert target_crystal.freqs["zeven"] == pytest.approx(np.array([[0.1, 0.3], [0.15, 0.35]]))
+    assert "target_freq" not in target_crystal.modes[0]
+
+    target_crystal.run_simulation(mode_storage="frequencies", target_freq=0.52)
+    # A new solver with the same k-points and bands finds the bands closest to the target
+    solver = _TargetSolver.solvers[-1]
+    assert len(_TargetSolver.solvers) == 2 and solver.target_freq == 0.52
+    assert solver.k_points is _TargetSolver.solvers[0].k_points and solver.num_bands == 2
+    assert target_crystal.target_freq == 0.52
+    assert target_crystal.freqs["zeven"] == pytest.approx(np.array([[0.5, 0.7], [0.35, 0.55]]))
+    # The bands are numbered among the bands found, and the modes record how to find them again
+    mode = target_crystal.modes[-1]
+    assert (mode["band"], mode["freq"], mode["target_freq"], mode["num_bands"]) == (2, pytest.approx(0.55), 0.52, 2)
+    target_crystal.run_simulation(mode_storage="frequencies", target_freq=0.52)
+    assert len(_TargetSolver.solvers) == 2
+
+
+def test_targeted_solve_cache_key(target_crystal, tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    target_crystal.set_solver(target_freq=0.52)
+    assert _TargetSolver.solvers[-1].target_freq == 0.52
+    target_crystal.run_simulation(mode_storage="frequencies", cache=cache)
+    target_crystal.run_simulation(mode_storage="frequencies", cache=cache, target_freq=0.32)
+    assert _runs() == 2
+    assert target_crystal.freqs["zeven"] == pytest.approx(np.array([[0.3, 0.5], [0.15, 0.35]]))
+    target_crystal.run_simulation(mode_storage="frequencies", cache=cache, target_freq=0.52)
+    assert _runs() == 2
+    assert target_crystal.freqs["zeven"] == pytest.approx(np.array([[0.5, 0.7], [0.35, 0.55]]))
+
+
+def test_targeted_mode_fields(fields_crystal):
+    fields_crystal.get_mode_fields(_stored_mode(target_freq=0.52, num_bands=2))
+    assert _FieldSolver.log[0] == ("solver", 16, 2, 0.52)
+
+
+class _VelocitySolver(_TargetSolver):
+    """A square-lattice solver whose bands are f = band |k|², with the group velocities v = 2 band k."""
+
+    def run_zeven(self, *band_functions):
+        self.runs += 1
+        self.all_freqs = []
+        for k_point in self.k_points:
+            self.current_k = k_point
+            self.freqs = [band * k_point.dot(k_point) for band in range(1, self.num_bands + 1)]
+            self.all_freqs.append(self.freqs)
+            for band_function in band_functions:
+                for band in range(1, self.num_bands + 1):
+                    band_function(self, band)
+        self.all_freqs = np.array(self.all_freqs)
+
+    def compute_one_group_velocity(self, band):
+        return self.current_k.scale(2 * band)
+
+
+def test_symmetry_images_group_velocities(monkeypatch):
+    import photonic_crystal
+
+    monkeypatch.setattr(_TargetSolver, "solvers", [])
+    monkeypatch.setattr(photonic_crystal.mpb, "ModeSolver", _VelocitySolver, raising=False)
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.geometry_lattice = mp.Lattice(size=mp.Vector3(1, 1))
+    k_points = [mp.Vector3(), mp.Vector3(0.1, 0.2), mp.Vector3(0.2, 0.1), mp.Vector3(-0.1, 0.2), mp.Vector3(0.2, -0.1), 
+                mp.Vector3(0.3), mp.Vector3(0, -0.3), mp.Vector3()]
+    crystal.ms = _VelocitySolver(None, None, k_points, 16, 2, 0)
+    crystal._solver_configuration = (None, None, 16)
+    crystal.modes, crystal.freqs, crystal.gaps, crystal.band_k_points = [], {}, {}, {}
+    crystal._mode_index = None
+    crystal._run_simulation_symmetric("run_zeven", "zeven", "frequencies", C4v_operations)
+    # Gamma, (0.1, 0.2) and (0.3, 0) are solved, the other k-points are images
+    assert len(_TargetSolver.solvers[-1].k_points) == 3
+    assert len(crystal.modes) == 2 * len(k_points)
+    expected = np.array([[2 * band * np.array([k.x, k.y, 0]) for band in (1, 2)] for k in k_points])
+    for mode, k_point in zip(crystal.modes, [k_point for k_point in k_points for _ in range(2)]):
+        assert mode["k_point"] is k_point
+        assert mode["freq"] == pytest.approx(mode["band"] * k_point.dot(k_point))
+        assert mode["group_velocity"] == pytest.approx(2 * mode["band"] * np.array([k_point.x, k_point.y, 0]))
+    # The velocities are found for every k-point of the path, including Gamma at both ends
+    k_array = np.array([[k.x, k.y, k.z] for k in k_points])
+    assert crystal._group_velocity_matrix("zeven", k_array, 2) == pytest.approx(expected)
+    # Bands beyond the stored ones have no velocity
+    assert np.all(np.isnan(crystal._group_velocity_matrix("zeven", k_array, 3)[:, 2]))
+
+
+def _adaptive_crystal(solved):
+    """A square-lattice crystal with a single band f = 0.3 + 0.5 kx², curved along Gamma-X and M-Gamma, flat along X-M."""
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.geometry_lattice = mp.Lattice(size=mp.Vector3(1, 1))
+    crystal.k_points = [mp.Vector3(), mp.Vector3(0.5), mp.Vector3(0.5, 0.5), mp.Vector3()]
+    crystal.freqs, crystal.gaps, crystal.band_k_points = {}, {}, {}
+    crystal.build_mode_index = lambda: None
+
+    def solve_k_point_list(k_points, runner, polarization, mode_storage):
+        solved.append(len(k_points))
+        return np.array([[0.3 + 0.5 * k_point.x**2] for k_point in k_points])
+
+    crystal._solve_k_point_list = solve_k_point_list
+    return crystal
+
+
+def test_adaptive_simulation_refines_curved_segments():
+    solved = []
+    crystal = _adaptive_crystal(solved)
+    crystal.run_adaptive_simulation(runner="run_tm", tolerance=1e-3)
+    # The error h² |f''| / 8 is below 1e-3 for segments of 0.0625 along Gamma-X (f'' = 1) 
+    # and of 0.177 / 2 along M-Gamma (f'' = 0.5): 2 refinements of 2 segments each, X-M is not refined
+    assert solved == [7, 4, 8]
+    k_path = crystal.band_k_points["tm"]
+    distances = crystal._k_path_distances(k_path)
+    lengths = np.diff(distances)
+    assert len(k_path) == 19 and np.all(lengths > 0)
+    assert lengths[:8] == pytest.approx(np.full(8, 0.0625))
+    assert lengths[8:10] == pytest.approx([0.25, 0.25])
+    assert lengths[10:] == pytest.approx(np.full(8, math.sqrt(0.5) / 8))
+    assert crystal.freqs["tm"][:, 0] == pytest.approx([0.3 + 0.5 * k_point.x**2 for k_point in k_path])
+    assert crystal.gaps["tm"] == compute_gap_list(crystal.freqs["tm"])
+
+
+def test_adaptive_simulation_limits():
+    solved = []
+    crystal = _adaptive_crystal(solved)
+    crystal.run_adaptive_simulation(tolerance=1e-3, max_refinements=1)
+    assert solved == [7, 4] and len(crystal.band_k_points["zeven"]) == 11
+    solved.clear()
+    crystal.run_adaptive_simulation(tolerance=1e-3, interp=7)
+    # The coarse path is already fine enough
+    assert solved == [3 * 8 + 1]
+    with pytest.raises(ValueError):
+        crystal.run_adaptive_simulation(mode_storage="nothing")
+
+
+class _EpsilonSolver:
+    """A stand-in for the MPB ModeSolver of get_epsilon_and_lattice(), which has no eigensolver at all."""
+
+    solvers = []
+
+    def __init__(self, geometry, geometry_lattice, k_points, resolution, num_bands):
+        self.resolution = resolution
+        self.initialized = False
+        self.solvers.append(self)
+
+    def init_params(self, parity, reset_fields):
+        self.initialized = True
+
+    def get_epsilon(self):
+        assert self.initialized
+        return np.full((self.resolution, self.resolution), float(len(self.solvers)))
+
+    def get_lattice(self):
+        return np.identity(3)
+
+
+def test_epsilon_and_lattice_cache(monkeypatch):
+    import photonic_crystal
+
+    monkeypatch.setattr(_EpsilonSolver, "solvers", [])
+    monkeypatch.setattr(photonic_crystal.mpb, "ModeSolver", _EpsilonSolver, raising=False)
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.geometry = SimpleNamespace(to_list=lambda: [{"radius": 0.2}])
+    crystal.geometry_lattice = mp.Lattice(size=mp.Vector3(1, 1))
+    crystal.resolution = 8
+    crystal._epsilon_cache = None
+    epsilon, lattice = crystal.get_epsilon_and_lattice()
+    assert epsilon.shape == (8, 8) and np.all(epsilon == 1) and np.all(lattice == np.identity(3))
+    assert crystal.get_epsilon_and_lattice()[0] is epsilon and len(_EpsilonSolver.solvers) == 1
+
+    # Any change of the configuration computes the grid again
+    crystal.resolution = 4
+    assert crystal.get_epsilon_and_lattice()[0].shape == (4, 4)
+    crystal.geometry = SimpleNamespace(to_list=lambda: [{"radius": 0.25}])
+    crystal.get_epsilon_and_lattice()
+    crystal.geometry_lattice = mp.Lattice(size=mp.Vector3(1, 2))
+    assert np.all(crystal.get_epsilon_and_lattice()[0] == 4)
+    crystal.geometry_lattice = mp.Lattice(size=mp.Vector3(1, 2))
+    crystal.get_epsilon_and_lattice()
+    assert len(_EpsilonSolver.solvers) == 4
+
+    # The grid is not pickled
+    state = crystal.__getstate__()
+    assert state["_epsilon_cache"] is None and crystal._epsilon_cache is not None
+
+
+class _SweepGeometry:
+    """A geometry with a single parameter, the radius."""
+
+    def __init__(self, radius=0.2):
+        self.radius = radius
+
+    def to_list(self):
+        return [{"radius": self.radius}]
+
+    def to_partial(self, exclude_key):
+        return lambda **kwargs: _SweepGeometry(**kwargs)
+
+
+class _SweepSolver:
+    """
+    A stand-in for the MPB ModeSolver of the steps of run_geometry_sweep(), with the bands f_j = j r (zeven) 
+    and j r + 0.05 (zodd). It fails once at the radius `fail_at`, as an interrupted sweep would.
+    """
+
+    runs = []
+    fail_at = None
+
+    def __init__(self, geometry, geometry_lattice, k_points, resolution, num_bands, target_freq):
+        self.radius = geometry[0]["radius"]
+        self.k_points, self.num_bands, self.target_freq = k_points, num_bands, target_freq
+
+    def _run(self, offset, band_functions):
+        if self.radius == _SweepSolver.fail_at:
+            _SweepSolver.fail_at = None
+            raise KeyboardInterrupt
+        self.runs.append(self.radius)
+        self.current_k = self.k_points[0]
+        self.freqs = [band * self.radius + offset for band in range(1, self.num_bands + 1)]
+        for band_function in band_functions:
+            for band in range(1, self.num_bands + 1):
+                band_function(self, band)
+
+    def run_zeven(self, *band_functions):
+        self._run(0, band_functions)
+
+    def run_zodd(self, *band_functions):
+        self._run(0.05, band_functions)
+
+    def compute_one_group_velocity(self, band):
+        return mp.Vector3()
+
+    def get_eigenvectors(self, first_band, num_bands):
+        return np.full((1, 2, num_bands), self.radius)
+
+
+@pytest.fixture
+def sweep_crystal(monkeypatch):
+    import photonic_crystal
+
+    monkeypatch.setattr(_SweepSolver, "runs", [])
+    monkeypatch.setattr(photonic_crystal.mpb, "ModeSolver", _SweepSolver, raising=False)
+    monkeypatch.setattr(photonic_crystal.mpb, "fix_efield_phase", lambda ms, band: None, raising=False)
+    monkeypatch.setattr(photonic_crystal.mpb, "fix_hfield_phase", lambda ms, band: None, raising=False)
+    crystal = PhotonicCrystal.__new__(PhotonicCrystal)
+    crystal.geometry = _SweepGeometry()
+    crystal.geometry_lattice = None
+    crystal.resolution = 16
+    crystal.num_bands = 4
+    crystal.target_freq = None
+    crystal.ms = None
+    crystal.solver_iterations = {}
+    crystal._warm_start = {}
+    return crystal
+
+
+def _checkpoint_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith(SweepCheckpoint.SUFFIX)]
+
+
+def test_geometry_sweep_resumes_from_checkpoint(sweep_crystal, tmp_path):
+    radii = [0.1, 0.2, 0.3, 0.4]
+    _SweepSolver.fail_at = 0.3
+    with pytest.raises(KeyboardInterrupt):
+        sweep_crystal.run_geometry_sweep("radius", radii, num_bands=2, checkpoint=str(tmp_path))
+    # The crystal is not left with the geometry and the bands of the interrupted step
+    assert sweep_crystal.geometry.radius == 0.2 and sweep_crystal.num_bands == 4
+    assert len(_checkpoint_files(tmp_path)) == 1
+    assert _SweepSolver.runs == [0.1, 0.1, 0.2, 0.2]
+
+    result = sweep_crystal.run_geometry_sweep("radius", radii, num_bands=2, checkpoint=str(tmp_path))
+    # Only the values after the interruption are solved, and the completed sweep removes its checkpoint
+    assert _SweepSolver.runs[4:] == [0.3, 0.3, 0.4, 0.4]
+    assert _checkpoint_files(tmp_path) == []
+    assert result.freqs["zeven"][:, 0, :] == pytest.approx(np.array([[r, 2 * r] for r in radii]))
+    assert result.freqs["zodd"][:, 0, 1] == pytest.approx([2 * r + 0.05 for r in radii])
+    assert sweep_crystal.num_bands == 4 and sweep_crystal.geometry.radius == 0.2
+
+    # A new sweep with the same specification does not reuse the steps of the completed one
+    sweep_crystal.run_geometry_sweep("radius", radii, num_bands=2, checkpoint=str(tmp_path))
+    assert len(_SweepSolver.runs) == 16
+
+
+def test_geometry_sweep_skips_cached_steps(sweep_crystal, tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    sweep_crystal.run_geometry_sweep("radius", [0.1, 0.2], num_bands=2, cache=cache, mode_storage="eigenvectors")
+    result = sweep_crystal.run_geometry_sweep("radius", [0.1, 0.2, 0.3], num_bands=2, cache=cache, 
+                                              mode_storage="eigenvectors")
+    assert _SweepSolver.runs == [0.1, 0.1, 0.2, 0.2, 0.3, 0.3]
+    assert result.freqs["zodd"][:, 0, 0] == pytest.approx([0.15, 0.25, 0.35])
+    assert [len(modes) for modes in result.modes["zeven"]] == [2, 2, 2]
+    assert result.modes["zeven"][1][0]["eigenvector"] == pytest.approx(np.full((1, 2, 1), 0.2))
+    # The mode storage is part of the cache key: the frequencies-only step is solved again
+    sweep_crystal.run_geometry_sweep("radius", [0.1], num_bands=2, cache=cache)
+    assert _SweepSolver.runs[6:] == [0.1, 0.1]
+
+
+def test_sweep_checkpoint_lifecycle(sweep_crystal, tmp_path):
+    solved = []
+
+    def solve_sweep_point(radius, k_points, runners):
+        if radius == 0.3 and 0.3 not in solved:
+            solved.append(0.3)
+            raise KeyboardInterrupt
+        solved.append(radius)
+        return [np.array([[radius, 2 * radius]]) for _ in runners]
+
+    sweep_crystal.with_parameters = lambda radius: SimpleNamespace(
+        estimate_cost=lambda num_k_points: 1.0, 
+        _solve_sweep_point=lambda k_points, runners: solve_sweep_point(radius, k_points, runners))
+    with pytest.raises(KeyboardInterrupt):
+        sweep_crystal.run_sweep({"radius": [0.1, 0.2, 0.3]}, num_workers=1, checkpoint=str(tmp_path))
+    assert len(_checkpoint_files(tmp_path)) == 1
+    result = sweep_crystal.run_sweep({"radius": [0.1, 0.2, 0.3]}, num_workers=1, checkpoint=str(tmp_path))
+    assert solved == [0.1, 0.2, 0.3, 0.3]
+    assert _checkpoint_files(tmp_path) == []
+    assert result.freqs["zeven"][:, 0, 1] == pytest.approx([0.2, 0.4, 0.6])